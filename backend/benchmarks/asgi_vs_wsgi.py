@@ -0,0 +1,66 @@
+"""Side-by-side throughput of the WSGI app (create_app under gunicorn sync
+workers) and the ASGI app (create_asgi_app under uvicorn).
+
+Both servers are started against the database of the .env file (fill it first,
+e.g. with flask import-data) and trust a local signing key, so no Auth0 tenant
+is needed. Each server is loaded with every --concurrency level for --duration
+seconds and one json line per run is printed:
+
+    {"server": "asgi", "workers": 1, "concurrency": 1000, "requests": ...,
+     "requests_per_second": ..., "p50_ms": ..., "p95_ms": ..., "p99_ms": ...,
+     "errors": ...}
+
+Usage (from backend/src):
+    python ../benchmarks/asgi_vs_wsgi.py --concurrency 10 100 1000 --duration 10
+
+The load generator is a single asyncio process on the same machine as the
+server; at high request rates it is the bottleneck, so compare the latency
+percentiles at a given concurrency rather than the peak request rate.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from loadgen import SERVERS, local_auth, run_load, start_server, stop_server, wait_until_ready
+
+
+async def benchmark(args):
+    auth = local_auth()
+    jwks_url = auth.write_jwks(os.path.join(tempfile.mkdtemp(), 'jwks.json'))
+    headers = {'Authorization': 'Bearer ' + auth.token(['get:actors', 'get:movies'])}
+    workers = {'wsgi': args.wsgi_workers, 'asgi': args.asgi_workers}
+    base_url = 'http://127.0.0.1:{}'.format(args.port)
+
+    def make_request(rng):
+        return 'GET', args.path, headers, None, 200
+
+    for name in args.servers:
+        process = start_server(name, workers[name], args.port, jwks_url)
+        try:
+            await wait_until_ready(base_url + args.path, headers)
+            await run_load(base_url, make_request, min(args.concurrency), args.warmup)
+            for concurrency in args.concurrency:
+                result = await run_load(base_url, make_request, concurrency, args.duration)
+                print(json.dumps(dict({'server': name, 'workers': workers[name], 'path': args.path,
+                                       'concurrency': concurrency}, **result)), flush=True)
+        finally:
+            stop_server(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+    parser.add_argument('--path', default='/actors?limit=50')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[10, 100, 1000])
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load per concurrency level')
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--wsgi-workers', type=int, default=2 * (os.cpu_count() or 1) + 1)
+    parser.add_argument('--asgi-workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8765)
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Helpers shared by the benchmarks: start the API under gunicorn or uvicorn
+with a local stand-in for Auth0, and drive it with an asyncio load generator."""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+# local_auth is imported alone: the tests package sets database defaults in
+# os.environ, which would be passed on to the servers
+sys.path.insert(0, os.path.join(SRC, 'tests'))
+
+from local_auth import LocalAuth  # noqa: E402
+
+DOMAIN = 'benchmark.local'
+AUDIENCE = 'benchmark'
+
+SERVERS = {
+    'wsgi': ['gunicorn', '-c', 'gunicorn.conf.py', '--workers', '{workers}', '--bind', '127.0.0.1:{port}', 'api:create_app()'],
+    'asgi': ['uvicorn', '--factory', 'api.asgi:create_asgi_app', '--workers', '{workers}',
+             '--host', '127.0.0.1', '--port', '{port}', '--no-access-log', '--log-level', 'warning'],
+}
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def local_auth():
+    return LocalAuth(DOMAIN, AUDIENCE)
+
+
+def start_server(name, workers, port, jwks_url, env=None):
+    env = dict(os.environ if env is None else env,
+               AUTH0_DOMAIN=DOMAIN,
+               AUTH0_API_AUDIENCE=AUDIENCE,
+               AUTH0_ALGORITHMS='RS256',
+               AUTH0_JWKS_URL=jwks_url,
+               AUTH0_JWKS_BACKGROUND_REFRESH='false')
+    command = [part.format(workers=workers, port=port) for part in SERVERS[name]]
+    return subprocess.Popen(command, cwd=SRC, env=env, stdout=subprocess.DEVNULL)
+
+
+def stop_server(process):
+    process.terminate()
+    process.wait()
+
+
+async def wait_until_ready(url, headers, timeout=60):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                response = await client.get(url, headers=headers)
+                if response.status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError('The server did not start: {}'.format(url))
+
+
+'''
+run_load(base_url, make_request, concurrency, duration, seed)
+    runs concurrency workers for duration seconds, each sending the requests
+    made by make_request(rng) -> (method, path, headers, json body or None,
+    expected status) one after the other; rng is a random.Random seeded per
+    worker, so a run sends the same sequence of requests as the previous one
+    make_request may return None when it has nothing left to send
+    returns the number of successful requests, the requests per second, the
+    latency percentiles of the successful requests (ms) and the errors
+'''
+async def run_load(base_url, make_request, concurrency, duration, seed=0):
+    import httpx
+
+    latencies = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(rng):
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                request = make_request(rng)
+                if request is None:
+                    return
+                method, path, headers, body, expected_status = request
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, headers=headers, json=body)
+                    ok = response.status_code == expected_status
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(random.Random('{}-{}'.format(seed, index)))
+                               for index in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        'errors': errors,
+    }
@@ -0,0 +1,110 @@
+"""Rows per second of the list serialization: ORM instances, repr() and the
+standard library encoder (before) against column rows, represent_rows and the
+fast encoder (api/serialization.py).
+
+The actors and movies are generated (database/generate.py) into a temporary
+SQLite database, or into --database-url (which is EMPTIED first). Every round
+queries, represents and encodes pages of --page-size rows until --rows rows
+are done; the best of --repeat rounds is printed as one json line per model
+and path, and the bodies of both paths are checked to be identical:
+
+    {"model": "Actor", "path": "fast", "rows_per_second": ..., "speedup": ...}
+
+Usage (from backend/src):
+    python ../benchmarks/serialization.py --rows 100000 --page-size 500
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+# database/models.py builds the database url at import time
+os.environ.setdefault('DATABASE_HOST', 'localhost')
+os.environ.setdefault('DATABASE_PORT', '5432')
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+from api.serialization import FastJSONProvider, orjson, represent_rows, represented_query  # noqa: E402
+from database.generate import DataGenerator, generate_data  # noqa: E402
+from database.models import Actor, Catalog, Movie, db, setup_db  # noqa: E402
+
+
+def _quiet(message, err=False):
+    pass
+
+
+def orm_page(app, model, after, page_size):
+    rows = model.query.filter(model.id > after).order_by(model.id).limit(page_size).all()
+    body = app.json.response({'success': True, 'rows': [row.repr() for row in rows]}).get_data()
+    return body, rows[-1].id if rows else None
+
+
+def fast_page(app, model, after, page_size):
+    rows = represented_query(model).filter(model.id > after).order_by(model.id).limit(page_size).all()
+    body = app.json.response({'success': True, 'rows': represent_rows(model, rows)}).get_data()
+    return body, rows[-1].id if rows else None
+
+
+def run(app, page, model, rows, page_size):
+    done = 0
+    after = 0
+    bodies = []
+    started = time.perf_counter()
+    while done < rows:
+        body, after = page(app, model, after, page_size)
+        if after is None:
+            after = 0
+            continue
+        bodies.append(body)
+        done += page_size
+        # the identity map would otherwise keep every instance read
+        db.session.expunge_all()
+    return done / (time.perf_counter() - started), bodies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='rows serialized per round')
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--table-rows', type=int, default=20000, help='actors and movies generated')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database-url', help='database to fill and read (a temporary SQLite database by default)')
+    args = parser.parse_args()
+
+    directory = tempfile.TemporaryDirectory()
+    app = Flask(__name__)
+    setup_db(app, args.database_url or 'sqlite:///' + os.path.join(directory.name, 'serialization.db'), [])
+    for model in (Catalog, Actor, Movie):
+        db.session.execute(delete(model))
+    generate_data(db.session, DataGenerator(args.table_rows, args.table_rows, cast_mean=0), echo=_quiet)
+
+    # the stock provider and the stdlib encoder, as before
+    orm_app = Flask(__name__)
+    fast_app = Flask(__name__)
+    fast_app.json = FastJSONProvider(fast_app)
+    for model in (Actor, Movie):
+        results = {}
+        for name, page, json_app in (('orm', orm_page, orm_app), ('fast', fast_page, fast_app)):
+            results[name] = max(run(json_app, page, model, args.rows, args.page_size) for _ in range(args.repeat))
+        if results['orm'][1] != results['fast'][1]:
+            raise SystemExit('The bodies of {} differ'.format(model.__name__))
+        for name, (rows_per_second, bodies) in results.items():
+            print(json.dumps({
+                'model': model.__name__,
+                'path': name,
+                'encoder': 'orjson' if name == 'fast' and orjson is not None else 'json',
+                'rows_per_second': round(rows_per_second),
+                'speedup': round(rows_per_second / results['orm'][0], 2),
+            }), flush=True)
+    db.session.remove()
+    directory.cleanup()
+
+
+if __name__ == '__main__':
+    main()
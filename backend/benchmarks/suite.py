@@ -0,0 +1,300 @@
+"""HTTP benchmark suite of the API.
+
+Runs every route of the API (lists, filters, search, single items, cast and
+filmographies, create, patch and delete, and their batch versions) at fixed concurrency
+levels against a freshly seeded database, and writes the throughput and the
+latency percentiles as json, to be compared between commits.
+
+- Auth: the suite generates its own RSA key, serves the JWKS on a local http
+  server and mints, for each route, a token with the permission the route
+  requires, so no Auth0 tenant is needed.
+- Data: the database TEST_DATABASE_NAME of the .env file (or --database-name)
+  is EMPTIED and seeded with --actors actors, --movies movies and about
+  --cast-mean actors per movie (see flask generate-data), deterministically
+  from --seed, plus --deletable rows of each table for the delete routes.
+- Server: the API is started with gunicorn (--server wsgi, --workers sync
+  workers) or uvicorn (--server asgi) on that database.
+
+Usage (from backend/src):
+    python ../benchmarks/suite.py --output results.json
+    python ../benchmarks/suite.py --output new.json --compare results.json
+
+With --compare, the routes whose requests per second dropped, or whose p95
+latency grew, by more than --threshold (10%) are listed and the exit status
+is 1. Compare runs made on the same machine with the same options.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from collections import namedtuple
+
+from loadgen import SERVERS, local_auth, run_load, start_server, stop_server, wait_until_ready
+
+# words of the generated names and titles (database/generate.py), searched for
+FIRST_NAMES = ['Ada', 'Alan', 'Anna', 'Ben', 'Carla', 'Dan', 'Eva', 'Frank', 'Grace', 'Hugo',
+               'Ines', 'Jack', 'Kate', 'Leo', 'Maria', 'Nina', 'Omar', 'Paula', 'Rick', 'Sara']
+LAST_NAMES = ['Adams', 'Brown', 'Clark', 'Davis', 'Evans', 'Garcia', 'Harris', 'Johnson', 'King',
+              'Lopez', 'Miller', 'Moore', 'Nelson', 'Perez', 'Smith', 'Taylor', 'Walker', 'Young']
+TITLE_WORDS = ['Dark', 'Night', 'Empire', 'Storm', 'Silent', 'River', 'Last', 'Golden', 'City',
+               'Secret', 'Island', 'Star', 'Winter', 'Code', 'Lost', 'Kingdom', 'Fire', 'Shadow']
+GENDERS = ['F', 'M']
+
+''' Scenario
+a benchmarked route
+    make(rng, dataset) returns (method, path, json body or None), or None
+    when there is nothing left to send (e.g. no row left to delete)
+'''
+Scenario = namedtuple('Scenario', ['name', 'method', 'route', 'permission', 'make'])
+
+
+def _actor(rng):
+    return {'name': '{} {}'.format(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)),
+            'age': rng.randint(18, 90), 'gender': rng.choice(GENDERS)}
+
+
+def _movie(rng):
+    return {'title': ' '.join(rng.sample(TITLE_WORDS, 3)),
+            'release_date': '{:02d}-{:02d}-{}'.format(rng.randint(1, 12), rng.randint(1, 28), rng.randint(1950, 2024))}
+
+
+def _pop(ids):
+    return ids.pop() if ids else None
+
+
+def _delete(path, ids):
+    item_id = _pop(ids)
+    return None if item_id is None else ('DELETE', path.format(item_id), None)
+
+
+def _patch_batch(path, rng, count, size, make):
+    # sorted: the concurrent batches lock their rows in the same order
+    ids = sorted(rng.sample(range(1, count + 1), min(size, count)))
+    return 'PATCH', path, [dict(make(rng), id=item_id) for item_id in ids]
+
+
+def _delete_batch(path, ids, size):
+    items = [ids.pop() for _ in range(min(size, len(ids)))]
+    return ('DELETE', path, items) if items else None
+
+
+SCENARIOS = [
+    Scenario('list_actors', 'GET', '/actors', 'get:actors',
+             lambda rng, data: ('GET', '/actors?limit=50', None)),
+    Scenario('list_actors_filtered', 'GET', '/actors', 'get:actors',
+             lambda rng, data: ('GET', '/actors?filter=age:gte:{0}&filter=age:lte:{1}&sort=-age&limit=50'.format(
+                 *sorted([rng.randint(18, 90), rng.randint(18, 90)])), None)),
+    Scenario('search_actors', 'GET', '/actors/search', 'get:actors',
+             lambda rng, data: ('GET', '/actors/search?q=' + rng.choice(LAST_NAMES)[:4].lower(), None)),
+    Scenario('get_actor', 'GET', '/actors/<actor_id>', 'get:actors',
+             lambda rng, data: ('GET', '/actors/{}'.format(rng.randint(1, data['actors'])), None)),
+    Scenario('get_actor_movies', 'GET', '/actors/<actor_id>/movies', 'get:movies',
+             lambda rng, data: ('GET', '/actors/{}/movies'.format(rng.randint(1, data['actors'])), None)),
+    Scenario('list_movies', 'GET', '/movies', 'get:movies',
+             lambda rng, data: ('GET', '/movies?limit=50', None)),
+    Scenario('list_movies_cast', 'GET', '/movies', 'get:movies',
+             lambda rng, data: ('GET', '/movies?include=cast&limit=50', None)),
+    Scenario('search_movies', 'GET', '/movies/search', 'get:movies',
+             lambda rng, data: ('GET', '/movies/search?q=' + rng.choice(TITLE_WORDS).lower(), None)),
+    Scenario('get_movie', 'GET', '/movies/<movie_id>', 'get:movies',
+             lambda rng, data: ('GET', '/movies/{}'.format(rng.randint(1, data['movies'])), None)),
+    Scenario('get_movie_actors', 'GET', '/movies/<movie_id>/actors', 'get:actors',
+             lambda rng, data: ('GET', '/movies/{}/actors'.format(rng.randint(1, data['movies'])), None)),
+    Scenario('create_actor', 'POST', '/actors', 'post:actors',
+             lambda rng, data: ('POST', '/actors', _actor(rng))),
+    Scenario('create_actors_batch', 'POST', '/actors/batch', 'post:actors',
+             lambda rng, data: ('POST', '/actors/batch', [_actor(rng) for _ in range(data['batch_size'])])),
+    Scenario('patch_actors_batch', 'PATCH', '/actors/batch', 'patch:actors',
+             lambda rng, data: _patch_batch('/actors/batch', rng, data['actors'], data['batch_size'], _actor)),
+    Scenario('delete_actors_batch', 'DELETE', '/actors/batch', 'delete:actors',
+             lambda rng, data: _delete_batch('/actors/batch', data['batch_deletable_actors'], data['batch_size'])),
+    Scenario('patch_actor', 'PATCH', '/actors/<actor_id>', 'patch:actors',
+             lambda rng, data: ('PATCH', '/actors/{}'.format(rng.randint(1, data['actors'])), _actor(rng))),
+    Scenario('delete_actor', 'DELETE', '/actors/<actor_id>', 'delete:actors',
+             lambda rng, data: _delete('/actors/{}', data['deletable_actors'])),
+    Scenario('create_movie', 'POST', '/movies', 'post:movies',
+             lambda rng, data: ('POST', '/movies', _movie(rng))),
+    Scenario('create_movies_batch', 'POST', '/movies/batch', 'post:movies',
+             lambda rng, data: ('POST', '/movies/batch', [_movie(rng) for _ in range(data['batch_size'])])),
+    Scenario('patch_movies_batch', 'PATCH', '/movies/batch', 'patch:movies',
+             lambda rng, data: _patch_batch('/movies/batch', rng, data['movies'], data['batch_size'], _movie)),
+    Scenario('delete_movies_batch', 'DELETE', '/movies/batch', 'delete:movies',
+             lambda rng, data: _delete_batch('/movies/batch', data['batch_deletable_movies'], data['batch_size'])),
+    Scenario('patch_movie', 'PATCH', '/movies/<movie_id>', 'patch:movies',
+             lambda rng, data: ('PATCH', '/movies/{}'.format(rng.randint(1, data['movies'])), _movie(rng))),
+    Scenario('delete_movie', 'DELETE', '/movies/<movie_id>', 'delete:movies',
+             lambda rng, data: _delete('/movies/{}', data['deletable_movies'])),
+]
+
+
+'''
+seed_database(actors, movies, cast_mean, deletable, seed)
+    empties the Actor, Movie and Catalog tables of the configured database and
+    fills them with the generator of flask generate-data (database/generate.py);
+    the ids are 1..n (the deletable rows, in no cast, come after), so that the
+    scenarios can pick existing ids
+    returns the dataset description used by the scenarios
+'''
+def seed_database(actors, movies, cast_mean, deletable, seed):
+    from flask import Flask
+    from sqlalchemy import delete, text
+
+    from database.generate import DataGenerator, generate_data
+    from database.models import Actor, Catalog, Movie, db, setup_db
+
+    setup_db(Flask(__name__))
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('TRUNCATE "Catalog", "Actor", "Movie" RESTART IDENTITY'))
+    else:
+        for model in (Catalog, Actor, Movie):
+            db.session.execute(delete(model))
+
+    counts = generate_data(db.session, DataGenerator(actors, movies, cast_mean=cast_mean, seed=seed))
+    generate_data(db.session, DataGenerator(deletable, deletable, cast_mean=0, seed=seed + 1))
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('ANALYZE "Actor", "Movie", "Catalog"'))
+        db.session.commit()
+    return dict(counts, deletable=deletable)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+'''
+compare(baseline, results, threshold)
+    returns the regressions of results against baseline: the scenarios (at the
+    same concurrency) whose requests per second dropped, or whose p95 latency
+    grew, by more than threshold (a fraction)
+'''
+def compare(baseline, results, threshold):
+    before = {(run['scenario'], run['concurrency']): run for run in baseline['results']}
+    regressions = []
+    for run in results['results']:
+        old = before.get((run['scenario'], run['concurrency']))
+        if old is None or not old['requests'] or not run['requests']:
+            continue
+        if run['requests_per_second'] < old['requests_per_second'] * (1 - threshold):
+            regressions.append(dict(scenario=run['scenario'], concurrency=run['concurrency'],
+                                    metric='requests_per_second', before=old['requests_per_second'],
+                                    after=run['requests_per_second']))
+        if run['p95_ms'] > old['p95_ms'] * (1 + threshold):
+            regressions.append(dict(scenario=run['scenario'], concurrency=run['concurrency'],
+                                    metric='p95_ms', before=old['p95_ms'], after=run['p95_ms']))
+    return regressions
+
+
+async def run_suite(args, dataset):
+    auth = local_auth()
+    jwks_url = auth.serve_jwks()
+    base_url = 'http://127.0.0.1:{}'.format(args.port)
+    scenarios = [scenario for scenario in SCENARIOS if not args.scenarios or scenario.name in args.scenarios]
+    data = dict(dataset, batch_size=args.batch_size)
+    first_deletable = {'deletable_actors': args.actors + 1, 'deletable_movies': args.movies + 1}
+    for key, first in first_deletable.items():
+        # popped from the end, the lowest ids first; the single and the batch
+        # deletes get half of the rows each
+        ids = list(range(first + args.deletable - 1, first - 1, -1))
+        data[key] = ids[len(ids) // 2:]
+        data['batch_' + key] = ids[:len(ids) // 2]
+
+    process = start_server(args.server, args.workers, args.port, jwks_url)
+    results = []
+    try:
+        headers = {'Authorization': 'Bearer ' + auth.token(['get:actors'])}
+        await wait_until_ready(base_url + '/actors?limit=1', headers)
+        for scenario in scenarios:
+            headers = {'Authorization': 'Bearer ' + auth.token([scenario.permission])}
+
+            def make_request(rng, scenario=scenario, headers=headers):
+                request = scenario.make(rng, data)
+                if request is None:
+                    return None
+                method, path, body = request
+                return method, path, headers, body, 200
+
+            if args.warmup and scenario.method == 'GET':
+                await run_load(base_url, make_request, min(args.concurrency), args.warmup, args.seed)
+            for concurrency in args.concurrency:
+                result = await run_load(base_url, make_request, concurrency, args.duration, args.seed)
+                run = dict({'scenario': scenario.name, 'method': scenario.method, 'route': scenario.route,
+                            'concurrency': concurrency}, **result)
+                results.append(run)
+                print(json.dumps(run), file=sys.stderr, flush=True)
+    finally:
+        stop_server(process)
+        auth.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-name', help='database to seed and benchmark (TEST_DATABASE_NAME by default)')
+    parser.add_argument('--actors', type=int, default=10000)
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--cast-mean', type=float, default=8, help='average number of actors per movie')
+    parser.add_argument('--deletable', type=int, default=20000, help='rows of each table kept for the delete routes')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenarios', nargs='*', choices=[scenario.name for scenario in SCENARIOS])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 10, 50])
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load per scenario and concurrency level')
+    parser.add_argument('--warmup', type=float, default=2, help='seconds of load before the read scenarios')
+    parser.add_argument('--batch-size', type=int, default=50, help='items per batch request')
+    parser.add_argument('--server', choices=sorted(SERVERS), default='wsgi')
+    parser.add_argument('--workers', type=int, default=2 * (os.cpu_count() or 1) + 1)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--output', help='file to write the results to (stdout by default)')
+    parser.add_argument('--compare', help='results of a previous run to compare to')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    database_name = args.database_name or os.getenv('TEST_DATABASE_NAME')
+    if not database_name:
+        parser.error('--database-name or TEST_DATABASE_NAME is required')
+    # read by database/models.py, in this process and in the server
+    os.environ['DATABASE_NAME'] = database_name
+
+    dataset = seed_database(args.actors, args.movies, args.cast_mean, args.deletable, args.seed)
+    results = {
+        'meta': {
+            'commit': _git_commit(),
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'server': args.server,
+            'workers': args.workers,
+            'duration': args.duration,
+            'seed': args.seed,
+            'dataset': dataset,
+        },
+        'results': asyncio.run(run_suite(args, dataset)),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for regression in regressions:
+            print('REGRESSION {scenario} (concurrency {concurrency}): {metric} {before} -> {after}'.format(
+                **regression), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
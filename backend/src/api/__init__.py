@@ -4,13 +4,42 @@ from sqlalchemy import exc
 import json
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from database.models import setup_db, Actor, Movie, Catalog
+from database.models import (setup_db, db, on_write, update_returning, delete_returning, VersionMismatch,
+                             Actor, Movie, Catalog)
+from database.search import SEARCH_MAX_QUERY_LENGTH, search_query
 from auth.auth import AuthError, requires_auth
+from api.pagination import parse_page_args, paginate, order_by_clauses
+from api.validation import validate_actor, validate_movie, validate_actor_update, validate_movie_update
+from api.batch import create_batch, update_batch, delete_batch
+from api import queries
+from api.streaming import stream_format, stream_response
+from api.conditional import conditional, if_match_versions, version_etag
+from api.response_cache import response_cache
+from api.metrics import init_metrics
+from api.profiling import init_profiling
+from api.serialization import FastJSONProvider, REPRESENTED_COLUMNS, represented_query, represent_rows
+
+CORS_HEADERS = [
+    ("Access-Control-Allow-Headers", "Content-Type,Authorization,If-None-Match,If-Modified-Since,If-Match,true"),
+    ("Access-Control-Allow-Methods", "GET,PUT,POST,DELETE,OPTIONS"),
+    ("Access-Control-Expose-Headers", "ETag,Last-Modified"),
+]
+
+ERROR_MESSAGES = {
+    400: "bad request",
+    404: "resource not found",
+    412: "precondition failed",
+    422: "unprocessable",
+}
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    init_metrics(app)
+    init_profiling(app)
     setup_db(app)
+    on_write(response_cache.invalidate)
     """
     Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
     """
@@ -22,12 +51,8 @@ def create_app(test_config=None):
     # CORS Headers
     @app.after_request
     def after_request(response):
-        response.headers.add(
-            "Access-Control-Allow-Headers", "Content-Type,Authorization,true"
-        )
-        response.headers.add(
-            "Access-Control-Allow-Methods", "GET,PUT,POST,DELETE,OPTIONS"
-        )
+        for name, value in CORS_HEADERS:
+            response.headers.add(name, value)
         return response
 
     # ROUTES
@@ -36,25 +61,132 @@ def create_app(test_config=None):
     #  Actors
     # ---------------------------------------------
     ''' GET /actors
-        returns status code 200 and json {"success": True, "actors": actors} where actors is the list of actors
+            ?limit=<n> page size (capped by LIST_MAX_PAGE_SIZE)
+            ?after=<cursor> the next_cursor returned with the previous page
+            ?count=exact|estimate|cached how total_actors is computed (see database/counts.py)
+            ?filter=<column>:<operator>:<value> (repeatable) e.g. ?filter=age:gte:25&filter=gender:eq:F
+            ?sort=<column>,-<column> e.g. ?sort=-age,name (see api/filtering.py)
+            ?stream=true returns all the actors as a streamed response (no paging)
+            'Accept: application/x-ndjson' returns all the actors as streamed json lines
+        returns status code 200 and json {"success": True, "actors": actors, "next_cursor": cursor}
+            where actors is the page of actors and cursor is null on the last page
+            or 304 if the If-None-Match/If-Modified-Since copy is current (see api/conditional.py)
             or appropriate status code indicating reason for failure
+        responses are cached when RESPONSE_CACHE is set (see api/response_cache.py)
     '''
     @app.route("/actors")
     @requires_auth('get:actors')
+    @response_cache.cached('Actor')
+    @conditional('Actor')
     def get_actors(payload):
         try:
-            actors = Actor.query.order_by(Actor.id).all()
-            repr_actors = [actor.repr() for actor in actors]
-            if len(actors) == 0:
+            output_format = stream_format(request)
+            if output_format is not None:
+                query, sort_keys, conditions, represent = queries.actors_query(db.session, request.args)
+                return stream_response(query.order_by(*order_by_clauses(sort_keys)), "actors", output_format,
+                                       represent=represent)
+            return jsonify(queries.list_actors(db.session, request.args))
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            if hasattr(e, 'code') and e.code == 404:
+                abort(404)
+            else:
+                abort(422)
+
+    ''' GET /actors/search
+            ?q=<text> the words to search for in the name of the actors (e.g. ?q=jo do),
+                every word must start a word of the name
+            ?limit=<n>, ?after=<cursor> paging as GET /actors
+            responds with a 400 error if q is missing, has no words or is longer than SEARCH_MAX_QUERY_LENGTH
+            requires the 'get:actors' permission
+        returns status code 200 and json {"success": True, "actors": actors, "next_cursor": cursor}
+            where actors is the page of the matching actors, the most relevant first (see database/search.py)
+            or 304 if the If-None-Match/If-Modified-Since copy is current (see api/conditional.py)
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/actors/search")
+    @requires_auth('get:actors')
+    @response_cache.cached('Actor')
+    @conditional('Actor')
+    def search_actors(payload):
+        try:
+            q = request.args.get('q', '').strip()
+            if q == "" or len(q) > SEARCH_MAX_QUERY_LENGTH:
+                abort(400)
+            query, sort_keys = search_query(db.session, Actor, q, REPRESENTED_COLUMNS[Actor])
+            if query is None:
+                abort(400)
+            limit, after = parse_page_args(request.args)
+            rows, next_cursor = paginate(query, sort_keys, limit, after)
+            return jsonify(
+                {
+                    "success": True,
+                    "actors": represent_rows(Actor, rows),
+                    "next_cursor": next_cursor,
+                }
+            )
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            else:
+                abort(422)
+
+    ''' GET /actors/<id>
+            where <id> is the existing model id
+            responds with a 404 error if <id> is not found
+            requires the 'get:actors' permission
+        returns status code 200 and json {"success": True, "actors": actor} where actor an array containing only the actor
+            or 304 if the If-None-Match/If-Modified-Since copy is current (see api/conditional.py)
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/actors/<actor_id>")
+    @requires_auth('get:actors')
+    @response_cache.cached('Actor')
+    @conditional('Actor', row=(Actor, 'actor_id'))
+    def get_actor(payload, actor_id):
+        try:
+            return jsonify(queries.get_actor(db.session, request.args, actor_id))
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 404:
+                abort(404)
+            else:
+                abort(422)
+
+    ''' GET /actors/<id>/movies
+            where <id> is the existing model id
+            responds with a 404 error if <id> is not found
+            ?limit=<n>, ?after=<cursor> paging as GET /movies
+            requires the 'get:movies' permission
+        returns status code 200 and json {"success": True, "actor_id": id, "movies": movies, "next_cursor": cursor}
+            where movies is the page of the movies the actor plays in (the filmography)
+            or 304 if the If-None-Match/If-Modified-Since copy is current (see api/conditional.py)
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/actors/<actor_id>/movies")
+    @requires_auth('get:movies')
+    @response_cache.cached('Actor', 'Catalog', 'Movie')
+    @conditional('Actor', 'Catalog', 'Movie')
+    def get_actor_movies(payload, actor_id):
+        try:
+            actor_id = int(actor_id)
+            if db.session.query(Actor.id).filter(Actor.id == actor_id).one_or_none() is None:
                 abort(404)
+            limit, after = parse_page_args(request.args)
+            movie_ids = db.select(Catalog.movie_id).where(Catalog.actor_id == actor_id)
+            movies, next_cursor = paginate(represented_query(Movie).filter(Movie.id.in_(movie_ids)),
+                                           [(Movie.id, False)], limit, after)
             return jsonify(
                 {
                     "success": True,
-                    "actors": repr_actors,
-                    "total_actors": len(Actor.query.all()),
+                    "actor_id": actor_id,
+                    "movies": represent_rows(Movie, movies),
+                    "next_cursor": next_cursor,
                 }
             )
         except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
             if hasattr(e, 'code') and e.code == 404:
                 abort(404)
             else:
@@ -71,17 +203,7 @@ def create_app(test_config=None):
     @requires_auth('post:actors')
     def create_actor(payload):
         try:
-            body = request.get_json()
-            new_actor_name = body.get("name", None)
-            new_actor_gender = body.get("gender", None)
-            new_actor_age = body.get("age", None)
-            if new_actor_name is None or new_actor_name == "":
-                abort(422)
-            if new_actor_gender is None or new_actor_gender == "":
-                abort(422)
-            if new_actor_age is None or new_actor_age == "":
-                abort(422)
-            actor_entity = Actor(name=new_actor_name, gender=new_actor_gender, age=new_actor_age)
+            actor_entity = Actor(**validate_actor(request.get_json()))
             actor_entity.insert()
             return jsonify(
                 {
@@ -97,12 +219,86 @@ def create_app(test_config=None):
             else:
                 abort(422)
 
+    '''
+        POST /actors/batch
+            creates up to BATCH_MAX_ITEMS rows in the actors table in a single transaction
+            the body is a list of actors (or {"actors": [actors]}), each validated like POST /actors
+            ?mode=atomic (default) nothing is created if any actor is invalid
+            ?mode=partial the valid actors are created and the invalid ones are reported
+            requires the 'post:actors' permission
+        returns status code 200 and json {"success": True, "actors": actors, "created": n, "failed": m, "results": results}
+            where actors are the newly created actors and results holds a result per submitted item
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/actors/batch", methods=["POST"])
+    @requires_auth('post:actors')
+    def create_actors_batch(payload):
+        try:
+            return create_batch(Actor, "actors", validate_actor)
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            else:
+                abort(422)
+
+    '''
+        PATCH /actors/batch
+            updates up to BATCH_MAX_ITEMS rows of the actors table in a single transaction,
+            with a single UPDATE statement
+            the body is a list of changes (or {"actors": [changes]}), each with the "id" of its actor,
+            its fields validated like PATCH /actors/<id> ("" leaves a field unchanged)
+            ?mode=atomic (default) nothing is updated if any item is invalid
+            ?mode=partial the valid items are updated and the invalid ones are reported
+            the ids not found are reported (404) in both modes
+            requires the 'patch:actors' permission
+        returns status code 200 and json {"success": True, "actors": actors, "updated": n, "failed": m, "results": results}
+            where actors are the updated actors and results holds a result per submitted item
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/actors/batch", methods=["PATCH"])
+    @requires_auth('patch:actors')
+    def update_actors_batch(payload):
+        try:
+            return update_batch(Actor, "actors", validate_actor_update)
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            else:
+                abort(422)
+
+    '''
+        DELETE /actors/batch
+            deletes up to BATCH_MAX_ITEMS rows of the actors table in a single transaction,
+            with a single DELETE statement
+            the body is a list of ids (or {"ids": [ids]})
+            ?mode=atomic (default) nothing is deleted if any id is invalid
+            ?mode=partial the valid ids are deleted and the invalid ones are reported
+            the ids not found are reported (404) in both modes
+            requires the 'delete:actors' permission
+        returns status code 200 and json {"success": True, "deleted": ids, "failed": m, "results": results}
+            where ids are the ids of the deleted records and results holds a result per submitted id
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/actors/batch", methods=["DELETE"])
+    @requires_auth('delete:actors')
+    def delete_actors_batch(payload):
+        try:
+            return delete_batch(Actor)
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            else:
+                abort(422)
+
     ''' PATCH /actors/<id>
             where <id> is the existing model id
             responds with a 404 error if <id> is not found
             updates the corresponding row for <id>
+            'If-Match: <ETag of GET /actors/<id>>' updates it only if it was not changed since
+                (412 otherwise, see api/conditional.py)
             requires the 'patch:actors' permission
         returns status code 200 and json {"success": True, "actors": actor} where actor an array containing only the updated actor
+            and the ETag of its new version
              or appropriate status code indicating reason for failure
     '''
     @app.route("/actors/<actor_id>", methods=["PATCH"])
@@ -111,28 +307,23 @@ def create_app(test_config=None):
     # def update_actor(actor_id):
         try:
             actor_id = int(actor_id)
-            actor = Actor.query.filter(Actor.id == actor_id).one_or_none()
+            # "" leaves a field unchanged
+            values = validate_actor_update(request.get_json())
+            # one UPDATE ... RETURNING, no row means no actor
+            actor = update_returning(Actor, actor_id, values, REPRESENTED_COLUMNS[Actor] + (Actor.version,),
+                                     if_match_versions())
             if actor is None:
                 abort(404)
-            body = request.get_json()
-            new_actor_name = body.get("name", None)
-            new_actor_gender = body.get("gender", None)
-            new_actor_age = body.get("age", None)
-            if new_actor_name is None or new_actor_gender is None or new_actor_age is None:
-                abort(422)
-            if new_actor_name != "":
-                actor.name = new_actor_name
-            if new_actor_gender != "":
-                actor.gender = new_actor_gender
-            if new_actor_age != "":
-                actor.age = new_actor_age
-            actor.update()
-            return jsonify(
+            response = jsonify(
                 {
                     "success": True,
-                    "actors": [actor.repr()]
+                    "actors": represent_rows(Actor, [actor])
                 }
             )
+            response.set_etag(version_etag(actor.version))
+            return response
+        except VersionMismatch:
+            abort(412)
         except Exception as e:
             if hasattr(e, 'code') and e.code == 401:
                 abort(401)
@@ -146,6 +337,7 @@ def create_app(test_config=None):
             where <id> is the existing model id
             responds with a 404 error if <id> is not found
             deletes the corresponding row for <id>
+            'If-Match: <ETag of GET /actors/<id>>' deletes it only if it was not changed since (412 otherwise)
             requires the 'delete:actors' permission
         returns status code 200 and json {"success": True, "deleted": id} where id is the id of the deleted record
              or appropriate status code indicating reason for failure
@@ -156,16 +348,16 @@ def create_app(test_config=None):
     # def delete_actor(actor_id):
         try:
             actor_id = int(actor_id)
-            actor = Actor.query.filter(Actor.id == actor_id).one_or_none()
-            if actor is None:
+            if not delete_returning(Actor, actor_id, if_match_versions()):
                 abort(404)
-            actor.delete()
             return jsonify(
                 {
                     "success": True,
                     "deleted": actor_id,
                 }
             )
+        except VersionMismatch:
+            abort(412)
         except Exception as e:
             if hasattr(e, 'code') and e.code == 404:
                 abort(404)
@@ -176,26 +368,141 @@ def create_app(test_config=None):
     # ---------------------------------------------
     #  Movies
     # ---------------------------------------------
+    '''
+        request_movies_tables() returns the tables read by GET /movies (see api/queries.py)
+    '''
+    def request_movies_tables():
+        return queries.movies_tables(request.args)
+
     ''' GET /movies
-        returns status code 200 and json {"success": True, "movies": movies} where movies is the list of movies
+            ?limit=<n> page size (capped by LIST_MAX_PAGE_SIZE)
+            ?after=<cursor> the next_cursor returned with the previous page
+            ?count=exact|estimate|cached how total_movies is computed (see database/counts.py)
+            ?filter=<column>:<operator>:<value> (repeatable) e.g. ?filter=release_date:gte:01-01-2000
+            ?sort=<column>,-<column> e.g. ?sort=-release_date (see api/filtering.py)
+            ?include=cast adds the cast (the list of actors) to every movie, loaded
+                with one query per page of movies
+            ?stream=true returns all the movies as a streamed response (no paging)
+            'Accept: application/x-ndjson' returns all the movies as streamed json lines
+        returns status code 200 and json {"success": True, "movies": movies, "next_cursor": cursor}
+            where movies is the page of movies and cursor is null on the last page
+            or 304 if the If-None-Match/If-Modified-Since copy is current (see api/conditional.py)
             or appropriate status code indicating reason for failure
+        responses are cached when RESPONSE_CACHE is set (see api/response_cache.py)
     '''
     @app.route("/movies")
     @requires_auth('get:movies')
+    @response_cache.cached(request_movies_tables)
+    @conditional(request_movies_tables)
     def get_movies(payload):
         try:
-            movies = Movie.query.order_by(Movie.id).all()
-            repr_movies = [movie.repr() for movie in movies]
-            if len(movies) == 0:
+            output_format = stream_format(request)
+            if output_format is not None:
+                query, sort_keys, conditions, represent = queries.movies_query(db.session, request.args)
+                return stream_response(query.order_by(*order_by_clauses(sort_keys)), "movies", output_format,
+                                       nested=True, represent=represent)
+            return jsonify(queries.list_movies(db.session, request.args))
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            if hasattr(e, 'code') and e.code == 404:
+                abort(404)
+            else:
+                abort(422)
+
+    ''' GET /movies/search
+            ?q=<text> the words to search for in the title of the movies (e.g. ?q=godf par),
+                every word must start a word of the title
+            ?limit=<n>, ?after=<cursor> paging as GET /movies
+            responds with a 400 error if q is missing, has no words or is longer than SEARCH_MAX_QUERY_LENGTH
+            requires the 'get:movies' permission
+        returns status code 200 and json {"success": True, "movies": movies, "next_cursor": cursor}
+            where movies is the page of the matching movies, the most relevant first (see database/search.py)
+            or 304 if the If-None-Match/If-Modified-Since copy is current (see api/conditional.py)
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/movies/search")
+    @requires_auth('get:movies')
+    @response_cache.cached('Movie')
+    @conditional('Movie')
+    def search_movies(payload):
+        try:
+            q = request.args.get('q', '').strip()
+            if q == "" or len(q) > SEARCH_MAX_QUERY_LENGTH:
+                abort(400)
+            query, sort_keys = search_query(db.session, Movie, q, REPRESENTED_COLUMNS[Movie])
+            if query is None:
+                abort(400)
+            limit, after = parse_page_args(request.args)
+            rows, next_cursor = paginate(query, sort_keys, limit, after)
+            return jsonify(
+                {
+                    "success": True,
+                    "movies": represent_rows(Movie, rows),
+                    "next_cursor": next_cursor,
+                }
+            )
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            else:
+                abort(422)
+
+    ''' GET /movies/<id>
+            where <id> is the existing model id
+            responds with a 404 error if <id> is not found
+            requires the 'get:movies' permission
+        returns status code 200 and json {"success": True, "movies": movie} where movie an array containing only the movie
+            or 304 if the If-None-Match/If-Modified-Since copy is current (see api/conditional.py)
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/movies/<movie_id>")
+    @requires_auth('get:movies')
+    @response_cache.cached('Movie')
+    @conditional('Movie', row=(Movie, 'movie_id'))
+    def get_movie(payload, movie_id):
+        try:
+            return jsonify(queries.get_movie(db.session, request.args, movie_id))
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 404:
+                abort(404)
+            else:
+                abort(422)
+
+    ''' GET /movies/<id>/actors
+            where <id> is the existing model id
+            responds with a 404 error if <id> is not found
+            ?limit=<n>, ?after=<cursor> paging as GET /actors
+            requires the 'get:actors' permission
+        returns status code 200 and json {"success": True, "movie_id": id, "actors": actors, "next_cursor": cursor}
+            where actors is the page of the actors playing in the movie (the cast)
+            or 304 if the If-None-Match/If-Modified-Since copy is current (see api/conditional.py)
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/movies/<movie_id>/actors")
+    @requires_auth('get:actors')
+    @response_cache.cached('Movie', 'Catalog', 'Actor')
+    @conditional('Movie', 'Catalog', 'Actor')
+    def get_movie_actors(payload, movie_id):
+        try:
+            movie_id = int(movie_id)
+            if db.session.query(Movie.id).filter(Movie.id == movie_id).one_or_none() is None:
                 abort(404)
+            limit, after = parse_page_args(request.args)
+            actor_ids = db.select(Catalog.actor_id).where(Catalog.movie_id == movie_id)
+            actors, next_cursor = paginate(represented_query(Actor).filter(Actor.id.in_(actor_ids)),
+                                           [(Actor.id, False)], limit, after)
             return jsonify(
                 {
                     "success": True,
-                    "movies": [repr_movies],
-                    "total_movies": len(Movie.query.all()),
+                    "movie_id": movie_id,
+                    "actors": represent_rows(Actor, actors),
+                    "next_cursor": next_cursor,
                 }
             )
         except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
             if hasattr(e, 'code') and e.code == 404:
                 abort(404)
             else:
@@ -211,14 +518,7 @@ def create_app(test_config=None):
     @requires_auth('post:movies')
     def create_movie(payload):
         try:
-            body = request.get_json()
-            new_movie_title = body.get("title", None)
-            new_movie_release_date = body.get("release_date", None)
-            if new_movie_title is None or new_movie_title == "":
-                abort(422)
-            if new_movie_release_date is None or new_movie_release_date == "":
-                abort(422)
-            movie_entity = Movie(title=new_movie_title, release_date=new_movie_release_date)
+            movie_entity = Movie(**validate_movie(request.get_json()))
             movie_entity.insert()
             return jsonify(
                 {
@@ -234,12 +534,86 @@ def create_app(test_config=None):
             else:
                 abort(422)
 
+    '''
+        POST /movies/batch
+            creates up to BATCH_MAX_ITEMS rows in the movies table in a single transaction
+            the body is a list of movies (or {"movies": [movies]}), each validated like POST /movies
+            ?mode=atomic (default) nothing is created if any movie is invalid
+            ?mode=partial the valid movies are created and the invalid ones are reported
+            requires the 'post:movies' permission
+        returns status code 200 and json {"success": True, "movies": movies, "created": n, "failed": m, "results": results}
+            where movies are the newly created movies and results holds a result per submitted item
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/movies/batch", methods=["POST"])
+    @requires_auth('post:movies')
+    def create_movies_batch(payload):
+        try:
+            return create_batch(Movie, "movies", validate_movie)
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            else:
+                abort(422)
+
+    '''
+        PATCH /movies/batch
+            updates up to BATCH_MAX_ITEMS rows of the movies table in a single transaction,
+            with a single UPDATE statement
+            the body is a list of changes (or {"movies": [changes]}), each with the "id" of its movie,
+            its fields validated like PATCH /movies/<id> ("" leaves a field unchanged)
+            ?mode=atomic (default) nothing is updated if any item is invalid
+            ?mode=partial the valid items are updated and the invalid ones are reported
+            the ids not found are reported (404) in both modes
+            requires the 'patch:movies' permission
+        returns status code 200 and json {"success": True, "movies": movies, "updated": n, "failed": m, "results": results}
+            where movies are the updated movies and results holds a result per submitted item
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/movies/batch", methods=["PATCH"])
+    @requires_auth('patch:movies')
+    def update_movies_batch(payload):
+        try:
+            return update_batch(Movie, "movies", validate_movie_update)
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            else:
+                abort(422)
+
+    '''
+        DELETE /movies/batch
+            deletes up to BATCH_MAX_ITEMS rows of the movies table in a single transaction,
+            with a single DELETE statement
+            the body is a list of ids (or {"ids": [ids]})
+            ?mode=atomic (default) nothing is deleted if any id is invalid
+            ?mode=partial the valid ids are deleted and the invalid ones are reported
+            the ids not found are reported (404) in both modes
+            requires the 'delete:movies' permission
+        returns status code 200 and json {"success": True, "deleted": ids, "failed": m, "results": results}
+            where ids are the ids of the deleted records and results holds a result per submitted id
+            or appropriate status code indicating reason for failure
+    '''
+    @app.route("/movies/batch", methods=["DELETE"])
+    @requires_auth('delete:movies')
+    def delete_movies_batch(payload):
+        try:
+            return delete_batch(Movie)
+        except Exception as e:
+            if hasattr(e, 'code') and e.code == 400:
+                abort(400)
+            else:
+                abort(422)
+
     ''' PATCH /movies/<id>
             where <id> is the existing model id
             responds with a 404 error if <id> is not found
             updates the corresponding row for <id>
+            'If-Match: <ETag of GET /movies/<id>>' updates it only if it was not changed since
+                (412 otherwise, see api/conditional.py)
             requires the 'patch:movies' permission
         returns status code 200 and json {"success": True, "movies": movie} where movie an array containing only the updated movie
+            and the ETag of its new version
              or appropriate status code indicating reason for failure
     '''
     @app.route("/movies/<movie_id>", methods=["PATCH"])
@@ -248,25 +622,23 @@ def create_app(test_config=None):
     # def update_movie(movie_id):
         try:
             movie_id = int(movie_id)
-            movie = Movie.query.filter(Movie.id == movie_id).one_or_none()
+            # "" leaves a field unchanged
+            values = validate_movie_update(request.get_json())
+            # one UPDATE ... RETURNING, no row means no movie
+            movie = update_returning(Movie, movie_id, values, REPRESENTED_COLUMNS[Movie] + (Movie.version,),
+                                     if_match_versions())
             if movie is None:
                 abort(404)
-            body = request.get_json()
-            new_movie_title = body.get("title", None)
-            new_movie_release_date = body.get("release_date", None)
-            if new_movie_title is None or new_movie_release_date is None:
-                abort(422)
-            if new_movie_title != "":
-                movie.title = new_movie_title
-            if new_movie_release_date != "":
-                movie.release_date = new_movie_release_date
-            movie.update()
-            return jsonify(
+            response = jsonify(
                 {
                     "success": True,
-                    "movies": [movie.repr()]
+                    "movies": represent_rows(Movie, [movie])
                 }
             )
+            response.set_etag(version_etag(movie.version))
+            return response
+        except VersionMismatch:
+            abort(412)
         except Exception as e:
             if hasattr(e, 'code') and e.code == 401:
                 abort(401)
@@ -280,6 +652,7 @@ def create_app(test_config=None):
             where <id> is the existing model id
             responds with a 404 error if <id> is not found
             deletes the corresponding row for <id>
+            'If-Match: <ETag of GET /movies/<id>>' deletes it only if it was not changed since (412 otherwise)
             requires the 'delete:movies' permission
         returns status code 200 and json {"success": True, "deleted": id} where id is the id of the deleted record
              or appropriate status code indicating reason for failure
@@ -290,16 +663,16 @@ def create_app(test_config=None):
     # def delete_movie(movie_id):
         try:
             movie_id = int(movie_id)
-            movie = Movie.query.filter(Movie.id == movie_id).one_or_none()
-            if movie is None:
+            if not delete_returning(Movie, movie_id, if_match_versions()):
                 abort(404)
-            movie.delete()
             return jsonify(
                 {
                     "success": True,
                     "deleted": movie_id,
                 }
             )
+        except VersionMismatch:
+            abort(412)
         except Exception as e:
             if hasattr(e, 'code') and e.code == 404:
                 abort(404)
@@ -313,24 +686,40 @@ def create_app(test_config=None):
         jsonify({
             "success": False,
             "error": 404,
-            "message": "resource not found"
+            "message": ERROR_MESSAGES[404]
             }), 404
 
     '''
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({
+            "success": False,
+            "error": 400,
+            "message": ERROR_MESSAGES[400]
+        }), 400
+
     @app.errorhandler(422)
     def unprocessable(error):
         return jsonify({
             "success": False,
             "error": 422,
-            "message": "unprocessable"
+            "message": ERROR_MESSAGES[422]
         }), 422
 
+    @app.errorhandler(412)
+    def precondition_failed(error):
+        return jsonify({
+            "success": False,
+            "error": 412,
+            "message": ERROR_MESSAGES[412]
+        }), 412
+
     @app.errorhandler(404)
     def resource_not_found(error):
         return jsonify({
             "success": False,
             "error": 404,
-            "message": "resource not found"
+            "message": ERROR_MESSAGES[404]
         }), 404
 
     @app.errorhandler(AuthError)
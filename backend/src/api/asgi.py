@@ -0,0 +1,299 @@
+import contextvars
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import http_date, parse_date, parse_etags, quote_etag, unquote_etag
+
+from api import CORS_HEADERS, ERROR_MESSAGES, create_app
+from api.conditional import is_not_modified, last_modified_of, resource_etag, row_etag
+from api.metrics import NativeRequest
+from api.response_cache import pack, response_cache, unpack
+from api.queries import get_actor, get_movie, list_actors, list_movies, movies_tables
+from api.serialization import dumps
+from api.streaming import NDJSON_MIMETYPE
+from auth.auth import AuthError, authorize_async
+from database.models import Actor, Movie, get_table_versions
+from database.pool import async_engine_options, instrument_pool
+
+
+'''
+ASGI application
+
+    create_asgi_app() serves the routes of create_app() to an ASGI server, e.g.
+        uvicorn --factory api.asgi:create_asgi_app --workers 1
+
+    the read routes (GET /actors, /actors/<id>, /movies, /movies/<id>) are
+    served natively: the token is checked with authorize_async and the database
+    is queried through an async engine (asyncpg on Postgres, aiosqlite on
+    SQLite), so a request waiting for the database or for the signing keys does
+    not hold a thread, and one process serves thousands of concurrent requests
+    the queries are the ones of the Flask routes (api/queries.py: same filters,
+    pagination, counts and bodies; same ETags and error bodies), run with
+    AsyncSession.run_sync
+    all the other routes, and the streamed lists, are passed to the Flask app
+    (run in a thread pool by asgiref's WsgiToAsgi)
+    the native routes read through the response cache (RESPONSE_CACHE) like
+    the Flask routes: same keys and cached values, so the two share the entries
+    of a shared (redis) backend
+
+    ASGI_DATABASE_URL the url of the async engine, derived from the database url
+        of the Flask app by default (postgresql+asyncpg://, sqlite+aiosqlite://)
+    ASGI_DATABASE_POOL_SIZE, ASGI_DATABASE_MAX_OVERFLOW pool of the async engine,
+        the other pool settings are the ones of database/pool.py
+'''
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+'''
+    async_database_url(url) method
+    returns the url of the async driver of the database url
+'''
+def async_database_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError('No async driver for the database: {}'.format(backend))
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def _dumps(obj):
+    # same output as jsonify
+    return dumps(obj) + "\n"
+
+
+def _response(body=None, status_code=200, headers=None):
+    response = Response(None if body is None else _dumps(body), status_code=status_code,
+                        headers=headers, media_type=None if body is None else 'application/json')
+    for name, value in CORS_HEADERS:
+        response.headers.append(name, value)
+    return response
+
+
+def _error_response(status_code, message):
+    return _response({"success": False, "error": status_code, "message": message}, status_code)
+
+
+# added to every response by the Flask app and by _response, not cached
+_CORS_HEADER_NAMES = set(name.lower() for name, value in CORS_HEADERS)
+
+
+def _cached_response(request, value):
+    # the cached response, or 304 if the copy of the client is current (as
+    # Response.make_conditional does on the cache hits of the Flask routes)
+    status, headers, body = unpack(value)
+    fields = {name.lower(): field for name, field in headers}
+    etag = fields.get('etag')
+    if status == 200 and etag is not None:
+        last_modified = parse_date(fields.get('last-modified'))
+        if is_not_modified(unquote_etag(etag)[0], last_modified,
+                           parse_etags(request.headers.get('If-None-Match')),
+                           parse_date(request.headers.get('If-Modified-Since'))):
+            return _response(status_code=304, headers={name: field for name, field in headers
+                                                       if name.lower() in ('etag', 'last-modified')})
+    response = Response(body, status_code=status)
+    for name, field in headers:
+        response.headers.append(name, field)
+    for name, field in CORS_HEADERS:
+        response.headers.append(name, field)
+    return response
+
+
+async def _cache_call(function, *args):
+    # the calls to a network backend (redis) do not block the event loop
+    if response_cache.backend.blocking:
+        return await run_in_threadpool(function, *args)
+    return function(*args)
+
+
+''' IsolatedWSGI
+runs the Flask app in a new context (contextvars) on each request
+    asgiref runs the WSGI app in worker threads with a copy of the context of
+    the event loop, which holds the app context pushed by setup_db; without
+    a new context every request would share that app context and its db.session
+'''
+class IsolatedWSGI:
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        context = contextvars.Context()
+        return _ContextIterable(context, context.run(self.wsgi_app, environ, start_response))
+
+
+class _ContextIterable:
+
+    def __init__(self, context, iterable):
+        self.context = context
+        self.iterator = iter(iterable)
+        self.iterable = iterable
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.context.run(next, self.iterator)
+
+    def close(self):
+        if hasattr(self.iterable, 'close'):
+            self.context.run(self.iterable.close)
+
+
+''' NativeRoute
+an ASGI endpoint serving a read route natively (see the module description)
+    the view is a function view(session, args, *path params) run with
+    AsyncSession.run_sync, it returns the json body or aborts like a Flask route
+    requests the view does not serve (streams) are passed to the Flask app
+    row is the (model, path parameter) of the routes of a single row, as in
+    @conditional
+    rule is the url rule of the Flask route, the route label of its metrics
+'''
+class NativeRoute:
+
+    def __init__(self, asgi_app, rule, permission, tables, view, row=None):
+        self.asgi_app = asgi_app
+        self.rule = rule
+        self.permission = permission
+        self.tables = tables
+        self.view = view
+        self.row = row
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if self.asgi_app.is_stream(request):
+            await self.asgi_app.wsgi(scope, receive, send)
+            return
+        metrics = NativeRequest(request.method, self.rule)
+        response = await self.respond(request)
+        metrics.done(response.status_code)
+        await response(scope, receive, send)
+
+    async def respond(self, request):
+        try:
+            payload = await authorize_async(request.headers.get('Authorization'), self.permission)
+            args = MultiDict(request.query_params.multi_items())
+            if response_cache.backend is None:
+                return await self.query(request, args)
+            return await self.read_through(request, args, payload)
+        except AuthError as ex:
+            return _error_response(ex.status_code, ex.error['description'])
+        except HTTPException as ex:
+            code = ex.code if ex.code in ERROR_MESSAGES else 422
+            return _error_response(code, ERROR_MESSAGES[code])
+        except Exception:
+            return _error_response(422, ERROR_MESSAGES[422])
+
+    def tables_of(self, args):
+        return self.tables(args) if callable(self.tables) else self.tables
+
+    async def query(self, request, args):
+        async with self.asgi_app.session_factory() as session:
+            return await session.run_sync(self.run, request, args)
+
+    async def read_through(self, request, args, payload):
+        # as @response_cache.cached: the key is taken before the query, a
+        # write during the query makes the stored response unreachable
+        tables = self.tables_of(args)
+        key = await _cache_call(response_cache.request_key, request.scope['path'], args,
+                                request.headers.get('Accept', ''), tables, payload)
+        value = await _cache_call(response_cache.get, key)
+        if value is not None:
+            return _cached_response(request, value)
+        response = await self.query(request, args)
+        if response.status_code == 200:
+            headers = [(name, field) for name, field in response.headers.items()
+                       if name.lower() not in _CORS_HEADER_NAMES]
+            await _cache_call(response_cache.set, key, pack(200, headers, response.body), tables)
+        return response
+
+    def run(self, session, request, args):
+        # conditional GET (see api/conditional.py)
+        tables = self.tables_of(args)
+        versions = get_table_versions(tables, session)
+        # request.full_path of Flask
+        full_path = request.scope.get('root_path', '') + request.scope['path'] + '?' + \
+            request.scope['query_string'].decode('latin1')
+        if self.row is None:
+            etag = resource_etag(tables, versions, full_path, request.headers.get('Accept', ''))
+        else:
+            etag = row_etag(self.row[0], request.path_params[self.row[1]], session)
+        last_modified = last_modified_of(versions)
+        headers = {'ETag': quote_etag(etag)} if etag is not None else {}
+        if last_modified is not None:
+            headers['Last-Modified'] = http_date(last_modified)
+        if etag is not None and is_not_modified(etag, last_modified,
+                                                parse_etags(request.headers.get('If-None-Match')),
+                                                parse_date(request.headers.get('If-Modified-Since'))):
+            return _response(status_code=304, headers=headers)
+        body = self.view(session, args, **request.path_params)
+        return _response(body, headers=headers)
+
+
+''' CastingAgencyASGI
+the ASGI application: the native read routes in front of the Flask app
+'''
+class CastingAgencyASGI:
+
+    def __init__(self, flask_app, database_url=None):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(IsolatedWSGI(flask_app))
+        database_url = database_url or os.getenv('ASGI_DATABASE_URL') or \
+            async_database_url(flask_app.config["SQLALCHEMY_DATABASE_URI"])
+        self.engine = create_async_engine(database_url, **async_engine_options(
+            database_url,
+            pool_size=int(os.getenv('ASGI_DATABASE_POOL_SIZE', 20)),
+            max_overflow=int(os.getenv('ASGI_DATABASE_MAX_OVERFLOW', 10))))
+        instrument_pool(self.engine, 'asgi')
+        self.session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.app = Starlette(
+            routes=[
+                Route("/actors",
+                      NativeRoute(self, "/actors", 'get:actors', ('Actor',), list_actors),
+                      methods=["GET"]),
+                Route("/actors/{actor_id:int}",
+                      NativeRoute(self, "/actors/<actor_id>", 'get:actors', ('Actor',), get_actor,
+                                  row=(Actor, 'actor_id')),
+                      methods=["GET"]),
+                Route("/movies",
+                      NativeRoute(self, "/movies", 'get:movies', movies_tables, list_movies),
+                      methods=["GET"]),
+                Route("/movies/{movie_id:int}",
+                      NativeRoute(self, "/movies/<movie_id>", 'get:movies', ('Movie',), get_movie,
+                                  row=(Movie, 'movie_id')),
+                      methods=["GET"]),
+                Mount("/", app=self.wsgi),
+            ],
+            on_shutdown=[self.engine.dispose],
+        )
+
+    def is_stream(self, request):
+        if request.headers.get('Accept', '').split(',')[0].strip() == NDJSON_MIMETYPE:
+            return True
+        return request.query_params.get('stream', 'false').lower() == 'true'
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+
+'''
+create_asgi_app(flask_app, database_url)
+    returns the ASGI application serving the routes of the Flask app
+    (create_app() by default) with the async engine of database_url
+    (derived from the url of the Flask app by default)
+'''
+def create_asgi_app(flask_app=None, database_url=None):
+    return CastingAgencyASGI(flask_app or create_app(), database_url)
@@ -0,0 +1,291 @@
+import os
+
+from flask import request, jsonify, abort
+from sqlalchemy import exc
+from werkzeug.exceptions import HTTPException
+
+from api.serialization import REPRESENTED_COLUMNS, represent_rows
+from database.models import (db, bump_table_version, bump_table_versions, notify_write, notify_cascade,
+                             ON_DELETE_CASCADE)
+from database.bulk import insert_many, insert_each, update_many, update_each, delete_many, delete_each
+from database.counts import row_counts
+
+
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 500))
+BATCH_MODES = ('atomic', 'partial')
+
+
+'''
+    parse_batch_items(body, key) method
+    @INPUTS
+        body: the json body, either a list of items or {key: [items]}
+        key: the collection name, e.g. 'actors'
+
+    aborts with 422 if there are no items or more than BATCH_MAX_ITEMS
+    returns the list of items
+'''
+def parse_batch_items(body, key):
+    items = body.get(key, None) if isinstance(body, dict) else body
+    if not isinstance(items, list) or len(items) == 0:
+        abort(422)
+    if len(items) > BATCH_MAX_ITEMS:
+        abort(422)
+    return items
+
+
+'''
+    parse_batch_mode(args) method
+    aborts with 400 for an unknown ?mode=
+    returns 'atomic' (all-or-nothing, the default) or 'partial'
+'''
+def parse_batch_mode(args):
+    mode = args.get('mode', 'atomic')
+    if mode not in BATCH_MODES:
+        abort(400)
+    return mode
+
+
+def _error_result(index, code, message, row_id=None):
+    result = {"index": index, "success": False, "error": code, "message": message}
+    if row_id is not None:
+        result["id"] = row_id
+    return result
+
+
+def _invalid_response(results):
+    return jsonify({
+        "success": False,
+        "error": 422,
+        "message": "unprocessable",
+        "results": [result for result in results if result is not None],
+    }), 422
+
+
+'''
+    parse_batch_id(item, seen) method
+    @INPUTS
+        item: an id, or an item with an "id"
+        seen: the ids of the previous items of the request
+
+    aborts with 422 if the id is not an integer (a json number without a
+    fraction, not a boolean, or a string of digits) or is repeated (a row is
+    written once per request)
+    returns the id
+'''
+def parse_batch_id(item, seen):
+    row_id = item.get("id") if isinstance(item, dict) else item
+    if isinstance(row_id, str) and row_id.isascii() and row_id.isdigit():
+        row_id = int(row_id)
+    elif type(row_id) is not int:
+        abort(422)
+    if row_id in seen:
+        abort(422)
+    seen.add(row_id)
+    return row_id
+
+
+'''
+    create_batch(model, key, validate) method
+    @INPUTS
+        model: the model class, e.g. Actor
+        key: the collection name, e.g. 'actors'
+        validate: the function validating a single item (see api/validation.py)
+
+    validates every item of the request body and inserts the valid ones
+    in a single transaction with a multi-row INSERT ... RETURNING
+        ?mode=atomic (default) nothing is inserted if any item is invalid
+        ?mode=partial the valid items are inserted, the invalid ones are reported
+    returns the response with the created entities and a result per item
+'''
+def create_batch(model, key, validate):
+    mode = parse_batch_mode(request.args)
+    items = parse_batch_items(request.get_json(), key)
+
+    results = [None] * len(items)
+    rows = []
+    indexes = []
+    for index, item in enumerate(items):
+        try:
+            rows.append(validate(item))
+            indexes.append(index)
+        except HTTPException as e:
+            results[index] = _error_result(index, e.code, "unprocessable")
+
+    if mode == 'atomic' and len(rows) < len(items):
+        return _invalid_response(results)
+
+    # nothing is written (nor the table version bumped) if no item is valid
+    entities = []
+    if rows:
+        try:
+            entities = insert_many(db.session, model, rows)
+            bump_table_version(model.__tablename__)
+            db.session.commit()
+        except exc.SQLAlchemyError:
+            db.session.rollback()
+            if mode == 'atomic':
+                abort(422)
+            # find out which rows the database rejects
+            entities = insert_each(db.session, model, rows)
+            if any(entity is not None for entity in entities):
+                bump_table_version(model.__tablename__)
+                db.session.commit()
+            else:
+                db.session.rollback()
+
+    created = []
+    for index, entity in zip(indexes, entities):
+        if entity is None:
+            results[index] = _error_result(index, 422, "unprocessable")
+            continue
+        created.append(entity.repr())
+        results[index] = {"index": index, "success": True, "id": entity.id}
+    if created:
+        row_counts.adjust(model.__tablename__, len(created))
+        notify_write(model.__tablename__)
+
+    return jsonify({
+        "success": True,
+        key: created,
+        "created": len(created),
+        "failed": len(items) - len(created),
+        "results": results,
+    })
+
+
+'''
+    update_batch(model, key, validate) method
+    @INPUTS
+        model: the model class, e.g. Actor
+        key: the collection name, e.g. 'actors'
+        validate: the function validating the changes of a single item (see api/validation.py)
+
+    validates every item of the request body (its "id" and its fields, ""
+    leaves a field unchanged) and updates the valid ones in a single
+    transaction with a single UPDATE ... FROM (VALUES ...) statement
+        ?mode=atomic (default) nothing is updated if any item is invalid
+        ?mode=partial the valid items are updated, the invalid ones are reported
+    the ids with no row are reported (404) in both modes
+    returns the response with the updated entities and a result per item
+'''
+def update_batch(model, key, validate):
+    mode = parse_batch_mode(request.args)
+    items = parse_batch_items(request.get_json(), key)
+
+    results = [None] * len(items)
+    rows = []
+    indexes = []
+    seen = set()
+    for index, item in enumerate(items):
+        try:
+            row_id = parse_batch_id(item, seen)
+            rows.append((row_id, validate(item)))
+            indexes.append(index)
+        except HTTPException as e:
+            results[index] = _error_result(index, e.code, "unprocessable")
+
+    if mode == 'atomic' and len(rows) < len(items):
+        return _invalid_response(results)
+
+    columns = REPRESENTED_COLUMNS[model]
+    rejected = set()
+    try:
+        updated = update_many(db.session, model, rows, columns)
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        if mode == 'atomic':
+            abort(422)
+        # find out which rows the database rejects
+        updated, rejected = update_each(db.session, model, rows, columns)
+    if updated:
+        bump_table_version(model.__tablename__)
+        db.session.commit()
+        notify_write(model.__tablename__)
+    else:
+        db.session.rollback()
+
+    represented = []
+    for index, (row_id, changes) in zip(indexes, rows):
+        if row_id in rejected:
+            results[index] = _error_result(index, 422, "unprocessable", row_id)
+        elif row_id not in updated:
+            results[index] = _error_result(index, 404, "resource not found", row_id)
+        else:
+            represented.append(updated[row_id])
+            results[index] = {"index": index, "success": True, "id": row_id}
+
+    return jsonify({
+        "success": True,
+        key: represent_rows(model, represented),
+        "updated": len(represented),
+        "failed": len(items) - len(represented),
+        "results": results,
+    })
+
+
+'''
+    delete_batch(model) method
+    @INPUTS
+        model: the model class, e.g. Actor
+
+    deletes the rows of the ids of the request body (a list of ids, or
+    {"ids": [ids]}) in a single transaction with a single
+    DELETE ... WHERE id = ANY(...) statement
+        ?mode=atomic (default) nothing is deleted if any id is invalid, or if
+            the database rejects any of the deletes (e.g. a failed constraint)
+        ?mode=partial the valid ids are deleted, the other ones are reported
+    the ids with no row are reported (404) in both modes
+    returns the response with the deleted ids and a result per id
+'''
+def delete_batch(model):
+    mode = parse_batch_mode(request.args)
+    items = parse_batch_items(request.get_json(), "ids")
+
+    results = [None] * len(items)
+    ids = []
+    indexes = []
+    seen = set()
+    for index, item in enumerate(items):
+        try:
+            ids.append(parse_batch_id(item, seen))
+            indexes.append(index)
+        except HTTPException as e:
+            results[index] = _error_result(index, e.code, "unprocessable")
+
+    if mode == 'atomic' and len(ids) < len(items):
+        return _invalid_response(results)
+
+    rejected = set()
+    try:
+        deleted = delete_many(db.session, model, ids)
+    except exc.SQLAlchemyError:
+        db.session.rollback()
+        if mode == 'atomic':
+            abort(422)
+        # find out which rows the database rejects
+        deleted, rejected = delete_each(db.session, model, ids)
+    if deleted:
+        cascaded = ON_DELETE_CASCADE[model.__tablename__]
+        bump_table_versions((model.__tablename__,) + cascaded)
+        db.session.commit()
+        row_counts.adjust(model.__tablename__, -len(deleted))
+        notify_write(model.__tablename__)
+        notify_cascade(cascaded)
+    else:
+        db.session.rollback()
+
+    deleted_ids = set(deleted)
+    for index, row_id in zip(indexes, ids):
+        if row_id in rejected:
+            results[index] = _error_result(index, 422, "unprocessable", row_id)
+        elif row_id not in deleted_ids:
+            results[index] = _error_result(index, 404, "resource not found", row_id)
+        else:
+            results[index] = {"index": index, "success": True, "id": row_id}
+
+    return jsonify({
+        "success": True,
+        "deleted": [row_id for row_id in ids if row_id in deleted_ids],
+        "failed": len(items) - len(deleted_ids),
+        "results": results,
+    })
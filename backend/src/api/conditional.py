@@ -0,0 +1,168 @@
+import datetime
+import hashlib
+import re
+from functools import wraps
+
+from flask import Response, g, make_response, request
+
+from database.models import get_row_version, get_table_versions
+
+
+'''
+Conditional GET
+
+    responses of the decorated routes carry a strong ETag derived from the
+    versions of the tables they read (see TableVersion) and the request url,
+    and a Last-Modified header with the last modification time of these tables
+    a request with a matching If-None-Match (or, without If-None-Match, an
+    If-Modified-Since not older than Last-Modified) gets a 304 Not Modified,
+    answered from the TableVersion rows without running the route at all
+    the routes of a single row (e.g. GET /actors/<id>) use the version of the
+    row as ETag instead, which PATCH and DELETE accept as If-Match: a write
+    whose If-Match is not the current version of the row gets a 412
+    Precondition Failed (see update_returning in database/models.py)
+'''
+
+VERSION_ETAG = re.compile(r'^v([0-9]+)$')
+
+
+def _as_utc(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    # http dates have a one second resolution
+    return value.astimezone(datetime.timezone.utc).replace(microsecond=0)
+
+
+'''
+    request_tables_of(tables) method
+    returns the tables read by the current request: the given table names,
+    or the result of tables[0]() if the route passed a function
+'''
+def request_tables_of(tables):
+    if len(tables) == 1 and callable(tables[0]):
+        return tuple(tables[0]())
+    return tables
+
+
+'''
+    resource_etag(tables, versions, full_path, accept) method
+    returns the (unquoted) ETag of the representation of the url full_path
+    (the current request's by default)
+'''
+def resource_etag(tables, versions, full_path=None, accept=None):
+    if full_path is None:
+        full_path = request.full_path
+        accept = request.headers.get('Accept', '')
+    parts = ['{}:{}:{}'.format(table, *versions.get(table, (0, None))) for table in tables]
+    parts.append(full_path)
+    parts.append(accept or '')
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+'''
+    version_etag(version) method
+    returns the (unquoted) ETag of a row at the given version
+'''
+def version_etag(version):
+    return 'v{}'.format(version)
+
+
+'''
+    row_etag(model, row_id, session) method
+    returns the (unquoted) ETag of the row of the model with the given id,
+    or None if there is no such row
+'''
+def row_etag(model, row_id, session=None):
+    try:
+        row_id = int(row_id)
+    except (TypeError, ValueError):
+        return None
+    version = get_row_version(model, row_id, session)
+    return None if version is None else version_etag(version)
+
+
+'''
+    if_match_versions() method
+    returns the row versions named by the If-Match header of the current request,
+    or None without If-Match (or with If-Match: *), i.e. an unconditional write
+    weak ETags never match (If-Match uses the strong comparison)
+'''
+def if_match_versions():
+    if_match = request.if_match
+    if not if_match or if_match.star_tag:
+        return None
+    versions = []
+    for etag in if_match.as_set():
+        match = VERSION_ETAG.match(etag)
+        if match:
+            versions.append(int(match.group(1)))
+    return versions
+
+
+'''
+    last_modified_of(versions) method
+    returns the last modification time of the tables (or None)
+'''
+def last_modified_of(versions):
+    updated = [_as_utc(updated_at) for version, updated_at in versions.values()]
+    return max(updated) if updated else None
+
+
+'''
+    is_not_modified(etag, last_modified, if_none_match, if_modified_since) method
+    returns True if the client's copy (If-None-Match/If-Modified-Since) is current
+    (the parsed headers of the current request by default)
+'''
+def is_not_modified(etag, last_modified, if_none_match=None, if_modified_since=None):
+    if if_none_match is None:
+        if_none_match = request.if_none_match
+        if_modified_since = request.if_modified_since
+    if if_none_match:
+        return if_none_match.contains(etag)
+    if if_modified_since and last_modified is not None:
+        return last_modified <= _as_utc(if_modified_since)
+    return False
+
+
+'''
+    implement @conditional(*tables, row) decorator method
+    @INPUTS
+        tables: names of the tables the route reads, e.g. 'Actor'
+            or a single function returning them for the current request
+        row: (model, path parameter of the id) of the routes of a single row,
+            e.g. (Actor, 'actor_id'), whose ETag is the version of the row
+
+    must be applied below @requires_auth, so that unauthorized requests never get a 304
+    returns the decorator which answers 304 for current copies and adds the
+    ETag and Last-Modified headers to the 200 responses of the decorated route
+'''
+def conditional(*tables, row=None):
+    def conditional_decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            request_tables = request_tables_of(tables)
+            versions = get_table_versions(request_tables)
+            # what the response was read from (see api/response_cache.py)
+            g.table_versions = versions
+            if row is None:
+                etag = resource_etag(request_tables, versions)
+            else:
+                etag = row_etag(row[0], kwargs[row[1]])
+            last_modified = last_modified_of(versions)
+
+            # no row, no ETag: the route answers (404)
+            if etag is not None and is_not_modified(etag, last_modified):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            if etag is not None:
+                response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return conditional_decorator
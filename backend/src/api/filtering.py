@@ -0,0 +1,123 @@
+import datetime
+import operator
+
+from flask import abort
+
+
+'''
+Filtering and sorting of the list endpoints
+
+    ?filter=<column>:<operator>:<value> restricts the rows, e.g.
+        /actors?filter=age:gte:25&filter=age:lte:35&filter=gender:eq:F
+        /movies?filter=release_date:gte:01-01-2000&filter=release_date:lt:01-01-2010
+      repeated filters are combined with AND, the operators are
+      eq, ne, lt, lte, gt, gte and in (values separated by |, e.g. gender:in:F|M)
+    ?sort=<column>,-<column> orders the rows, '-' for descending, e.g.
+        /actors?sort=name  /movies?sort=-release_date
+      the id is always added as the last sort key, so that the order is total
+
+    only the whitelisted columns (FILTER_COLUMNS, SORT_COLUMNS) are accepted;
+    each is backed by a B-tree index on (column, id), so a filtered or sorted
+    page is read from an index like the default page ordered by id
+    dates are given in the API format (MM-DD-YYYY) or as YYYY-MM-DD
+'''
+
+FILTER_OPERATORS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'gt': operator.gt,
+    'gte': operator.ge,
+}
+FILTER_IN_SEPARATOR = '|'
+
+FILTER_COLUMNS = {
+    'Actor': ('age', 'gender', 'name'),
+    'Movie': ('release_date',),
+}
+SORT_COLUMNS = {
+    'Actor': ('age', 'id', 'name'),
+    'Movie': ('id', 'release_date'),
+}
+
+
+def _parse_date(value):
+    for date_format in ('%m-%d-%Y', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(value)
+
+
+'''
+    parse_value(column, value) method
+    returns the query argument value converted to the python type of the column
+    raises a ValueError if it can not be converted
+'''
+def parse_value(column, value):
+    python_type = column.type.python_type
+    if python_type is int:
+        return int(value)
+    if python_type is datetime.date:
+        return _parse_date(value)
+    return value
+
+
+'''
+    parse_filters(args, model) method
+    @INPUTS
+        args: the request query arguments
+        model: the listed model class, e.g. Actor
+
+    aborts with 400 for a malformed filter, a column that is not in
+    FILTER_COLUMNS or a value of the wrong type
+    returns the list of SQL conditions of the ?filter= arguments
+'''
+def parse_filters(args, model):
+    conditions = []
+    for raw_filter in args.getlist('filter'):
+        parts = raw_filter.split(':', 2)
+        if len(parts) != 3:
+            abort(400)
+        name, operator_name, value = parts
+        if name not in FILTER_COLUMNS[model.__tablename__]:
+            abort(400)
+        column = getattr(model, name)
+        try:
+            if operator_name == 'in':
+                conditions.append(column.in_(
+                    [parse_value(column, item) for item in value.split(FILTER_IN_SEPARATOR)]))
+            elif operator_name in FILTER_OPERATORS:
+                conditions.append(FILTER_OPERATORS[operator_name](column, parse_value(column, value)))
+            else:
+                abort(400)
+        except ValueError:
+            abort(400)
+    return conditions
+
+
+'''
+    parse_sort(args, model) method
+    @INPUTS
+        args: the request query arguments
+        model: the listed model class, e.g. Actor
+
+    aborts with 400 for a column that is not in SORT_COLUMNS or is repeated
+    returns the sort keys of the ?sort= argument (see api/pagination.py), ending
+    with the id in the direction of the last key ([(model.id, False)] by default)
+'''
+def parse_sort(args, model):
+    sort_keys = []
+    names = []
+    for name in args.get('sort', 'id').split(','):
+        descending = name.startswith('-')
+        name = name[1:] if descending else name
+        if name not in SORT_COLUMNS[model.__tablename__] or name in names:
+            abort(400)
+        names.append(name)
+        sort_keys.append((getattr(model, name), descending))
+    if 'id' not in names:
+        sort_keys.append((model.id, sort_keys[-1][1]))
+    return sort_keys
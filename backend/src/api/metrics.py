@@ -0,0 +1,242 @@
+import contextvars
+import os
+import time
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+                               Counter, Gauge, Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from api.response_cache import response_cache
+from auth.auth import on_verify
+from database.group_commit import group_commit
+from database.pool import on_pool
+
+
+'''
+Metrics
+
+    init_metrics(app) collects, in the Prometheus format:
+    - http_request_duration_seconds: latency of the requests, by method and route
+      (the url rule, e.g. /actors/<int:actor_id>)
+    - http_requests_total: requests by method, route and status code
+    - auth_verify_duration_seconds: time spent in verify_decode_jwt, by result
+      (valid or invalid token)
+    - http_request_db_queries / http_request_db_duration_seconds: number of
+      database queries run by a request and the time they took, by method and
+      route (collected from the SQLAlchemy events of every engine)
+    - db_group_commit_batch_size / db_group_commit_duration_seconds /
+      db_group_commit_writes_total: writes committed together, time taken by
+      the batches and writes by result (committed or failed) with GROUP_COMMIT
+      (see database/group_commit.py), rate(db_group_commit_writes_total) is
+      the achieved writes per second
+    - db_pool_wait_seconds / db_pool_timeouts_total / db_pool_checked_out /
+      db_pool_overflow: time spent getting a connection, requests which gave
+      up waiting for one, connections handed out and connections open beyond
+      the pool size, by pool ('primary', 'asgi', see database/pool.py)
+    - response_cache_hits_total / response_cache_misses_total /
+      response_cache_hit_ratio: lookups of the response cache served from the
+      cache or not, and the hit ratio of the process (see
+      api/response_cache.py); the rate of the hits over the rate of both
+      counters is the hit ratio of all the workers
+    and serves them on GET /metrics (not authenticated)
+    the native routes of the ASGI app (api/asgi.py) do not run the Flask hooks,
+    they record the same http_request_* metrics with NativeRequest
+
+    with several worker processes (gunicorn), set PROMETHEUS_MULTIPROC_DIR to
+    an empty directory writable by the workers: every worker writes its
+    metrics there and /metrics returns the sum of all the workers
+    (see gunicorn.conf.py)
+'''
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+DB_QUERIES_BUCKETS = (0, 1, 2, 3, 4, 5, 10, 20, 50, 100)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Latency of the HTTP requests',
+    ['method', 'route'], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by status code',
+    ['method', 'route', 'status'])
+AUTH_VERIFY_LATENCY = Histogram(
+    'auth_verify_duration_seconds', 'Time spent verifying tokens (verify_decode_jwt)',
+    ['result'], buckets=LATENCY_BUCKETS)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries run by the HTTP requests',
+    ['method', 'route'], buckets=DB_QUERIES_BUCKETS)
+REQUEST_DB_LATENCY = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in database queries by the HTTP requests',
+    ['method', 'route'], buckets=LATENCY_BUCKETS)
+GROUP_COMMIT_BATCH_SIZE = Histogram(
+    'db_group_commit_batch_size', 'Writes committed together by the group commit',
+    buckets=BATCH_SIZE_BUCKETS)
+GROUP_COMMIT_LATENCY = Histogram(
+    'db_group_commit_duration_seconds', 'Time taken by the group commit batches',
+    buckets=LATENCY_BUCKETS)
+GROUP_COMMIT_WRITES = Counter(
+    'db_group_commit_writes_total', 'Writes of the group commit by result',
+    ['result'])
+POOL_WAIT = Histogram(
+    'db_pool_wait_seconds', 'Time spent getting a connection from the pool',
+    ['pool'], buckets=POOL_WAIT_BUCKETS)
+POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts_total', 'Connection requests which timed out waiting for the pool',
+    ['pool'])
+# livesum: the connections of the live worker processes add up
+POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out', 'Connections handed out by the pool',
+    ['pool'], multiprocess_mode='livesum')
+POOL_OVERFLOW = Gauge(
+    'db_pool_overflow', 'Connections open beyond the pool size',
+    ['pool'], multiprocess_mode='livesum')
+RESPONSE_CACHE_HITS = Counter(
+    'response_cache_hits_total', 'Lookups of the response cache served from the cache')
+RESPONSE_CACHE_MISSES = Counter(
+    'response_cache_misses_total', 'Lookups of the response cache not found in the cache')
+# liveall: a ratio per worker process, the ratios do not add up
+RESPONSE_CACHE_HIT_RATIO = Gauge(
+    'response_cache_hit_ratio', 'Hit ratio of the response cache',
+    multiprocess_mode='liveall')
+
+
+def _route():
+    # the url rule keeps the number of label values bounded
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    # g may outlive the request (setup_db pushes an app context)
+    g.metrics_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
+
+
+def _observe_request(method, route, status_code, seconds, db_queries, db_seconds):
+    REQUEST_LATENCY.labels(method, route).observe(seconds)
+    REQUESTS.labels(method, route, str(status_code)).inc()
+    REQUEST_DB_QUERIES.labels(method, route).observe(db_queries)
+    REQUEST_DB_LATENCY.labels(method, route).observe(db_seconds)
+
+
+def _after_request(response):
+    started = g.get('metrics_started')
+    if started is None:
+        return response
+    _observe_request(request.method, _route(), response.status_code,
+                     time.perf_counter() - started, g.db_queries, g.db_seconds)
+    g.metrics_started = None
+    return response
+
+
+# [queries, seconds] of the native ASGI request of the context (asyncio task),
+# which has no Flask request context
+_native_db = contextvars.ContextVar('metrics_native_db', default=None)
+
+
+''' NativeRequest
+the http_request_* metrics of a request served by a native route of the ASGI app
+    route is the url rule of the matching Flask route, so both apps share the
+    label values; the database queries run in the context of the request
+    (AsyncSession.run_sync included) are counted until done(status_code)
+'''
+class NativeRequest:
+
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.started = time.perf_counter()
+        self.db = [0, 0.0]
+        _native_db.set(self.db)
+
+    def done(self, status_code):
+        _native_db.set(None)
+        _observe_request(self.method, self.route, status_code,
+                         time.perf_counter() - self.started, self.db[0], self.db[1])
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['metrics_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('metrics_started', None)
+    if started is None:
+        return
+    if has_request_context():
+        if g.get('metrics_started') is not None:
+            g.db_queries += 1
+            g.db_seconds += time.perf_counter() - started
+        return
+    native = _native_db.get()
+    if native is not None:
+        native[0] += 1
+        native[1] += time.perf_counter() - started
+
+
+def _observe_verify(seconds, error):
+    AUTH_VERIFY_LATENCY.labels('valid' if error is None else 'invalid').observe(seconds)
+
+
+def _observe_batch(size, failed, seconds):
+    GROUP_COMMIT_BATCH_SIZE.observe(size)
+    GROUP_COMMIT_LATENCY.observe(seconds)
+    GROUP_COMMIT_WRITES.labels('committed').inc(size - failed)
+    if failed:
+        GROUP_COMMIT_WRITES.labels('failed').inc(failed)
+
+
+def _observe_pool(stats, pool_event, seconds):
+    if pool_event == 'wait':
+        POOL_WAIT.labels(stats.name).observe(seconds)
+    elif pool_event == 'timeout':
+        POOL_TIMEOUTS.labels(stats.name).inc()
+    else:
+        POOL_CHECKED_OUT.labels(stats.name).set(stats.checked_out)
+        POOL_OVERFLOW.labels(stats.name).set(stats.overflow())
+
+
+def _observe_cache_lookup(hit):
+    if hit:
+        RESPONSE_CACHE_HITS.inc()
+    else:
+        RESPONSE_CACHE_MISSES.inc()
+    RESPONSE_CACHE_HIT_RATIO.set(response_cache.stats()['hit_ratio'])
+
+
+'''
+    metrics_registry() method
+    returns the registry served by /metrics: the metrics of all the worker
+    processes with PROMETHEUS_MULTIPROC_DIR, of this process otherwise
+'''
+def metrics_registry():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics():
+    return Response(generate_latest(metrics_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+
+'''
+init_metrics(app)
+    collects the metrics of the requests of the app, and serves them on /metrics
+    must be called before the other before_request hooks are registered, so
+    the latency includes them
+'''
+def init_metrics(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    on_verify(_observe_verify)
+    group_commit.on_batch(_observe_batch)
+    on_pool(_observe_pool)
+    response_cache.on_lookup(_observe_cache_lookup)
@@ -0,0 +1,157 @@
+import base64
+import datetime
+import json
+import os
+
+from flask import abort
+from sqlalchemy import and_, or_, tuple_
+
+
+DEFAULT_PAGE_SIZE = int(os.getenv('LIST_DEFAULT_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', 500))
+
+
+'''
+Keyset (cursor) pagination
+
+    a page is requested with ?limit=<n>&after=<cursor>
+    the rows are ordered by a list of sort keys, i.e. (column, descending) pairs
+    whose last column is unique (the primary key), e.g. [(Actor.id, False)]
+    the cursor is an opaque token holding the sort key values of the last row
+    of the previous page, so the next page is fetched with
+        WHERE (sort keys) > (cursor values) ORDER BY (sort keys) LIMIT n
+    which is served from an index and costs the same on any page, unlike OFFSET
+'''
+
+
+'''
+    parse_page_args(args) method
+    @INPUTS
+        args: the request query arguments
+
+    aborts with 400 if limit is not a positive integer
+    returns (limit, after) where limit is capped at MAX_PAGE_SIZE and after is
+    the raw cursor (or None for the first page)
+'''
+def parse_page_args(args):
+    limit = args.get('limit', DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        abort(400)
+    if limit < 1:
+        abort(400)
+    after = args.get('after', None) or None
+    return min(limit, MAX_PAGE_SIZE), after
+
+
+def _key_names(sort_keys):
+    return [column.key + (':desc' if descending else '') for column, descending in sort_keys]
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def _from_json(column, value):
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    if python_type is datetime.date:
+        return datetime.date.fromisoformat(value)
+    if python_type is int and isinstance(value, bool):
+        raise ValueError(value)
+    if python_type in (int, float, str) and not isinstance(value, python_type):
+        raise ValueError(value)
+    return value
+
+
+'''
+    encode_cursor(sort_keys, row) method
+    returns the opaque cursor pointing after the given row
+'''
+def encode_cursor(sort_keys, row):
+    data = {
+        'k': _key_names(sort_keys),
+        'v': [_to_json(getattr(row, column.key)) for column, descending in sort_keys],
+    }
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+'''
+    decode_cursor(sort_keys, cursor) method
+    aborts with 400 if the cursor is malformed or was issued for other sort keys
+    returns the list of sort key values stored in the cursor
+'''
+def decode_cursor(sort_keys, cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        if data['k'] != _key_names(sort_keys) or len(data['v']) != len(sort_keys):
+            raise ValueError(cursor)
+        return [_from_json(column, value) for (column, descending), value in zip(sort_keys, data['v'])]
+    except (ValueError, TypeError, KeyError):
+        abort(400)
+
+
+'''
+    order_by_clauses(sort_keys) method
+    returns the ORDER BY clauses of the sort keys
+'''
+def order_by_clauses(sort_keys):
+    return [column.desc() if descending else column.asc() for column, descending in sort_keys]
+
+
+'''
+    keyset_query(query, sort_keys, after_values, limit) method
+    returns the query ordered by the sort keys, restricted to the rows after
+    after_values (if any) and limited to limit + 1 rows (the extra row tells
+    whether there is a next page)
+'''
+def keyset_query(query, sort_keys, after_values, limit):
+    if after_values is not None:
+        columns = [column for column, descending in sort_keys]
+        directions = set(descending for column, descending in sort_keys)
+        if len(columns) > 1 and directions == {False}:
+            query = query.filter(tuple_(*columns) > tuple_(*after_values))
+        elif len(columns) > 1 and directions == {True}:
+            query = query.filter(tuple_(*columns) < tuple_(*after_values))
+        else:
+            # a single key or mixed directions (which can not be expressed as a
+            # row value comparison)
+            conditions = []
+            for i, (column, descending) in enumerate(sort_keys):
+                equal = [c == v for c, v in zip(columns[:i], after_values[:i])]
+                after = column < after_values[i] if descending else column > after_values[i]
+                conditions.append(and_(*equal, after))
+            query = query.filter(or_(*conditions))
+    query = query.order_by(*order_by_clauses(sort_keys))
+    return query.limit(limit + 1)
+
+
+'''
+    paginate(query, sort_keys, limit, after) method
+    @INPUTS
+        query: the query (e.g. Actor.query) to paginate
+        sort_keys: list of (column, descending) pairs, the last column must be unique
+        limit: the page size
+        after: the cursor returned with the previous page (or None)
+
+    returns (rows, next_cursor) where next_cursor is None on the last page
+'''
+def paginate(query, sort_keys, limit, after=None):
+    after_values = decode_cursor(sort_keys, after) if after is not None else None
+    rows = keyset_query(query, sort_keys, after_values, limit).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_keys, rows[-1])
+    return rows, next_cursor
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from auth.auth import on_authorize
+
+
+'''
+Request profiling
+
+    opt-in (REQUEST_PROFILING=true, off by default: it records every statement)
+    - every SQL statement run by a request is recorded with its duration and
+      its normalized form (parameters, literals and IN lists replaced by ?)
+    - repeated statements are flagged and logged as warnings:
+        n+1: the same normalized statement run REQUEST_PROFILING_REPEAT_THRESHOLD
+          times (3) or more with different parameters, e.g. a relationship
+          loaded row by row
+        duplicate: the same statement run more than once with the same
+          parameters, e.g. a query evaluated twice
+    - the response has a Server-Timing header with the time spent in auth
+      (@requires_auth), db (the statements), serialize (json encoding) and
+      total, e.g.
+        Server-Timing: auth;dur=0.4, db;dur=3.1;desc="4 queries", serialize;dur=0.8, total;dur=6.0
+    - a request slower than REQUEST_PROFILING_SLOW_MS (500) is logged with its
+      full trace (the statements, without their parameter values)
+'''
+
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'false').lower() == 'true'
+REQUEST_PROFILING_SLOW_MS = float(os.getenv('REQUEST_PROFILING_SLOW_MS', 500))
+REQUEST_PROFILING_REPEAT_THRESHOLD = int(os.getenv('REQUEST_PROFILING_REPEAT_THRESHOLD', 3))
+
+logger = logging.getLogger(__name__)
+
+NORMALIZE_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),             # string literals
+    (re.compile(r'%\(\w+\)s|\$\d+|%s'), '?'),         # parameters (psycopg2, asyncpg)
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),           # numbers
+    (re.compile(r'\?(?:\s*,\s*\?)+'), '?, ...'),      # IN lists
+    (re.compile(r'\s+'), ' '),
+]
+
+
+'''
+    normalize_statement(statement) method
+    returns the statement with its parameters, literals and IN lists replaced
+    by ?, so that the statements differing only by their values are equal
+'''
+def normalize_statement(statement):
+    for pattern, replacement in NORMALIZE_PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+''' RequestProfile
+the SQL statements and the timings of a request
+'''
+class RequestProfile:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = []
+        self.auth_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+    def record_statement(self, statement, parameters, seconds):
+        self.statements.append({
+            'statement': statement,
+            'normalized': normalize_statement(statement),
+            # only to find the duplicates, the values are not kept
+            'parameters_hash': hashlib.sha1(repr(parameters).encode('utf-8')).hexdigest(),
+            'duration_ms': round(seconds * 1000, 3),
+        })
+
+    @property
+    def db_seconds(self):
+        return sum(statement['duration_ms'] for statement in self.statements) / 1000
+
+    '''
+    findings(repeat_threshold)
+        returns the n+1 and duplicate statements of the request
+        [{"kind": "n+1"|"duplicate", "statement": normalized statement, "count": n}]
+    '''
+
+    def findings(self, repeat_threshold=REQUEST_PROFILING_REPEAT_THRESHOLD):
+        by_normalized = {}
+        by_parameters = {}
+        for statement in self.statements:
+            by_normalized.setdefault(statement['normalized'], []).append(statement)
+            key = (statement['statement'], statement['parameters_hash'])
+            by_parameters[key] = by_parameters.get(key, 0) + 1
+        findings = []
+        for normalized, statements in by_normalized.items():
+            distinct = len(set(statement['parameters_hash'] for statement in statements))
+            if distinct >= repeat_threshold:
+                findings.append({'kind': 'n+1', 'statement': normalized, 'count': distinct})
+        for (statement, _), count in by_parameters.items():
+            if count > 1:
+                findings.append({'kind': 'duplicate', 'statement': normalize_statement(statement), 'count': count})
+        return findings
+
+    def server_timing(self, total_seconds):
+        return ', '.join([
+            'auth;dur={:.1f}'.format(self.auth_seconds * 1000),
+            'db;dur={:.1f};desc="{} queries"'.format(self.db_seconds * 1000, len(self.statements)),
+            'serialize;dur={:.1f}'.format(self.serialize_seconds * 1000),
+            'total;dur={:.1f}'.format(total_seconds * 1000),
+        ])
+
+    def trace(self, total_seconds, status):
+        return {
+            'method': request.method,
+            'path': request.full_path,
+            'status': status,
+            'total_ms': round(total_seconds * 1000, 3),
+            'auth_ms': round(self.auth_seconds * 1000, 3),
+            'db_ms': round(self.db_seconds * 1000, 3),
+            'serialize_ms': round(self.serialize_seconds * 1000, 3),
+            'statements': [{'statement': statement['statement'], 'duration_ms': statement['duration_ms']}
+                           for statement in self.statements],
+            'findings': self.findings(),
+        }
+
+
+'''
+    current_profile() method
+    returns the RequestProfile of the current request, None if it is not profiled
+'''
+def current_profile():
+    if not has_request_context():
+        return None
+    return g.get('request_profile')
+
+
+def _before_request():
+    # g may outlive the request (setup_db pushes an app context)
+    g.request_profile = RequestProfile()
+
+
+def _after_request(response):
+    profile = current_profile()
+    if profile is None:
+        return response
+    g.request_profile = None
+    total_seconds = time.perf_counter() - profile.started
+    response.headers['Server-Timing'] = profile.server_timing(total_seconds)
+    for finding in profile.findings():
+        logger.warning('%s statement run %d times by %s %s: %s', finding['kind'], finding['count'],
+                       request.method, request.path, finding['statement'])
+    if total_seconds * 1000 > REQUEST_PROFILING_SLOW_MS:
+        logger.warning('Slow request: %s', json.dumps(profile.trace(total_seconds, response.status_code)))
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['profiling_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('profiling_started', None)
+    profile = current_profile()
+    if started is not None and profile is not None:
+        profile.record_statement(statement, parameters, time.perf_counter() - started)
+
+
+def _record_authorize(seconds):
+    profile = current_profile()
+    if profile is not None:
+        profile.auth_seconds += seconds
+
+
+def timed_json_provider(provider_class):
+    class TimedJSONProvider(provider_class):
+
+        def dumps(self, obj, **kwargs):
+            started = time.perf_counter()
+            try:
+                return super().dumps(obj, **kwargs)
+            finally:
+                profile = current_profile()
+                if profile is not None:
+                    profile.serialize_seconds += time.perf_counter() - started
+
+    return TimedJSONProvider
+
+
+'''
+init_profiling(app, enabled)
+    profiles the requests of the app when enabled (REQUEST_PROFILING by default)
+'''
+def init_profiling(app, enabled=REQUEST_PROFILING):
+    if not enabled:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.json = timed_json_provider(type(app.json))(app)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    on_authorize(_record_authorize)
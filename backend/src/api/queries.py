@@ -0,0 +1,133 @@
+from flask import abort
+from sqlalchemy.orm import selectinload
+
+from api.filtering import parse_filters, parse_sort
+from api.pagination import parse_page_args, paginate
+from api.serialization import represent_actor, represent_movie, represent_rows, represented_query
+from api.validation import parse_include
+from database.counts import COUNT_MODES, DEFAULT_COUNT_MODE, count_rows
+from database.models import Actor, Movie
+
+
+'''
+Queries of the read routes
+
+    shared by the Flask views (api/__init__.py) and the native routes of the
+    ASGI app (api/asgi.py), so both serve the same rows and json bodies
+    the functions take the session and the query arguments (args) of the
+    request, abort like a view (400 for invalid arguments, 404) and return the
+    json body of the response
+'''
+
+
+'''
+    parse_count_mode(args) method
+    aborts with 400 for an unknown ?count=
+    returns how the total is computed (see database/counts.py)
+'''
+def parse_count_mode(args):
+    count_mode = args.get('count', DEFAULT_COUNT_MODE)
+    if count_mode not in COUNT_MODES:
+        abort(400)
+    return count_mode
+
+
+'''
+    movies_tables(args) method
+    returns the tables read by GET /movies (?include=cast also reads the cast)
+'''
+def movies_tables(args):
+    if 'cast' in parse_include(args, ('cast',)):
+        return ('Movie', 'Catalog', 'Actor')
+    return ('Movie',)
+
+
+def movie_with_cast(movie):
+    return dict(movie.repr(), cast=[actor.repr() for actor in movie.cast])
+
+
+'''
+    actors_query(session, args) method
+    returns the query of the actors matching the ?filter= arguments, its sort
+    keys (?sort=), its conditions and the function representing its rows
+'''
+def actors_query(session, args):
+    conditions = parse_filters(args, Actor)
+    sort_keys = parse_sort(args, Actor)
+    return represented_query(Actor, session).filter(*conditions), sort_keys, conditions, represent_actor
+
+
+'''
+    movies_query(session, args) method
+    as actors_query, the cast is loaded with the ORM (?include=cast), the
+    movies alone as plain rows
+'''
+def movies_query(session, args):
+    conditions = parse_filters(args, Movie)
+    sort_keys = parse_sort(args, Movie)
+    if 'cast' in parse_include(args, ('cast',)):
+        query = session.query(Movie).filter(*conditions).options(selectinload(Movie.cast))
+        return query, sort_keys, conditions, movie_with_cast
+    return represented_query(Movie, session).filter(*conditions), sort_keys, conditions, represent_movie
+
+
+'''
+    list_actors(session, args) method
+    returns the body of GET /actors: a page of actors, their total and the
+    cursor of the next page
+'''
+def list_actors(session, args):
+    query, sort_keys, conditions, represent = actors_query(session, args)
+    limit, after = parse_page_args(args)
+    count_mode = parse_count_mode(args)
+    actors, next_cursor = paginate(query, sort_keys, limit, after)
+    if len(actors) == 0:
+        abort(404)
+    return {
+        "success": True,
+        "actors": represent_rows(Actor, actors),
+        "total_actors": count_rows(session, Actor, count_mode, conditions),
+        "next_cursor": next_cursor,
+    }
+
+
+'''
+    list_movies(session, args) method
+    returns the body of GET /movies, as list_actors
+'''
+def list_movies(session, args):
+    query, sort_keys, conditions, represent = movies_query(session, args)
+    limit, after = parse_page_args(args)
+    count_mode = parse_count_mode(args)
+    movies, next_cursor = paginate(query, sort_keys, limit, after)
+    if len(movies) == 0:
+        abort(404)
+    return {
+        "success": True,
+        "movies": [[represent(movie) for movie in movies]],
+        "total_movies": count_rows(session, Movie, count_mode, conditions),
+        "next_cursor": next_cursor,
+    }
+
+
+'''
+    get_actor(session, args, actor_id) method
+    returns the body of GET /actors/<id>
+    raises a ValueError if the id is not an integer
+'''
+def get_actor(session, args, actor_id):
+    actor = session.query(Actor).filter(Actor.id == int(actor_id)).one_or_none()
+    if actor is None:
+        abort(404)
+    return {"success": True, "actors": [actor.repr()]}
+
+
+'''
+    get_movie(session, args, movie_id) method
+    returns the body of GET /movies/<id>, as get_actor
+'''
+def get_movie(session, args, movie_id):
+    movie = session.query(Movie).filter(Movie.id == int(movie_id)).one_or_none()
+    if movie is None:
+        abort(404)
+    return {"success": True, "movies": [movie.repr()]}
@@ -0,0 +1,325 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, make_response, request
+
+from api.conditional import request_tables_of
+from database.models import replica_read_is_stale
+
+
+'''
+Response cache
+
+    caches the 200 responses of the decorated (read only) routes, keyed by the
+    route, the query arguments, the Accept header and the permissions of the token
+    every cached response is tagged with the tables it was read from; a write to
+    one of these tables (see database.models.on_write) bumps the generation of the
+    table, which is part of the key, so the cached responses of the table are
+    never served again (a response computed while the write was in flight is
+    stored under the old generation and is not served either)
+    a response read from a replica which had not applied all the writes of
+    the primary yet is not cached (see database/replicas.py)
+    the lookup listeners (on_lookup) get every hit and miss (see api/metrics.py)
+
+    backends:
+        MemoryBackend: an in-process LRU bounded by number of entries and bytes
+            (a write in another worker is only seen once the entries expire)
+        RedisBackend: shared by all the workers (and instances) of the API
+
+    RESPONSE_CACHE=memory|redis (default: none, the cache is disabled)
+    RESPONSE_CACHE_TTL seconds a response is kept (default 60)
+    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES bounds of the memory backend
+    RESPONSE_CACHE_REDIS_URL url of the redis server of the redis backend
+'''
+
+
+''' MemoryBackend
+an in-process LRU cache with TTL, entry count and size based eviction
+'''
+class MemoryBackend:
+    # a lookup does not wait for the network
+    blocking = False
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._keys_by_table = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, tables = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, tables=()):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, tables)
+            self._bytes += len(value)
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def generations(self, tables):
+        return [self._generations.get(table, 0) for table in tables]
+
+    def bump_generation(self, table):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            # the entries of the old generation can not be reached anymore
+            for key in list(self._keys_by_table.pop(table, ())):
+                if key in self._entries:
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        value, expires_at, tables = self._entries.pop(key)
+        self._bytes -= len(value)
+        for table in tables:
+            keys = self._keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+
+''' RedisBackend
+a cache shared by all the workers, stored in redis (or any client with the
+same get/mget/set/incr methods, e.g. a local stand-in in tests)
+size based eviction is left to the redis maxmemory policy
+'''
+class RedisBackend:
+    blocking = True
+
+    def __init__(self, client, prefix='casting-agency:'):
+        self.client = client
+        self.prefix = prefix
+        self.evictions = 0
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl, tables=()):
+        self.client.set(self.prefix + key, value, ex=max(int(ttl), 1))
+
+    def generations(self, tables):
+        values = self.client.mget([self.prefix + 'generation:' + table for table in tables])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump_generation(self, table):
+        self.client.incr(self.prefix + 'generation:' + table)
+
+    def clear(self):
+        pass
+
+
+'''
+    pack(status, headers, body) / unpack(value) methods
+    the cached value of a response: its status, headers (but Content-Length)
+    and body, and back
+'''
+def pack(status, headers, body):
+    meta = {
+        'status': status,
+        'headers': [[name, value] for name, value in headers if name.lower() != 'content-length'],
+    }
+    return json.dumps(meta).encode('utf-8') + b'\n' + body
+
+
+def unpack(value):
+    meta, body = value.split(b'\n', 1)
+    meta = json.loads(meta)
+    return meta['status'], meta['headers'], body
+
+
+def _pack(response):
+    return pack(response.status_code, response.headers.items(), response.get_data())
+
+
+def _unpack(value):
+    status, headers, body = unpack(value)
+    return Response(body, status=status, headers=headers)
+
+
+''' ResponseCache
+read-through cache of route responses, see the module description
+    EXAMPLE
+        @app.route("/actors")
+        @requires_auth('get:actors')
+        @response_cache.cached('Actor')
+        def get_actors(payload):
+'''
+class ResponseCache:
+
+    def __init__(self, backend=None, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lookup_listeners = []
+
+    @classmethod
+    def from_env(cls):
+        backend_name = os.getenv('RESPONSE_CACHE', 'none').lower()
+        backend = None
+        if backend_name == 'memory':
+            backend = MemoryBackend(
+                max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1024)),
+                max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+            )
+        elif backend_name == 'redis':
+            backend = RedisBackend.from_url(os.getenv('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+        return cls(backend, ttl=int(os.getenv('RESPONSE_CACHE_TTL', 60)))
+
+    '''
+    key(tables, payload)
+        returns the cache key of the current request
+    request_key(path, args, accept, tables, payload)
+        returns the cache key of a request (args is a MultiDict), the same as
+        key() for the same request
+    '''
+
+    def key(self, tables, payload):
+        return self.request_key(request.path, request.args, request.headers.get('Accept', ''), tables, payload)
+
+    def request_key(self, path, args, accept, tables, payload):
+        permissions = sorted((payload or {}).get('permissions', []))
+        parts = [
+            path,
+            '&'.join('{}={}'.format(name, value) for name, value in sorted(args.items(multi=True))),
+            accept,
+            ' '.join(permissions),
+            ','.join('{}:{}'.format(table, generation)
+                     for table, generation in zip(tables, self.backend.generations(tables))),
+        ]
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    '''
+    on_lookup(listener)
+        calls listener(hit) after every lookup of get(), hit is a boolean
+    '''
+
+    def on_lookup(self, listener):
+        if listener not in self.lookup_listeners:
+            self.lookup_listeners.append(listener)
+        return listener
+
+    '''
+    get(key) / set(key, value, tables)
+        the cached value (see pack) of the key, counted as a hit or a miss, or
+        None / caches the value of a response read from the tables
+        (the read-through of @cached and of the native routes of api/asgi.py)
+    '''
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        for listener in self.lookup_listeners:
+            listener(value is not None)
+        return value
+
+    def set(self, key, value, tables):
+        self.backend.set(key, value, self.ttl, tables)
+
+    '''
+    invalidate(table)
+        drops the cached responses read from the table
+    '''
+
+    def invalidate(self, table):
+        if self.backend is None:
+            return
+        self.invalidations += 1
+        self.backend.bump_generation(table)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    '''
+    stats()
+        returns the hit/miss counters and the hit ratio of the cache
+    '''
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'invalidations': self.invalidations,
+            'evictions': self.backend.evictions if self.backend is not None else 0,
+        }
+
+    '''
+    implement @cached(*tables) decorator method
+    @INPUTS
+        tables: names of the tables the route reads, e.g. 'Actor'
+            or a single function returning them for the current request
+
+    must be applied below @requires_auth (the decorated function gets the payload)
+    returns the decorator which serves the cached response if there is one,
+    or runs the route and caches its 200 response
+    '''
+
+    def cached(self, *tables):
+        def cached_decorator(f):
+            @wraps(f)
+            def wrapper(payload, *args, **kwargs):
+                if self.backend is None:
+                    return f(payload, *args, **kwargs)
+                request_tables = request_tables_of(tables)
+                key = self.key(request_tables, payload)
+                value = self.get(key)
+                if value is not None:
+                    return _unpack(value).make_conditional(request)
+                response = make_response(f(payload, *args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed and \
+                        not replica_read_is_stale(request_tables, g.get('table_versions')):
+                    self.set(key, _pack(response), request_tables)
+                return response
+            return wrapper
+        return cached_decorator
+
+
+response_cache = ResponseCache.from_env()
@@ -0,0 +1,122 @@
+import functools
+import json
+import os
+import re
+
+from flask.json.provider import DefaultJSONProvider
+
+from database.models import db, Actor, Movie
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used without it
+    orjson = None
+
+
+'''
+Fast serialization
+
+    the list responses skip the ORM: they select only the columns of the
+    representation (rows of tuples, no model instances) and build the dicts
+    directly, formatting every distinct release date once
+    the json is encoded with orjson when it is installed (and FAST_JSON is not
+    false), through FastJSONProvider; the output is byte for byte the one of
+    Flask's default provider (sorted keys, non-ASCII characters escaped,
+    compact separators), the payloads orjson can not encode the same way
+    (e.g. integers over 64 bits, non-string keys) fall back to the standard
+    library
+    floats are the exception: orjson writes 1e16 where the standard library
+    writes 1e+16; the API returns no floats
+'''
+
+FAST_JSON = os.getenv('FAST_JSON', 'true').lower() == 'true'
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+# the characters the standard library escapes with ensure_ascii (DEL included)
+NON_ASCII = re.compile(r'[^\x00-\x7e]')
+
+'''
+REPRESENTED_COLUMNS
+    for each model: the columns of its repr(), in the order of the rows
+    selected by represented_query and read by represent_rows
+'''
+REPRESENTED_COLUMNS = {
+    Actor: (Actor.id, Actor.name, Actor.age, Actor.gender),
+    Movie: (Movie.id, Movie.title, Movie.release_date),
+}
+
+
+def _escape(match):
+    code = ord(match.group())
+    if code > 0xffff:
+        code -= 0x10000
+        return '\\u{:04x}\\u{:04x}'.format(0xd800 | (code >> 10), 0xdc00 | (code & 0x3ff))
+    return '\\u{:04x}'.format(code)
+
+
+'''
+    dumps(obj, default) method
+    returns the compact json of obj with sorted keys and non-ASCII characters
+    escaped, the same as json.dumps(obj, default=default, sort_keys=True,
+    separators=(",", ":")) (see above for floats)
+'''
+def dumps(obj, default=None):
+    if orjson is not None and FAST_JSON:
+        try:
+            data = orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            text = data.decode('utf-8')
+            if data.isascii() and b'\x7f' not in data:
+                return text
+            return NON_ASCII.sub(_escape, text)
+    return json.dumps(obj, default=default, sort_keys=True, separators=(",", ":"))
+
+
+''' FastJSONProvider
+the json provider of the app: the responses (jsonify) are encoded by dumps
+the other encodings (e.g. indented in debug mode) by the default provider
+'''
+class FastJSONProvider(DefaultJSONProvider):
+
+    def dumps(self, obj, **kwargs):
+        if kwargs == {'separators': (",", ":")} and self.sort_keys and self.ensure_ascii:
+            return dumps(obj, default=self.default)
+        return super().dumps(obj, **kwargs)
+
+
+@functools.lru_cache(maxsize=65536)
+def format_date(date):
+    # the format of Movie.repr()
+    return date.strftime("%m-%d-%Y")
+
+
+'''
+    represented_query(model, session) method
+    returns the query of the columns of the representation of the model
+    (REPRESENTED_COLUMNS), to filter and paginate like model.query
+'''
+def represented_query(model, session=None):
+    return (session or db.session).query(*REPRESENTED_COLUMNS[model])
+
+
+def represent_actor(row):
+    return {'id': row[0], 'name': row[1], 'age': row[2], 'gender': row[3]}
+
+
+def represent_movie(row):
+    return {'id': row[0], 'title': row[1], 'release_date': format_date(row[2])}
+
+
+'''
+    represent_rows(model, rows) method
+    returns the representations (the same as model.repr()) of rows selected by
+    represented_query (extra columns after the represented ones are ignored)
+'''
+def represent_rows(model, rows):
+    if model is Actor:
+        return [{'id': row[0], 'name': row[1], 'age': row[2], 'gender': row[3]} for row in rows]
+    return [{'id': row[0], 'title': row[1], 'release_date': format_date(row[2])} for row in rows]
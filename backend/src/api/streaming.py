@@ -0,0 +1,80 @@
+import os
+
+from flask import Response, abort, stream_with_context
+
+from api.serialization import dumps
+
+
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', 1000))
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+'''
+Streaming list responses
+
+    GET /actors?stream=true (or GET /movies?stream=true) returns the whole table
+    in the usual json envelope, and a request with 'Accept: application/x-ndjson'
+    returns it as one json object per line
+    the rows are read through a server-side cursor STREAM_BATCH_SIZE rows at a
+    time and written out as they are read, so the memory used by the worker does
+    not depend on the size of the table
+'''
+
+
+'''
+    stream_format(request) method
+    returns 'ndjson', 'json' or None (the request does not ask for a stream)
+'''
+def stream_format(request):
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return 'ndjson'
+    if request.args.get('stream', 'false').lower() == 'true':
+        return 'json'
+    return None
+
+
+def _dumps(obj):
+    # same output as jsonify
+    return dumps(obj)
+
+
+def _repr(row):
+    return row.repr()
+
+
+def _json_envelope(first, rows, key, nested, represent):
+    yield '{"%s":%s' % (key, '[[' if nested else '[')
+    total = 1
+    yield _dumps(represent(first))
+    for row in rows:
+        total += 1
+        yield ',' + _dumps(represent(row))
+    yield '%s,"success":true,"total_%s":%d}\n' % (']]' if nested else ']', key, total)
+
+
+def _ndjson_lines(first, rows, represent):
+    yield _dumps(represent(first)) + '\n'
+    for row in rows:
+        yield _dumps(represent(row)) + '\n'
+
+
+'''
+    stream_response(query, key, output_format, nested, represent) method
+    @INPUTS
+        query: the ordered query of the rows (e.g. Actor.query.order_by(Actor.id))
+        key: the collection name, e.g. 'actors'
+        output_format: 'json' or 'ndjson' (see stream_format)
+        nested: wrap the list in another list (the envelope of GET /movies)
+        represent: the function returning the json of a row (default: row.repr())
+
+    aborts with 404 if there are no rows
+    returns a streamed response
+'''
+def stream_response(query, key, output_format, nested=False, represent=_repr):
+    rows = iter(query.yield_per(STREAM_BATCH_SIZE))
+    first = next(rows, None)
+    if first is None:
+        abort(404)
+    if output_format == 'ndjson':
+        return Response(stream_with_context(_ndjson_lines(first, rows, represent)), mimetype=NDJSON_MIMETYPE)
+    return Response(stream_with_context(_json_envelope(first, rows, key, nested, represent)), mimetype='application/json')
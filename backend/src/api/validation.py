@@ -0,0 +1,99 @@
+from flask import abort
+
+
+'''
+    validate_actor(body) method
+    @INPUTS
+        body: the json body of a create actor request
+
+    aborts with 422 if the name, gender or age is missing or empty
+    returns the dict of the new actor's columns
+'''
+def validate_actor(body):
+    if not isinstance(body, dict):
+        abort(422)
+    new_actor_name = body.get("name", None)
+    new_actor_gender = body.get("gender", None)
+    new_actor_age = body.get("age", None)
+    if new_actor_name is None or new_actor_name == "":
+        abort(422)
+    if new_actor_gender is None or new_actor_gender == "":
+        abort(422)
+    if new_actor_age is None or new_actor_age == "":
+        abort(422)
+    return {"name": new_actor_name, "gender": new_actor_gender, "age": new_actor_age}
+
+
+'''
+    validate_movie(body) method
+    @INPUTS
+        body: the json body of a create movie request
+
+    aborts with 422 if the title or release_date is missing or empty
+    returns the dict of the new movie's columns
+'''
+def validate_movie(body):
+    if not isinstance(body, dict):
+        abort(422)
+    new_movie_title = body.get("title", None)
+    new_movie_release_date = body.get("release_date", None)
+    if new_movie_title is None or new_movie_title == "":
+        abort(422)
+    if new_movie_release_date is None or new_movie_release_date == "":
+        abort(422)
+    return {"title": new_movie_title, "release_date": new_movie_release_date}
+
+
+'''
+    validate_actor_update(body) method
+    @INPUTS
+        body: the json body of a patch actor request (or an item of PATCH /actors/batch)
+
+    aborts with 422 if the name, gender or age is missing
+    an empty ("") field is left unchanged
+    returns the dict of the changed columns of the actor
+'''
+def validate_actor_update(body):
+    return _changed_fields(body, ("name", "gender", "age"))
+
+
+'''
+    validate_movie_update(body) method
+    @INPUTS
+        body: the json body of a patch movie request (or an item of PATCH /movies/batch)
+
+    aborts with 422 if the title or release_date is missing
+    an empty ("") field is left unchanged
+    returns the dict of the changed columns of the movie
+'''
+def validate_movie_update(body):
+    return _changed_fields(body, ("title", "release_date"))
+
+
+def _changed_fields(body, fields):
+    if not isinstance(body, dict):
+        abort(422)
+    values = {}
+    for field in fields:
+        value = body.get(field, None)
+        if value is None:
+            abort(422)
+        if value != "":
+            values[field] = value
+    return values
+
+
+'''
+    parse_include(args, allowed) method
+    @INPUTS
+        args: the query arguments of the request
+        allowed: the expansions the route supports, e.g. ('cast',)
+
+    aborts with 400 for an unknown ?include= expansion
+    returns the set of the requested expansions (?include=cast or ?include=a,b)
+'''
+def parse_include(args, allowed):
+    include = set(name for value in args.getlist('include') for name in value.split(',') if name != "")
+    if not include.issubset(allowed):
+        abort(400)
+    return include
@@ -1,10 +1,12 @@
 import json
 import os
-from flask import request, _request_ctx_stack, abort
+import time
+from flask import g, request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
 from dotenv import load_dotenv
+from auth.jwks import JWKSKeyStore, JWKSUnavailableError
+from auth.token_cache import TokenCache
 
 load_dotenv()
 
@@ -12,6 +14,70 @@ load_dotenv()
 AUTH0_DOMAIN = os.getenv('AUTH0_DOMAIN')
 ALGORITHMS = [os.getenv('AUTH0_ALGORITHMS')]
 API_AUDIENCE = os.getenv('AUTH0_API_AUDIENCE')
+JWKS_URL = os.getenv('AUTH0_JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+
+'''
+process-wide store of the Auth0 signing keys
+    the keys are fetched once and then refreshed in the background,
+    see JWKSKeyStore for the caching rules
+'''
+jwks_store = JWKSKeyStore(
+    JWKS_URL,
+    algorithm=ALGORITHMS[0] or 'RS256',
+    default_ttl=int(os.getenv('AUTH0_JWKS_TTL', 600)),
+    min_refresh_interval=int(os.getenv('AUTH0_JWKS_MIN_REFRESH_INTERVAL', 30)),
+    background_refresh=os.getenv('AUTH0_JWKS_BACKGROUND_REFRESH', 'true').lower() == 'true'
+)
+
+'''
+process-wide cache of verified tokens
+    lets requires_auth skip the signature and claims verification for
+    tokens it has already verified, see TokenCache
+'''
+token_cache = TokenCache(
+    max_size=int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 1024)),
+    max_ttl=int(os.getenv('AUTH_TOKEN_CACHE_TTL', 300))
+)
+
+
+'''
+verify listeners
+    functions called with the seconds verify_decode_jwt took and the AuthError
+    it raised (None for a valid token), e.g. to export a metric
+    EXAMPLE
+        on_verify(lambda seconds, error: print(seconds))
+'''
+verify_listeners = []
+
+
+def on_verify(listener):
+    if listener not in verify_listeners:
+        verify_listeners.append(listener)
+    return listener
+
+
+def notify_verify(seconds, error):
+    for listener in verify_listeners:
+        listener(seconds, error)
+
+
+'''
+authorize listeners
+    functions called with the seconds the checks of @requires_auth took
+    (header, token cache, verification, permission), e.g. to profile a request
+'''
+authorize_listeners = []
+
+
+def on_authorize(listener):
+    if listener not in authorize_listeners:
+        authorize_listeners.append(listener)
+    return listener
+
+
+def notify_authorize(seconds):
+    for listener in authorize_listeners:
+        listener(seconds)
 
 
 ## AuthError Exception
@@ -38,7 +104,15 @@ class AuthError(Exception):
 def get_token_auth_header():
     """Obtains the Access Token from the Authorization Header
     """
-    auth = request.headers.get('Authorization', None)
+    return token_from_authorization(request.headers.get('Authorization', None))
+
+
+'''
+    token_from_authorization(auth) method
+        the checks of get_token_auth_header() on the given Authorization header value
+    returns the token part of the header
+'''
+def token_from_authorization(auth):
     if not auth:
         raise AuthError({
             'code': 'authorization_header_missing',
@@ -72,19 +146,22 @@ def get_token_auth_header():
     @INPUTS
         permission: string permission (i.e. 'post:actor')
         payload: decoded jwt payload
+        permissions: (optional) precomputed set of the payload permissions
 
     raises an AuthError if permissions are not included in the payload
     raises an AuthError if the requested permission string is not in the payload permissions array
     returns true otherwise
 '''
-def check_permissions(permission, payload):
-    if 'permissions' not in payload:
+def check_permissions(permission, payload, permissions=None):
+    if permissions is None:
+        if 'permissions' not in payload:
                         raise AuthError({
                             'code': 'invalid_claims',
                             'description': 'Permissions not included in JWT.'
                         }, 400)
+        permissions = payload['permissions']
 
-    if permission not in payload['permissions']:
+    if permission not in permissions:
         raise AuthError({
             'code': 'unauthorized',
             'description': 'Permission not found.'
@@ -97,16 +174,27 @@ def check_permissions(permission, payload):
         token: a json web token (string)
 
     checks that it is an Auth0 token with key id (kid)
-    verifies the token using Auth0 /.well-known/jwks.json
+    verifies the token using the cached Auth0 /.well-known/jwks.json keys (see jwks_store)
     decodes the payload from the token
     validates the claims
     returns the decoded payload
 
+    notifies the verify listeners with the time it took
+
     !!NOTE urlopen has a common certificate error described here: https://stackoverflow.com/questions/50236117/scraping-ssl-certificate-verify-failed-error-for-http-en-wikipedia-org
 '''
 def verify_decode_jwt(token):
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
+    started = time.perf_counter()
+    try:
+        payload = _verify_decode_jwt(token)
+    except AuthError as e:
+        notify_verify(time.perf_counter() - started, e)
+        raise
+    notify_verify(time.perf_counter() - started, None)
+    return payload
+
+
+def _verify_decode_jwt(token):
     try:
         unverified_header = jwt.get_unverified_header(token)
     except:
@@ -114,22 +202,22 @@ def verify_decode_jwt(token):
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError({
             'code': 'invalid_header',
             'description': 'Authorization malformed.'
         }, 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    try:
+        rsa_key = jwks_store.get_key(unverified_header['kid'])
+    except KeyError:
+        rsa_key = None
+    except JWKSUnavailableError:
+        raise AuthError({
+            'code': 'jwks_unavailable',
+            'description': 'Unable to fetch the signing keys.'
+        }, 503)
+
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -169,23 +257,61 @@ def verify_decode_jwt(token):
         permission: string permission (i.e. 'post:actor')
 
     uses the get_token_auth_header method to get the token
+    uses the token_cache to skip the verification of already verified tokens
     uses the verify_decode_jwt method to decode the jwt
     uses the check_permissions method validate claims and check the requested permission
+    notifies the authorize listeners with the time the checks took
     returns the decorator which passes the decoded payload to the decorated method
 '''
 def requires_auth(permission=''):
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
+            started = time.perf_counter()
             try:
                 token = get_token_auth_header()
-                payload = verify_decode_jwt(token)
-                check_permissions(permission, payload)
+                entry = token_cache.get(token)
+                if entry is None:
+                    entry = token_cache.put(token, verify_decode_jwt(token))
+                payload = entry.payload
+                check_permissions(permission, payload, entry.permissions)
+                # the client of the request, for read-your-writes (see database/replicas.py)
+                g.token_subject = payload.get('sub')
             except AuthError as e:
                 raise AuthError({
                     'description': e.error['description']
                 }, e.status_code)
+            finally:
+                notify_authorize(time.perf_counter() - started)
             return f(payload, *args, **kwargs)
         return wrapper
     return requires_auth_decorator
 
+
+'''
+    implements authorize_async(authorization, permission) coroutine
+    @INPUTS
+        authorization: the Authorization header value (or None)
+        permission: string permission (i.e. 'get:actors')
+
+    the checks of @requires_auth for async (ASGI) routes: an already verified
+    token is taken from the token_cache, a new one is verified in a worker
+    thread (the signing keys may have to be fetched) so the event loop never blocks
+    raises an AuthError like @requires_auth
+    returns the decoded payload
+'''
+async def authorize_async(authorization, permission=''):
+    import anyio
+
+    try:
+        token = token_from_authorization(authorization)
+        entry = token_cache.get(token)
+        if entry is None:
+            payload = await anyio.to_thread.run_sync(verify_decode_jwt, token)
+            entry = token_cache.put(token, payload)
+        check_permissions(permission, entry.payload, entry.permissions)
+    except AuthError as e:
+        raise AuthError({
+            'description': e.error['description']
+        }, e.status_code)
+    return entry.payload
@@ -0,0 +1,221 @@
+import json
+import os
+import re
+import threading
+import time
+from urllib.request import urlopen
+
+from jose import jwk
+
+
+'''
+JWKSUnavailableError Exception
+raised when no signing keys can be obtained from the JWKS endpoint
+and there is no (still usable) cached copy to fall back to
+'''
+class JWKSUnavailableError(Exception):
+    pass
+
+
+'''
+    parse_cache_control(header) method
+    @INPUTS
+        header: value of a Cache-Control response header (or None)
+
+    returns a dict with the directives of the header, e.g.
+        'public, max-age=15, stale-if-error=86400'
+        -> {'public': None, 'max-age': 15, 'stale-if-error': 86400}
+'''
+def parse_cache_control(header):
+    directives = {}
+    if not header:
+        return directives
+    for part in header.split(','):
+        match = re.match(r'\s*([a-zA-Z-]+)\s*(?:=\s*"?(\d+)"?)?\s*$', part)
+        if match is None:
+            continue
+        name, value = match.groups()
+        directives[name.lower()] = int(value) if value is not None else None
+    return directives
+
+
+''' JWKSKeyStore
+a process-wide cache of the signing keys published at a JWKS url
+
+    - keys are fetched once and kept for the max-age announced by the
+      Cache-Control header of the response (or default_ttl), clamped to
+      [min_ttl, max_ttl]
+    - each key is parsed into a jose key object once, so that jwt.decode
+      does not rebuild the RSA key from 'n'/'e' on every request
+    - a background thread refreshes the keys shortly before they expire,
+      so requests do not wait for the identity provider
+    - an unknown 'kid' (key rotation) triggers a refresh, at most once per
+      min_refresh_interval seconds
+    - if a refresh fails, the previous keys keep being served for the
+      stale-if-error window of the last response (or stale_if_error)
+
+    the url can be any url supported by urlopen, e.g. a local
+    'file:///path/to/jwks.json' or 'http://127.0.0.1:8000/jwks.json'
+'''
+class JWKSKeyStore:
+
+    def __init__(self, url, algorithm='RS256', default_ttl=600, min_ttl=10,
+                 max_ttl=86400, min_refresh_interval=30, stale_if_error=3600,
+                 background_refresh=True, refresh_margin=0.1, timeout=5):
+        self.url = url
+        self.algorithm = algorithm
+        self.default_ttl = default_ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.stale_if_error = stale_if_error
+        self.background_refresh = background_refresh
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+
+        self._keys = {}
+        self._fetched_at = None
+        self._expires_at = 0
+        self._stale_until = 0
+        self._last_attempt = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._thread_pid = None
+        self.fetch_count = 0
+
+    '''
+    get_key(kid)
+        returns the parsed key object for the key id
+        raises a KeyError if the JWKS does not contain the key id
+        raises a JWKSUnavailableError if the JWKS can not be fetched
+    '''
+
+    def get_key(self, kid):
+        self._ensure_background_refresh()
+        now = time.monotonic()
+        if self._fetched_at is None or now >= self._expires_at:
+            self._refresh(now, force=self._fetched_at is None)
+        keys = self._keys
+        if kid not in keys and self._may_refresh_for_unknown_kid(time.monotonic()):
+            self._refresh(time.monotonic(), force=True)
+            keys = self._keys
+        return keys[kid]
+
+    '''
+    refresh()
+        fetches the JWKS right away, regardless of the cached copy
+    '''
+
+    def refresh(self):
+        self._refresh(time.monotonic(), force=True)
+
+    '''
+    clear()
+        drops all cached keys, the next get_key() fetches them again
+    '''
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+            self._expires_at = 0
+            self._stale_until = 0
+            self._last_attempt = None
+
+    def stop(self):
+        self.background_refresh = False
+        self._wakeup.set()
+
+    def _may_refresh_for_unknown_kid(self, now):
+        return (self._last_attempt is None
+                or now - self._last_attempt >= self.min_refresh_interval)
+
+    def _refresh(self, now, force=False):
+        with self._lock:
+            # another thread may have refreshed while we waited for the lock
+            if not force and self._fetched_at is not None and now < self._expires_at:
+                return
+            if force and self._last_attempt is not None and self._last_attempt > now:
+                return
+            self._last_attempt = time.monotonic()
+            try:
+                keys, ttl, stale_if_error = self._fetch()
+            except Exception as e:
+                if self._keys and time.monotonic() < self._stale_until:
+                    # keep serving the previous keys, retry after the rate limit
+                    self._expires_at = time.monotonic() + self.min_refresh_interval
+                    return
+                raise JWKSUnavailableError(
+                    'Unable to fetch JWKS from {}: {}'.format(self.url, e))
+            fetched_at = time.monotonic()
+            self._keys = keys
+            self._fetched_at = fetched_at
+            self._expires_at = fetched_at + ttl
+            self._stale_until = self._expires_at + stale_if_error
+            self._wakeup.set()
+
+    def _fetch(self):
+        response = urlopen(self.url, timeout=self.timeout)
+        try:
+            jwks = json.loads(response.read())
+            headers = getattr(response, 'headers', None)
+            cache_control = parse_cache_control(
+                headers.get('Cache-Control') if headers is not None else None)
+        finally:
+            response.close()
+        self.fetch_count += 1
+
+        keys = {}
+        for key in jwks.get('keys', []):
+            if 'kid' not in key or key.get('kty') != 'RSA':
+                continue
+            if key.get('use', 'sig') != 'sig':
+                continue
+            keys[key['kid']] = jwk.construct(key, key.get('alg', self.algorithm))
+
+        ttl = self.default_ttl
+        if 'no-cache' in cache_control or 'no-store' in cache_control:
+            ttl = self.min_ttl
+        elif cache_control.get('max-age') is not None:
+            ttl = cache_control['max-age']
+        ttl = min(max(ttl, self.min_ttl), self.max_ttl)
+
+        stale_if_error = cache_control.get('stale-if-error')
+        if stale_if_error is None:
+            stale_if_error = self.stale_if_error
+        return keys, ttl, stale_if_error
+
+    def _ensure_background_refresh(self):
+        if not self.background_refresh:
+            return
+        # threads do not survive a fork (e.g. gunicorn --preload), restart it
+        if (self._thread is not None and self._thread.is_alive()
+                and self._thread_pid == os.getpid()):
+            return
+        with self._lock:
+            if (self._thread is not None and self._thread.is_alive()
+                    and self._thread_pid == os.getpid()):
+                return
+            self._thread = threading.Thread(
+                target=self._refresh_loop, name='jwks-refresh', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _refresh_loop(self):
+        while self.background_refresh:
+            self._wakeup.clear()
+            if self._fetched_at is None:
+                delay = None
+            else:
+                ttl = self._expires_at - self._fetched_at
+                delay = max(self._expires_at - ttl * self.refresh_margin - time.monotonic(), 0)
+            if delay is None or delay > 0:
+                self._wakeup.wait(delay)
+                continue
+            try:
+                self._refresh(time.monotonic(), force=True)
+            except JWKSUnavailableError:
+                pass
+            # never spin faster than the rate limit, even after failures
+            self._wakeup.wait(self.min_refresh_interval)
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+
+'''
+TokenCacheEntry
+    payload: the decoded (and verified) jwt payload
+    permissions: frozenset of the 'permissions' claim (None if the claim is missing)
+    expires_at: unix time after which the entry must not be used
+'''
+TokenCacheEntry = namedtuple('TokenCacheEntry', ['payload', 'permissions', 'expires_at'])
+
+
+''' TokenCache
+a bounded LRU cache of verified tokens
+    entries are keyed by the sha256 of the token (the token itself is not kept)
+    and expire no later than the 'exp' claim of the token, or after max_ttl seconds
+    a max_size of 0 disables the cache
+    EXAMPLE
+        entry = token_cache.get(token)
+        if entry is None:
+            entry = token_cache.put(token, verify_decode_jwt(token))
+'''
+class TokenCache:
+
+    def __init__(self, max_size=1024, max_ttl=300):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        if isinstance(token, str):
+            token = token.encode('utf-8')
+        return hashlib.sha256(token).digest()
+
+    '''
+    get(token)
+        returns the cached TokenCacheEntry for the token
+        or None if the token is not cached (or its entry has expired)
+    '''
+
+    def get(self, token):
+        if self.max_size <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    '''
+    put(token, payload)
+        caches the verified payload of the token, evicting the least
+        recently used entry if the cache is full
+        returns the new TokenCacheEntry
+    '''
+
+    def put(self, token, payload):
+        permissions = payload.get('permissions')
+        entry = TokenCacheEntry(
+            payload,
+            frozenset(permissions) if permissions is not None else None,
+            min(payload.get('exp', float('inf')), time.time() + self.max_ttl)
+        )
+        if self.max_size <= 0:
+            return entry
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    '''
+    stats()
+        returns the size and the hit/miss counters of the cache
+    '''
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
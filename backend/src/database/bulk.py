@@ -0,0 +1,183 @@
+from sqlalchemy import (Integer, and_, any_, bindparam, case, cast, column, delete, exc, func, insert, select,
+                        update, values)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm.util import identity_key
+
+
+'''
+    supports_returning(session) method
+    returns True if the database of the session supports INSERT/UPDATE/DELETE ... RETURNING
+'''
+def supports_returning(session):
+    dialect = session.get_bind().dialect
+    return bool(getattr(dialect, 'insert_returning', getattr(dialect, 'full_returning', False)))
+
+
+'''
+    insert_many(session, model, rows) method
+    @INPUTS
+        session: the database session (the caller commits)
+        model: the model class, e.g. Actor
+        rows: list of dicts of column values
+
+    inserts all the rows with a single multi-row INSERT ... RETURNING statement
+    (or, on databases without RETURNING, adds them to the session and flushes)
+    returns the list of model instances (with their new ids) in the order of rows
+'''
+def insert_many(session, model, rows):
+    if not rows:
+        return []
+    table = model.__table__
+    if supports_returning(session):
+        result = session.execute(insert(table).values(rows).returning(*table.c))
+        # ids are assigned in the order of the VALUES list
+        returned = sorted(result.mappings().all(), key=lambda row: row['id'])
+        return [model(**row) for row in returned]
+    entities = [model(**row) for row in rows]
+    session.add_all(entities)
+    session.flush()
+    return entities
+
+
+'''
+    insert_each(session, model, rows) method
+    inserts the rows one by one, each in its own savepoint, so that a row
+    rejected by the database does not abort the others (the caller commits)
+    returns the list of model instances in the order of rows, None for the
+    rows which could not be inserted
+'''
+def insert_each(session, model, rows):
+    entities = []
+    for row in rows:
+        entity = model(**row)
+        try:
+            with session.begin_nested():
+                session.add(entity)
+        except exc.SQLAlchemyError:
+            entity = None
+        entities.append(entity)
+    return entities
+
+
+def _is_postgres(session):
+    return session.get_bind().dialect.name == 'postgresql'
+
+
+def _changed(table, rows):
+    # the columns changed by at least one row, in the order of the table
+    names = set(name for row_id, changes in rows for name in changes)
+    return [name for name in table.c.keys() if name in names]
+
+
+'''
+    update_many(session, model, rows, columns) method
+    @INPUTS
+        session: the database session (the caller commits)
+        model: the model class, e.g. Actor
+        rows: list of (id, changes), changes is the dict of the new values of
+            the columns of the row (the other columns are left unchanged)
+        columns: the columns returned for the updated rows, e.g. (Actor.id, Actor.name)
+
+    updates all the rows with a single UPDATE ... FROM (VALUES ...) RETURNING
+    statement on Postgres (an executemany UPDATE, then a SELECT elsewhere), and
+    increments the version of the rows with changes
+    returns {id: row} of the updated rows, the ids with no row are missing
+'''
+def update_many(session, model, rows, columns):
+    if not rows:
+        return {}
+    table = model.__table__
+    names = _changed(table, rows)
+    ids = [row_id for row_id, changes in rows]
+    if _is_postgres(session):
+        # the missing values are NULL (the columns are NOT NULL): unchanged
+        changes = values(column('id', Integer), *[column(name, table.c[name].type) for name in names],
+                         name='changes').data(
+            [(row_id,) + tuple(row.get(name) for name in names) for row_id, row in rows])
+        new_values = {name: func.coalesce(cast(changes.c[name], table.c[name].type), table.c[name])
+                      for name in names}
+        unchanged = and_(*[changes.c[name].is_(None) for name in names])
+        statement = (update(table).where(table.c.id == changes.c.id)
+                     .values(version=case((unchanged, table.c.version), else_=table.c.version + 1) if names
+                             else table.c.version, **new_values)
+                     .returning(*columns))
+        return {row.id: row for row in session.execute(statement)}
+    if names:
+        new_values = {name: func.coalesce(bindparam('new_' + name, type_=table.c[name].type), table.c[name])
+                      for name in names}
+        unchanged = and_(*[bindparam('new_' + name).is_(None) for name in names])
+        statement = (update(table).where(table.c.id == bindparam('row_id'))
+                     .values(version=case((unchanged, table.c.version), else_=table.c.version + 1), **new_values))
+        session.execute(statement, [dict({'new_' + name: row.get(name) for name in names}, row_id=row_id)
+                                    for row_id, row in rows])
+    return {row.id: row for row in session.execute(select(*columns).where(table.c.id.in_(ids)))}
+
+
+'''
+    update_each(session, model, rows, columns) method
+    updates the rows (see update_many) one by one, each in its own savepoint,
+    so that a row rejected by the database does not abort the others (the
+    caller commits)
+    returns ({id: row} of the updated rows, set of the ids of the rejected rows)
+'''
+def update_each(session, model, rows, columns):
+    updated = {}
+    rejected = set()
+    for row_id, changes in rows:
+        try:
+            with session.begin_nested():
+                updated.update(update_many(session, model, [(row_id, changes)], columns))
+        except exc.SQLAlchemyError:
+            rejected.add(row_id)
+    return updated, rejected
+
+
+'''
+    delete_many(session, model, ids) method
+    @INPUTS
+        session: the database session (the caller commits)
+        model: the model class, e.g. Actor
+        ids: list of the ids of the rows to delete
+
+    deletes all the rows with a single DELETE ... WHERE id = ANY(...) RETURNING
+    statement on Postgres (a SELECT, then a DELETE elsewhere); the instances of
+    the deleted rows leave the session, as after session.delete()
+    returns the list of the ids of the deleted rows, the ids with no row are missing
+'''
+def delete_many(session, model, ids):
+    if not ids:
+        return []
+    table = model.__table__
+    if _is_postgres(session):
+        # a single array parameter, the same statement for any number of ids
+        ids_parameter = bindparam('ids', ids, type_=ARRAY(Integer))
+        deleted = session.execute(delete(table).where(table.c.id == any_(ids_parameter))
+                                  .returning(table.c.id)).scalars().all()
+    else:
+        deleted = session.execute(select(table.c.id).where(table.c.id.in_(ids))).scalars().all()
+        if deleted:
+            session.execute(delete(table).where(table.c.id.in_(deleted)))
+    for row_id in deleted:
+        instance = session.identity_map.get(identity_key(model, row_id))
+        if instance is not None:
+            session.expunge(instance)
+    return deleted
+
+
+'''
+    delete_each(session, model, ids) method
+    deletes the rows one by one, each in its own savepoint, so that a row
+    rejected by the database (e.g. a failed constraint) does not abort the others
+    (the caller commits)
+    returns (list of the ids of the deleted rows, set of the ids of the rejected rows)
+'''
+def delete_each(session, model, ids):
+    deleted = []
+    rejected = set()
+    for row_id in ids:
+        try:
+            with session.begin_nested():
+                deleted.extend(delete_many(session, model, [row_id]))
+        except exc.SQLAlchemyError:
+            rejected.add(row_id)
+    return deleted, rejected
@@ -0,0 +1,337 @@
+import csv
+import datetime
+import io
+import json
+import sys
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, select, text
+
+from database.models import db, Actor, Movie, Catalog, bump_table_version, notify_write
+from database.counts import row_counts
+
+
+'''
+Bulk import
+
+    flask import-data <actors|movies|catalog> <file.csv|file.ndjson|->
+
+    streams a CSV (with a header row) or NDJSON file into the Actor, Movie or
+    Catalog table, reading and sending at most --chunk-size rows at a time, so
+    memory stays constant regardless of the size of the file
+
+    - every row is validated (invalid rows are reported with their line number
+      and skipped, the import is aborted after --max-errors invalid rows)
+    - on Postgres the rows are streamed with COPY FROM STDIN into a temporary
+      staging table and moved to the target table with one INSERT ... SELECT
+    - on other databases the rows are inserted with chunked executemany
+    - catalog rows reference actors and movies by actor_id/movie_id or by
+      actor_name/movie_title; the references are resolved in bulk and rows
+      pointing to missing actors or movies are skipped
+    - the whole import runs in a single transaction
+'''
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def _text(value, field):
+    if value is None or str(value).strip() == "":
+        raise ImportRowError('{} is required'.format(field))
+    return str(value)
+
+
+def _optional_text(value, field):
+    if value is None or str(value).strip() == "":
+        return None
+    return str(value)
+
+
+def _integer(value, field):
+    if value is None or value == "":
+        raise ImportRowError('{} is required'.format(field))
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError(value)
+        return int(value)
+    except (TypeError, ValueError):
+        raise ImportRowError('{} must be an integer'.format(field))
+
+
+def _optional_integer(value, field):
+    if value is None or value == "":
+        return None
+    return _integer(value, field)
+
+
+'''
+    parse_date(value) method
+    accepts ISO (YYYY-MM-DD) and the API format (MM-DD-YYYY)
+'''
+def parse_date(value, field='release_date'):
+    if isinstance(value, datetime.date):
+        return value
+    for date_format in ('%Y-%m-%d', '%m-%d-%Y'):
+        try:
+            return datetime.datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            pass
+    raise ImportRowError('{} must be a date (YYYY-MM-DD or MM-DD-YYYY)'.format(field))
+
+
+def validate_actor_row(record):
+    age = _integer(record.get('age'), 'age')
+    if age < 0:
+        raise ImportRowError('age must not be negative')
+    return (_text(record.get('name'), 'name'), age, _text(record.get('gender'), 'gender'))
+
+
+def validate_movie_row(record):
+    if record.get('release_date') in (None, ""):
+        raise ImportRowError('release_date is required')
+    return (_text(record.get('title'), 'title'), parse_date(record.get('release_date')))
+
+
+def validate_catalog_row(record):
+    row = (
+        _optional_integer(record.get('actor_id'), 'actor_id'),
+        _optional_integer(record.get('movie_id'), 'movie_id'),
+        _optional_text(record.get('actor_name'), 'actor_name'),
+        _optional_text(record.get('movie_title'), 'movie_title'),
+    )
+    if row[0] is None and row[2] is None:
+        raise ImportRowError('actor_id or actor_name is required')
+    if row[1] is None and row[3] is None:
+        raise ImportRowError('movie_id or movie_title is required')
+    return row
+
+
+'''
+IMPORT_TABLES
+    for each importable table: the model, the columns of the validated rows,
+    the validation function and the staging table column types
+'''
+IMPORT_TABLES = {
+    'actors': (Actor, ('name', 'age', 'gender'), validate_actor_row,
+               ('text', 'integer', 'text')),
+    'movies': (Movie, ('title', 'release_date'), validate_movie_row,
+               ('text', 'date')),
+    'catalog': (Catalog, ('actor_id', 'movie_id', 'actor_name', 'movie_title'), validate_catalog_row,
+                ('integer', 'integer', 'text', 'text')),
+}
+
+
+'''
+    read_records(stream, file_format) method
+    yields (line number, record dict) for every record of a CSV or NDJSON stream
+'''
+def read_records(stream, file_format):
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record
+
+
+'''
+    validated_chunks(records, validate, chunk_size, report) method
+    yields lists of at most chunk_size validated rows
+    calls report(line number, message) for every invalid record
+'''
+def validated_chunks(records, validate, chunk_size, report):
+    chunk = []
+    for line_number, record in records:
+        if not isinstance(record, dict):
+            report(line_number, 'not a json object')
+            continue
+        try:
+            chunk.append(validate(record))
+        except ImportRowError as e:
+            report(line_number, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+''' ImportStats
+progress and result counters of an import
+'''
+class ImportStats:
+
+    def __init__(self, max_errors=100, echo=click.echo):
+        self.max_errors = max_errors
+        self.echo = echo
+        self.staged = 0
+        self.invalid = 0
+        self.unresolved = 0
+        self.imported = 0
+        self.started_at = time.monotonic()
+
+    def report_invalid(self, line_number, message):
+        self.invalid += 1
+        self.echo('line {}: {}'.format(line_number, message), err=True)
+        if self.max_errors is not None and self.invalid > self.max_errors:
+            raise click.ClickException('Too many invalid rows ({}), import aborted.'.format(self.invalid))
+
+    def report_progress(self, rows):
+        self.staged += rows
+        elapsed = time.monotonic() - self.started_at
+        self.echo('{} rows staged ({:.0f} rows/s)'.format(
+            self.staged, self.staged / elapsed if elapsed else 0), err=True)
+
+
+def _copy_rows(cursor, sql, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(row)
+    buffer.seek(0)
+    cursor.copy_expert(sql, buffer)
+
+
+'''
+    copy_import(session, table, chunks, stats) method
+    Postgres import: COPY FROM STDIN into a temporary staging table,
+    then a single INSERT ... SELECT (resolving catalog references in bulk)
+    returns the number of imported rows
+'''
+def copy_import(session, table, chunks, stats):
+    model, columns, validate, types = IMPORT_TABLES[table]
+    connection = session.connection()
+    connection.execute(text('CREATE TEMP TABLE import_staging ({}) ON COMMIT DROP'.format(
+        ', '.join('{} {}'.format(column, column_type) for column, column_type in zip(columns, types)))))
+
+    cursor = connection.connection.cursor()
+    # in csv format an unquoted empty value (how csv.writer writes None) is NULL
+    copy_sql = 'COPY import_staging ({}) FROM STDIN WITH (FORMAT csv)'.format(', '.join(columns))
+    for chunk in chunks:
+        _copy_rows(cursor, copy_sql, chunk)
+        stats.report_progress(len(chunk))
+    cursor.close()
+
+    if table != 'catalog':
+        result = connection.execute(text('INSERT INTO "{0}" ({1}) SELECT {1} FROM import_staging'.format(
+            model.__tablename__, ', '.join(columns))))
+        return result.rowcount
+
+    # resolve actor/movie names (the lowest id wins for duplicated names)
+    connection.execute(text(
+        'UPDATE import_staging s SET actor_id = a.id '
+        'FROM (SELECT name, min(id) AS id FROM "Actor" GROUP BY name) a '
+        'WHERE s.actor_id IS NULL AND s.actor_name = a.name'))
+    connection.execute(text(
+        'UPDATE import_staging s SET movie_id = m.id '
+        'FROM (SELECT title, min(id) AS id FROM "Movie" GROUP BY title) m '
+        'WHERE s.movie_id IS NULL AND s.movie_title = m.title'))
+    result = connection.execute(text(
+        'INSERT INTO "Catalog" (actor_id, movie_id) '
+        'SELECT s.actor_id, s.movie_id FROM import_staging s '
+        'JOIN "Actor" a ON a.id = s.actor_id JOIN "Movie" m ON m.id = s.movie_id'))
+    stats.unresolved = stats.staged - result.rowcount
+    return result.rowcount
+
+
+def _resolve_ids(session, column, key_column, values):
+    if not values:
+        return {}
+    rows = session.execute(
+        select(key_column, func.min(column)).where(key_column.in_(values)).group_by(key_column))
+    return dict(rows.all())
+
+
+def _existing_ids(session, column, ids):
+    if not ids:
+        return set()
+    return set(session.execute(select(column).where(column.in_(ids))).scalars())
+
+
+'''
+    executemany_import(session, table, chunks, stats) method
+    import for databases without COPY: one executemany INSERT per chunk,
+    catalog references are resolved with one query per chunk and referenced table
+    returns the number of imported rows
+'''
+def executemany_import(session, table, chunks, stats):
+    model, columns, validate, types = IMPORT_TABLES[table]
+    imported = 0
+    for chunk in chunks:
+        stats.report_progress(len(chunk))
+        if table == 'catalog':
+            actor_ids = _resolve_ids(session, Actor.id, Actor.name, {row[2] for row in chunk if row[0] is None})
+            movie_ids = _resolve_ids(session, Movie.id, Movie.title, {row[3] for row in chunk if row[1] is None})
+            rows = [(actor_ids.get(row[2]) if row[0] is None else row[0],
+                     movie_ids.get(row[3]) if row[1] is None else row[1]) for row in chunk]
+            existing_actors = _existing_ids(session, Actor.id, {row[0] for row in rows if row[0] is not None})
+            existing_movies = _existing_ids(session, Movie.id, {row[1] for row in rows if row[1] is not None})
+            values = [{'actor_id': actor_id, 'movie_id': movie_id} for actor_id, movie_id in rows
+                      if actor_id in existing_actors and movie_id in existing_movies]
+            stats.unresolved += len(chunk) - len(values)
+        else:
+            values = [dict(zip(columns, row)) for row in chunk]
+        if values:
+            session.execute(insert(model.__table__), values)
+        imported += len(values)
+    return imported
+
+
+'''
+    import_file(session, table, stream, file_format, chunk_size, stats) method
+    imports the records of the stream into the table in a single transaction
+    returns the number of imported rows
+'''
+def import_file(session, table, stream, file_format, chunk_size=10000, stats=None):
+    stats = stats or ImportStats()
+    model, columns, validate, types = IMPORT_TABLES[table]
+    chunks = validated_chunks(read_records(stream, file_format), validate, chunk_size, stats.report_invalid)
+    try:
+        if session.get_bind().dialect.name == 'postgresql':
+            imported = copy_import(session, table, chunks, stats)
+        else:
+            imported = executemany_import(session, table, chunks, stats)
+        bump_table_version(model.__tablename__)
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    stats.imported = imported
+    row_counts.invalidate(model.__tablename__)
+    notify_write(model.__tablename__)
+    return imported
+
+
+@click.command('import-data')
+@click.argument('table', type=click.Choice(sorted(IMPORT_TABLES)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='File format, guessed from the file extension by default.')
+@click.option('--chunk-size', default=10000, show_default=True,
+              help='Number of rows read and sent to the database at a time.')
+@click.option('--max-errors', default=100, show_default=True,
+              help='Abort the import after this many invalid rows.')
+@with_appcontext
+def import_data_command(table, path, file_format, chunk_size, max_errors):
+    """Bulk import a CSV or NDJSON file into the actors, movies or catalog table."""
+    if file_format is None:
+        file_format = 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+    stats = ImportStats(max_errors=max_errors)
+    if path == '-':
+        imported = import_file(db.session, table, sys.stdin, file_format, chunk_size, stats)
+    else:
+        with open(path, newline='', encoding='utf-8') as stream:
+            imported = import_file(db.session, table, stream, file_format, chunk_size, stats)
+    click.echo('Imported {} {} rows ({} invalid, {} unresolved) in {:.1f}s.'.format(
+        imported, table, stats.invalid, stats.unresolved, time.monotonic() - stats.started_at))
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+
+COUNT_MODES = ('exact', 'estimate', 'cached')
+DEFAULT_COUNT_MODE = os.getenv('LIST_COUNT_MODE', 'exact')
+COUNT_CACHE_TTL = int(os.getenv('COUNT_CACHE_TTL', 60))
+
+
+''' RowCounter
+a per-process cache of table row counts
+    a count is loaded with an exact count the first time it is needed and then
+    kept up to date by the insert()/delete() methods of the models
+    writes made by other processes are not seen, so a count is reloaded once it
+    is older than max_age seconds
+'''
+class RowCounter:
+
+    def __init__(self, max_age=COUNT_CACHE_TTL):
+        self.max_age = max_age
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    '''
+    get(table, loader)
+        returns the cached count of the table
+        calls loader() to (re)load the count if it is missing or too old
+    '''
+
+    def get(self, table, loader):
+        cached = self._counts.get(table)
+        if cached is not None and time.monotonic() - cached[1] < self.max_age:
+            return cached[0]
+        count = loader()
+        with self._lock:
+            self._counts[table] = (count, time.monotonic())
+        return count
+
+    '''
+    adjust(table, delta)
+        adds delta to the cached count of the table (if it is loaded)
+    '''
+
+    def adjust(self, table, delta):
+        with self._lock:
+            cached = self._counts.get(table)
+            if cached is not None:
+                self._counts[table] = (max(cached[0] + delta, 0), cached[1])
+
+    def invalidate(self, table=None):
+        with self._lock:
+            if table is None:
+                self._counts.clear()
+            else:
+                self._counts.pop(table, None)
+
+
+row_counts = RowCounter()
+
+
+'''
+    exact_count(session, model, conditions) method
+    returns the number of rows of the model table (SELECT count(*))
+    matching the conditions (if any)
+'''
+def exact_count(session, model, conditions=()):
+    return session.execute(select(func.count()).select_from(model.__table__).where(*conditions)).scalar()
+
+
+'''
+    estimated_count(session, model) method
+    returns the planner estimate of the number of rows of the model table
+    (pg_class.reltuples, maintained by VACUUM/ANALYZE) on Postgres
+    falls back to exact_count on other databases or if the table was never analyzed
+'''
+def estimated_count(session, model):
+    if session.get_bind().dialect.name != 'postgresql':
+        return exact_count(session, model)
+    estimate = session.execute(
+        text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)'),
+        {'table': '"{}"'.format(model.__tablename__)}
+    ).scalar()
+    if estimate is None or estimate < 0:
+        return exact_count(session, model)
+    return int(estimate)
+
+
+''' _Explain
+EXPLAIN (FORMAT JSON) of a statement, executed like the statement: its
+parameters are bound by the driver in its own paramstyle (e.g. the positional
+parameters of asyncpg, the expanded lists of in_())
+'''
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kw):
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kw)
+
+
+'''
+    estimated_filtered_count(session, model, conditions) method
+    returns the planner estimate of the number of rows matching the conditions
+    (the rows of the plan of the count, from EXPLAIN) on Postgres
+    falls back to exact_count on other databases
+'''
+def estimated_filtered_count(session, model, conditions):
+    if session.get_bind().dialect.name != 'postgresql':
+        return exact_count(session, model, conditions)
+    plan = session.execute(_Explain(select(model.__table__.c.id).where(*conditions))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+'''
+    count_rows(session, model, mode, conditions) method
+    @INPUTS
+        mode: 'exact' (SELECT count(*)), 'estimate' (pg_class.reltuples)
+              or 'cached' (per-process counter, see RowCounter)
+        conditions: the filters of the counted rows (see api/filtering.py);
+              filtered counts are estimated from the plan of the count,
+              and never cached ('cached' counts them exactly)
+
+    raises a ValueError for an unknown mode
+    returns the number of rows of the model table
+'''
+def count_rows(session, model, mode=DEFAULT_COUNT_MODE, conditions=()):
+    if mode not in COUNT_MODES:
+        raise ValueError('Unknown count mode: {}'.format(mode))
+    if conditions:
+        if mode == 'estimate':
+            return estimated_filtered_count(session, model, conditions)
+        return exact_count(session, model, conditions)
+    if mode == 'exact':
+        return exact_count(session, model)
+    if mode == 'estimate':
+        return estimated_count(session, model)
+    if mode == 'cached':
+        return row_counts.get(model.__tablename__, lambda: exact_count(session, model))
+    raise ValueError('Unknown count mode: {}'.format(mode))
@@ -0,0 +1,308 @@
+import csv
+import datetime
+import json
+import math
+import os
+import random
+import time
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, select, text
+
+from database.bulk_import import _copy_rows
+from database.counts import row_counts
+from database.models import db, Actor, Movie, Catalog, bump_table_version, notify_write
+
+
+'''
+Synthetic data
+
+    flask generate-data --actors 1000000 --movies 200000 [--output DIR]
+
+    generates realistic Actor, Movie and Catalog rows, deterministically: the
+    same options and --seed always give the same rows
+    - actor ages and movie release dates follow plausible distributions
+    - the cast size of a movie is log-normal around --cast-mean (8), capped at
+      --cast-max (60); a --blockbusters share of the movies (1%) are
+      blockbusters with a cast around --blockbuster-cast (300)
+    - actors are picked with a popularity skew (--actor-skew, 0 for uniform):
+      a few actors play in many movies, most in a few; the popular actors are
+      spread over the ids, not the first ones
+    the rows are streamed into the database (COPY FROM STDIN on Postgres,
+    chunked executemany inserts otherwise) after the existing rows, or written
+    to actors/movies/catalog files in --output (csv or ndjson, see import-data)
+    rows are produced --chunk-size at a time, so memory does not depend on
+    the number of rows
+'''
+
+FIRST_NAMES = [
+    'Ada', 'Adam', 'Alan', 'Alice', 'Amelia', 'Anna', 'Ben', 'Carla', 'Carlos', 'Chloe', 'Dan', 'David',
+    'Elena', 'Emma', 'Eva', 'Felix', 'Frank', 'Grace', 'Hannah', 'Hugo', 'Ines', 'Isaac', 'Jack', 'James',
+    'Julia', 'Kate', 'Kenji', 'Laura', 'Leo', 'Liam', 'Lucia', 'Maria', 'Marta', 'Max', 'Mia', 'Nina',
+    'Noah', 'Olga', 'Omar', 'Oscar', 'Paula', 'Peter', 'Priya', 'Rick', 'Rosa', 'Sam', 'Sara', 'Sofia',
+    'Tom', 'Uma', 'Victor', 'Yuki', 'Zoe',
+]
+LAST_NAMES = [
+    'Adams', 'Berg', 'Brown', 'Clark', 'Costa', 'Davis', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Hansen',
+    'Harris', 'Ito', 'Jansen', 'Johnson', 'Kim', 'King', 'Kowalski', 'Lee', 'Lopez', 'Martin', 'Miller',
+    'Moore', 'Mueller', 'Nelson', 'Novak', 'Okafor', 'Patel', 'Perez', 'Rossi', 'Santos', 'Schmidt',
+    'Silva', 'Smith', 'Suzuki', 'Taylor', 'Walker', 'Wang', 'Wilson', 'Young',
+]
+TITLE_ADJECTIVES = [
+    'Dark', 'Silent', 'Last', 'Golden', 'Secret', 'Lost', 'Broken', 'Hidden', 'Wild', 'Cold', 'Eternal',
+    'Crimson', 'Final', 'Burning', 'Forgotten', 'Midnight', 'Distant', 'Little', 'Electric', 'Frozen',
+]
+TITLE_NOUNS = [
+    'Night', 'Empire', 'Storm', 'River', 'City', 'Island', 'Star', 'Winter', 'Code', 'Kingdom', 'Fire',
+    'Garden', 'Road', 'Shadow', 'Ocean', 'Mountain', 'Heart', 'Dream', 'Machine', 'Summer', 'Legacy', 'Moon',
+]
+GENDERS = ['F', 'M']
+
+# fixed, so that the rows do not depend on the day they are generated
+FIRST_RELEASE_DATE = datetime.date(1920, 1, 1)
+LAST_RELEASE_DATE = datetime.date(2025, 12, 31)
+
+# spread of the log-normal cast sizes (sigma)
+CAST_SIZE_SPREAD = 0.6
+
+
+''' DataGenerator
+a deterministic generator of Actor, Movie and Catalog rows
+    every table has its own random stream (derived from the seed), so e.g.
+    changing the number of movies does not change the generated actors
+'''
+class DataGenerator:
+
+    def __init__(self, actors, movies, cast_mean=8, cast_max=60, blockbusters=0.01,
+                 blockbuster_cast=300, actor_skew=1.5, seed=42):
+        self.actors = actors
+        self.movies = movies
+        self.cast_mean = cast_mean
+        self.cast_max = cast_max
+        self.blockbusters = blockbusters
+        self.blockbuster_cast = blockbuster_cast
+        self.actor_skew = actor_skew
+        self.seed = seed
+        # multiplying by a number coprime with the number of actors permutes the
+        # actor indexes, so that the popular actors are not the first ids
+        self._stride = next(stride for stride in range(7919, 7919 + max(actors, 1) + 1)
+                            if math.gcd(stride, max(actors, 1)) == 1)
+
+    def _random(self, table):
+        return random.Random('{}-{}'.format(self.seed, table))
+
+    '''
+    actor_rows(first_id)
+        yields (id, name, age, gender) for every actor, the ids from first_id
+    '''
+
+    def actor_rows(self, first_id=1):
+        rng = self._random('actors')
+        for index in range(self.actors):
+            age = min(95, max(5, int(rng.gauss(40, 15))))
+            yield (first_id + index, '{} {}'.format(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)),
+                   age, rng.choice(GENDERS))
+
+    '''
+    movie_rows(first_id)
+        yields (id, title, release_date) for every movie, the ids from first_id
+        (the release dates get denser towards the present)
+    '''
+
+    def movie_rows(self, first_id=1):
+        rng = self._random('movies')
+        first_day = FIRST_RELEASE_DATE.toordinal()
+        days = LAST_RELEASE_DATE.toordinal() - first_day
+        for index in range(self.movies):
+            title = 'The {} {}'.format(rng.choice(TITLE_ADJECTIVES), rng.choice(TITLE_NOUNS))
+            if rng.random() < 0.15:
+                title += ' {}'.format(rng.randint(2, 5))
+            release_date = datetime.date.fromordinal(first_day + int(days * rng.random() ** 0.5))
+            yield (first_id + index, title, release_date)
+
+    '''
+    cast_size(rng)
+        returns the number of actors of a movie: log-normal around cast_mean
+        (at most cast_max), around blockbuster_cast for a blockbusters share of
+        the movies; never more than the number of actors
+    '''
+
+    def cast_size(self, rng):
+        if self.cast_mean <= 0 or self.actors <= 0:
+            return 0
+        blockbuster = rng.random() < self.blockbusters
+        mean, cap = (self.blockbuster_cast, self.actors) if blockbuster else (self.cast_mean, self.cast_max)
+        mu = math.log(mean) - CAST_SIZE_SPREAD ** 2 / 2
+        size = int(round(rng.lognormvariate(mu, CAST_SIZE_SPREAD)))
+        return max(1, min(size, cap, self.actors))
+
+    def _pick_actor(self, rng):
+        # u ** (1 + skew) piles the indexes up near 0: a power law popularity
+        index = min(int(self.actors * rng.random() ** (1 + self.actor_skew)), self.actors - 1)
+        return index * self._stride % self.actors
+
+    '''
+    catalog_rows(first_actor_id, first_movie_id)
+        yields (actor_id, movie_id) for the cast of every movie (an actor is
+        at most once in a cast)
+    '''
+
+    def catalog_rows(self, first_actor_id=1, first_movie_id=1):
+        rng = self._random('catalog')
+        for movie_index in range(self.movies):
+            size = self.cast_size(rng)
+            cast = set()
+            attempts = 0
+            # with a strong skew the popular actors are drawn again and again
+            while len(cast) < size and attempts < size * 20:
+                cast.add(self._pick_actor(rng))
+                attempts += 1
+            for actor_index in sorted(cast):
+                yield (first_actor_id + actor_index, first_movie_id + movie_index)
+
+
+'''
+GENERATED_TABLES
+    for each generated table: its name, the model and the columns of the
+    generated rows (in the order they are generated)
+'''
+GENERATED_TABLES = [
+    ('actors', Actor, ('id', 'name', 'age', 'gender')),
+    ('movies', Movie, ('id', 'title', 'release_date')),
+    ('catalog', Catalog, ('actor_id', 'movie_id')),
+]
+
+
+def _chunked(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _table_rows(generator, table, first_ids):
+    if table == 'actors':
+        return generator.actor_rows(first_ids['actors'])
+    if table == 'movies':
+        return generator.movie_rows(first_ids['movies'])
+    return generator.catalog_rows(first_ids['actors'], first_ids['movies'])
+
+
+'''
+    generate_data(session, generator, chunk_size, echo) method
+    inserts the rows of the generator after the existing rows (the ids start
+    after the highest existing id), in a single transaction
+    returns {table: number of inserted rows}
+'''
+def generate_data(session, generator, chunk_size=10000, echo=click.echo):
+    postgres = session.get_bind().dialect.name == 'postgresql'
+    counts = {}
+    try:
+        if postgres:
+            # the ids are chosen here, no other writer may take them meanwhile
+            session.execute(text('LOCK TABLE "Actor", "Movie", "Catalog" IN EXCLUSIVE MODE'))
+        first_ids = {
+            'actors': (session.execute(select(func.max(Actor.id))).scalar() or 0) + 1,
+            'movies': (session.execute(select(func.max(Movie.id))).scalar() or 0) + 1,
+        }
+        for table, model, columns in GENERATED_TABLES:
+            started = time.monotonic()
+            counts[table] = 0
+            if postgres:
+                cursor = session.connection().connection.cursor()
+                copy_sql = 'COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                    model.__tablename__, ', '.join(columns))
+            for chunk in _chunked(_table_rows(generator, table, first_ids), chunk_size):
+                if postgres:
+                    _copy_rows(cursor, copy_sql, chunk)
+                else:
+                    session.execute(insert(model.__table__), [dict(zip(columns, row)) for row in chunk])
+                counts[table] += len(chunk)
+                elapsed = time.monotonic() - started
+                echo('{} {} rows generated ({:.0f} rows/s)'.format(
+                    counts[table], table, counts[table] / elapsed if elapsed else 0), err=True)
+            if postgres:
+                cursor.close()
+                if 'id' in columns:
+                    # the rows were copied with their ids, move the sequence past them
+                    session.execute(text(
+                        "SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+                        "(SELECT max(id) FROM \"{0}\"))".format(model.__tablename__)))
+            bump_table_version(model.__tablename__)
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    for table, model, columns in GENERATED_TABLES:
+        row_counts.invalidate(model.__tablename__)
+        notify_write(model.__tablename__)
+    return counts
+
+
+def _format_value(value):
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+
+'''
+    write_files(generator, directory, file_format, echo) method
+    writes the rows of the generator to actors, movies and catalog files
+    (.csv with a header row or .ndjson) in the directory, with the ids
+    starting at 1: import them into empty tables, e.g. with import-data
+    returns {table: number of written rows}
+'''
+def write_files(generator, directory, file_format='csv', echo=click.echo):
+    os.makedirs(directory, exist_ok=True)
+    first_ids = {'actors': 1, 'movies': 1}
+    counts = {}
+    for table, model, columns in GENERATED_TABLES:
+        path = os.path.join(directory, '{}.{}'.format(table, file_format))
+        counts[table] = 0
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            writer = csv.writer(stream) if file_format == 'csv' else None
+            if writer:
+                writer.writerow(columns)
+            for row in _table_rows(generator, table, first_ids):
+                row = [_format_value(value) for value in row]
+                if writer:
+                    writer.writerow(row)
+                else:
+                    stream.write(json.dumps(dict(zip(columns, row))) + '\n')
+                counts[table] += 1
+        echo('{} {} rows written to {}'.format(counts[table], table, path), err=True)
+    return counts
+
+
+@click.command('generate-data')
+@click.option('--actors', default=100000, show_default=True, help='Number of actors.')
+@click.option('--movies', default=20000, show_default=True, help='Number of movies.')
+@click.option('--cast-mean', default=8.0, show_default=True, help='Average cast size of a movie.')
+@click.option('--cast-max', default=60, show_default=True, help='Largest cast of a movie (but blockbusters).')
+@click.option('--blockbusters', default=0.01, show_default=True, help='Share of the movies with a huge cast.')
+@click.option('--blockbuster-cast', default=300.0, show_default=True, help='Average cast size of a blockbuster.')
+@click.option('--actor-skew', default=1.5, show_default=True,
+              help='Popularity skew of the actors, 0 for actors picked uniformly.')
+@click.option('--seed', default=42, show_default=True, help='Same seed and options, same rows.')
+@click.option('--output', type=click.Path(file_okay=False),
+              help='Write the rows to files in this directory instead of the database.')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True,
+              help='Format of the files written with --output.')
+@click.option('--chunk-size', default=10000, show_default=True,
+              help='Number of rows generated and sent to the database at a time.')
+@with_appcontext
+def generate_data_command(actors, movies, cast_mean, cast_max, blockbusters, blockbuster_cast, actor_skew, seed,
+                          output, file_format, chunk_size):
+    """Generate realistic actors, movies and catalog rows for scale testing."""
+    generator = DataGenerator(actors, movies, cast_mean=cast_mean, cast_max=cast_max, blockbusters=blockbusters,
+                              blockbuster_cast=blockbuster_cast, actor_skew=actor_skew, seed=seed)
+    started = time.monotonic()
+    if output:
+        counts = write_files(generator, output, file_format)
+    else:
+        counts = generate_data(db.session, generator, chunk_size)
+    click.echo('Generated {actors} actors, {movies} movies and {catalog} catalog rows'.format(**counts)
+               + ' in {:.1f}s.'.format(time.monotonic() - started))
@@ -0,0 +1,263 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+
+GROUP_COMMIT = os.getenv('GROUP_COMMIT', 'false').lower() == 'true'
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv('GROUP_COMMIT_MAX_DELAY_MS', 2))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv('GROUP_COMMIT_MAX_BATCH', 64))
+
+logger = logging.getLogger(__name__)
+
+
+'''
+Group commit
+
+    with GROUP_COMMIT=true the single row writes of the API (insert(),
+    update_returning and delete_returning, see database/models.py) are not
+    committed by their request: they are handed to a committer thread, which
+    runs the writes queued while the previous batch was committing, and the
+    ones arriving within GROUP_COMMIT_MAX_DELAY_MS (up to GROUP_COMMIT_MAX_BATCH
+    writes), in one transaction, and commits them at once: a burst of writes
+    pays one commit (one flush of the write-ahead log) instead of one per write
+    every write runs in its own savepoint: a write which fails is rolled back
+    alone and its error is raised in its own request, the other writes of the
+    batch are committed (if the commit itself fails, the writes of the batch
+    are retried one by one)
+    a request waits for the commit of its write, so it answers as without
+    group commit, at most GROUP_COMMIT_MAX_DELAY_MS (plus the time of the
+    batch) later
+    the ORM writes of the instance methods update() and delete() are made in
+    the session of the request and keep their own commit
+
+    group_commit.stats() returns the batch sizes and the writes per second of
+    the committer; the batch listeners (on_batch) get every batch (see
+    api/metrics.py)
+'''
+
+
+''' PendingWrite
+a write waiting for its batch: write(session) makes the statements of the
+write and returns its result (None or False if it wrote nothing), tables are
+the tables it writes to (the table and the ones its deletes cascade to)
+'''
+class PendingWrite:
+
+    def __init__(self, tables, write):
+        self.tables = tables
+        self.write = write
+        self.result = None
+        self.error = None
+        # committed, or failed with error
+        self.finished = False
+        self.queued_at = time.perf_counter()
+        self.done = threading.Event()
+
+
+''' GroupCommitter
+commits the writes of the concurrent requests of the process in batches
+(see the module description)
+'''
+class GroupCommitter:
+
+    def __init__(self, enabled=GROUP_COMMIT, max_delay_ms=GROUP_COMMIT_MAX_DELAY_MS,
+                 max_batch=GROUP_COMMIT_MAX_BATCH):
+        self.enabled = enabled
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max(max_batch, 1)
+        self.engine = None
+        self.batch_listeners = []
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.batches = 0
+            self.writes = 0
+            self.failed = 0
+            self.retried_batches = 0
+            self.batch_size_max = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+            self.busy_since = None
+            self.busy_until = None
+
+    '''
+    init_engine(engine)
+        sets the engine the batches are written to (the primary)
+    '''
+
+    def init_engine(self, engine):
+        self.engine = engine
+
+    '''
+    on_batch(listener)
+        registers a function called with the size of every committed batch,
+        the number of its writes which failed and the seconds the batch took
+    '''
+
+    def on_batch(self, listener):
+        if listener not in self.batch_listeners:
+            self.batch_listeners.append(listener)
+        return listener
+
+    '''
+    submit(table, write, cascaded)
+        queues write(session), a write to the table (and to the cascaded
+        tables), for the next batch and waits for its commit
+        returns the result of write, or raises its error
+    '''
+
+    def submit(self, table, write, cascaded=()):
+        pending = PendingWrite((table,) + tuple(cascaded), write)
+        self._ensure_started().put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_started(self):
+        # started by the first write of the process, after the fork of the
+        # workers (a forked process does not inherit the thread)
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name='group-commit', daemon=True)
+                self._thread.start()
+            return self._queue
+
+    '''
+    stop()
+        commits the queued writes and stops the committer thread
+    '''
+
+    def stop(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+
+    def _run(self, writes):
+        while True:
+            pending = writes.get()
+            if pending is None:
+                return
+            batch = [pending]
+            deadline = time.perf_counter() + self.max_delay
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    # the writes queued during the previous commit join without waiting
+                    pending = writes.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stopping = True
+                    break
+                batch.append(pending)
+            try:
+                self._commit(batch)
+            except Exception as error:
+                logger.exception('Group commit of %d writes failed', len(batch))
+                for pending in batch:
+                    if not pending.finished:
+                        pending.result = None
+                        pending.error = error
+            finally:
+                # never leave a request waiting
+                for pending in batch:
+                    pending.done.set()
+            if stopping:
+                return
+
+    def _commit(self, batch):
+        from database.models import bump_table_versions
+
+        started = time.perf_counter()
+        session = Session(self.engine)
+        try:
+            for pending in batch:
+                pending.result = pending.error = None
+                try:
+                    with session.begin_nested():
+                        pending.result = pending.write(session)
+                except Exception as error:
+                    pending.error = error
+            # in the same order in every batch, the TableVersion rows stay locked until the commit
+            bump_table_versions([table for pending in batch if pending.error is None and pending.result
+                                 for table in pending.tables], session)
+            session.commit()
+            for pending in batch:
+                pending.finished = True
+        except Exception as error:
+            session.rollback()
+            if len(batch) == 1:
+                batch[0].result = None
+                batch[0].error = error
+                batch[0].finished = True
+            else:
+                with self._lock:
+                    self.retried_batches += 1
+                for pending in batch:
+                    self._commit([pending])
+                return
+        finally:
+            session.close()
+        self._record(batch, started)
+
+    def _record(self, batch, started):
+        finished = time.perf_counter()
+        failed = sum(1 for pending in batch if pending.error is not None)
+        waits = [started - pending.queued_at for pending in batch]
+        with self._lock:
+            self.batches += 1
+            self.writes += len(batch) - failed
+            self.failed += failed
+            self.batch_size_max = max(self.batch_size_max, len(batch))
+            self.wait_seconds_total += sum(waits)
+            self.wait_seconds_max = max([self.wait_seconds_max] + waits)
+            if self.busy_since is None:
+                self.busy_since = started
+            self.busy_until = finished
+        for listener in self.batch_listeners:
+            listener(len(batch), failed, finished - started)
+
+    '''
+    stats()
+        returns the number of batches and writes committed, the mean and
+        highest batch sizes, the time the writes waited for their batch, and
+        the writes per second from the first batch to the last one
+    '''
+
+    def stats(self):
+        with self._lock:
+            batched = self.writes + self.failed
+            elapsed = self.busy_until - self.busy_since if self.busy_since is not None else 0.0
+            return {
+                'enabled': self.enabled,
+                'max_delay_ms': self.max_delay * 1000,
+                'max_batch': self.max_batch,
+                'batches': self.batches,
+                'writes': self.writes,
+                'failed': self.failed,
+                'retried_batches': self.retried_batches,
+                'batch_size_avg': batched / self.batches if self.batches else 0.0,
+                'batch_size_max': self.batch_size_max,
+                'wait_seconds_avg': self.wait_seconds_total / batched if batched else 0.0,
+                'wait_seconds_max': self.wait_seconds_max,
+                'writes_per_second': self.writes / elapsed if elapsed > 0 else 0.0,
+            }
+
+
+group_commit = GroupCommitter()
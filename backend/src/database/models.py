@@ -1,9 +1,20 @@
 import os
-from sqlalchemy import Column, String, Integer
+import datetime
+from sqlalchemy import Column, String, Integer, event, insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
 from flask_sqlalchemy import SQLAlchemy
 import json
 from dotenv import load_dotenv
 from flask_migrate import Migrate
+from database.bulk import supports_returning
+from database.counts import row_counts
+from database.group_commit import group_commit
+from database.pool import engine_options, instrument_pool
+from database.replicas import DATABASE_REPLICA_URLS, RoutingSession, current_replica, replicas
+from database.search import ensure_search_indexes
 
 load_dotenv()
 
@@ -16,22 +27,98 @@ database_path = "postgresql://{}:{}@{}/{}".format(
     database_username, database_password, database_host + ":" + database_port, database_name
 )
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 
 '''
-setup_db(app)
+write listeners
+    functions called with the table name after a write to the table is committed
+    (e.g. to invalidate caches of the table)
+    EXAMPLE
+        on_write(response_cache.invalidate)
+'''
+write_listeners = []
+
+
+def on_write(listener):
+    if listener not in write_listeners:
+        write_listeners.append(listener)
+    return listener
+
+
+def notify_write(table):
+    for listener in write_listeners:
+        listener(table)
+
+
+'''
+ON_DELETE_CASCADE
+    the tables the database deletes rows from when a row of a table is deleted
+    (the ON DELETE CASCADE foreign keys of Catalog): a delete writes to them too
+notify_cascade(tables)
+    after the commit of a delete, notifies the write listeners of the tables
+    it cascaded to (their cached row counts are reloaded, the number of rows
+    the database deleted is not known)
+'''
+ON_DELETE_CASCADE = {'Actor': ('Catalog',), 'Movie': ('Catalog',)}
+
+
+def notify_cascade(tables):
+    for table in tables:
+        row_counts.invalidate(table)
+        notify_write(table)
+
+
+'''
+enable_foreign_keys(engine)
+    SQLite enforces the foreign keys (and their ON DELETE CASCADE) only on the
+    connections which enable them
+'''
+def enable_foreign_keys(engine):
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _enable_sqlite_foreign_keys)
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.close()
+
+'''
+setup_db(app, database_path, replica_paths)
     binds a flask application and a SQLAlchemy service
+    configures and instruments the connection pools (see database/pool.py)
+    routes the GET requests to the replicas, if any (see database/replicas.py)
+    registers the flask db (Flask-Migrate), flask import-data and flask generate-data
+    commands
+    creates the missing tables, table versions and (SQLite) search tables
 '''
 
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, replica_paths=DATABASE_REPLICA_URLS):
+    from database.bulk_import import import_data_command
+    from database.generate import generate_data_command
+
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_path)
+    app.config["SQLALCHEMY_BINDS"] = replicas.binds(replica_paths, engine_options)
     app.app_context().push()
     db.app = app
     db.init_app(app)
+    enable_foreign_keys(db.engine)
+    instrument_pool(db.engine)
+    for key in app.config["SQLALCHEMY_BINDS"]:
+        instrument_pool(db.engines[key], key)
+    replicas.init_app(app, db, app.config["SQLALCHEMY_BINDS"])
+    on_write(replicas.on_write)
+    group_commit.init_engine(db.engine)
     migrate.init_app(app, db)
-    db.create_all()
+    app.cli.add_command(import_data_command)
+    app.cli.add_command(generate_data_command)
+    # the tables are created on the primary only
+    db.create_all(bind_key=None)
+    ensure_table_versions()
+    ensure_search_indexes(db.session)
 
 ''' Movie
 a persistent movie entity, extends the base SQLAlchemy Model
@@ -39,10 +126,20 @@ a persistent movie entity, extends the base SQLAlchemy Model
 
 class Movie(db.Model):
     __tablename__ = 'Movie'
+    # the filtered/sorted list columns (see api/filtering.py), id makes the order total
+    __table_args__ = (
+        db.Index('ix_Movie_release_date', 'release_date', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String, nullable=False)
     release_date = db.Column(db.Date, nullable=False)
+    # the version of the row, its ETag (see update_returning)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # read only, the cast is written through the Catalog table
+    cast = db.relationship('Actor', secondary='Catalog', viewonly=True, order_by='Actor.id')
+    # the ORM flushes check and increment the version too
+    __mapper_args__ = {'version_id_col': version}
 
     '''
     repr()
@@ -59,6 +156,10 @@ class Movie(db.Model):
     '''
     insert()
         inserts a new model into a database
+        bumps the version of the table, increments its cached row count
+        and notifies the write listeners
+        with GROUP_COMMIT the row is inserted by the committer thread, in the
+        transaction of a batch of writes (see database/group_commit.py)
         the model must have a title and release_date
         the model must have a unique id (is automatically incremented)
         EXAMPLE
@@ -67,12 +168,20 @@ class Movie(db.Model):
     '''
 
     def insert(self):
+        if group_commit.enabled:
+            return insert_grouped(self)
         db.session.add(self)
+        bump_table_version(self.__tablename__)
         db.session.commit()
+        row_counts.adjust(self.__tablename__, 1)
+        notify_write(self.__tablename__)
 
     '''
     delete()
-        deletes a new model from a database
+        deletes a new model from a database (the database deletes its
+        catalog entries, see Catalog)
+        bumps the version of the table, decrements its cached row count
+        and notifies the write listeners
         the model must exist in the database
         EXAMPLE
             movie = Movie(id=req_id)
@@ -80,12 +189,18 @@ class Movie(db.Model):
     '''
 
     def delete(self):
+        cascaded = ON_DELETE_CASCADE[self.__tablename__]
         db.session.delete(self)
+        bump_table_versions((self.__tablename__,) + cascaded)
         db.session.commit()
+        row_counts.adjust(self.__tablename__, -1)
+        notify_write(self.__tablename__)
+        notify_cascade(cascaded)
 
     '''
     update()
         updates a new model in a database
+        bumps the version of the table and notifies the write listeners
         the model must exist in the database
         EXAMPLE
             movie = Movie.query.filter(Movie.id == id).one_or_none()
@@ -94,7 +209,9 @@ class Movie(db.Model):
     '''
 
     def update(self):
+        bump_table_version(self.__tablename__)
         db.session.commit()
+        notify_write(self.__tablename__)
 
     def __repr__(self):
         return json.dumps(self.repr())
@@ -105,11 +222,23 @@ a persistent actor entity, extends the base SQLAlchemy Model
 
 class Actor(db.Model):
     __tablename__ = 'Actor'
+    # the filtered/sorted list columns (see api/filtering.py), id makes the order total
+    __table_args__ = (
+        db.Index('ix_Actor_age', 'age', 'id'),
+        db.Index('ix_Actor_gender', 'gender', 'id'),
+        db.Index('ix_Actor_name', 'name', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     age = db.Column(db.Integer, nullable=False)
     gender = db.Column(db.String, nullable=False)
+    # the version of the row, its ETag (see update_returning)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # read only, the filmography is written through the Catalog table
+    movies = db.relationship('Movie', secondary='Catalog', viewonly=True, order_by='Movie.id')
+    # the ORM flushes check and increment the version too
+    __mapper_args__ = {'version_id_col': version}
 
     '''
     repr()
@@ -127,6 +256,10 @@ class Actor(db.Model):
     '''
     insert()
         inserts a new model into a database
+        bumps the version of the table, increments its cached row count
+        and notifies the write listeners
+        with GROUP_COMMIT the row is inserted by the committer thread, in the
+        transaction of a batch of writes (see database/group_commit.py)
         the model must have a name, age, gender
         the model must have a unique id (is automatically incremented)
         EXAMPLE
@@ -135,12 +268,20 @@ class Actor(db.Model):
     '''
 
     def insert(self):
+        if group_commit.enabled:
+            return insert_grouped(self)
         db.session.add(self)
+        bump_table_version(self.__tablename__)
         db.session.commit()
+        row_counts.adjust(self.__tablename__, 1)
+        notify_write(self.__tablename__)
 
     '''
     delete()
-        deletes a new model from a database
+        deletes a new model from a database (the database deletes its
+        catalog entries, see Catalog)
+        bumps the version of the table, decrements its cached row count
+        and notifies the write listeners
         the model must exist in the database
         EXAMPLE
             actor = Actor(id=req_id)
@@ -148,12 +289,18 @@ class Actor(db.Model):
     '''
 
     def delete(self):
+        cascaded = ON_DELETE_CASCADE[self.__tablename__]
         db.session.delete(self)
+        bump_table_versions((self.__tablename__,) + cascaded)
         db.session.commit()
+        row_counts.adjust(self.__tablename__, -1)
+        notify_write(self.__tablename__)
+        notify_cascade(cascaded)
 
     '''
     update()
         updates a new model in a database
+        bumps the version of the table and notifies the write listeners
         the model must exist in the database
         EXAMPLE
             actor = Actor.query.filter(Actor.id == id).one_or_none()
@@ -164,16 +311,313 @@ class Actor(db.Model):
     '''
 
     def update(self):
+        bump_table_version(self.__tablename__)
         db.session.commit()
+        notify_write(self.__tablename__)
 
     def __repr__(self):
         return json.dumps(self.repr())
 
+''' Catalog
+links the actors to the movies they play in
+    Movie.cast and Actor.movies read it (both columns are indexed)
+'''
+
 class Catalog(db.Model):
   __tablename__ = 'Catalog'
 
   id = db.Column(db.Integer, primary_key=True)
-  actor_id = db.Column(db.Integer, db.ForeignKey('Actor.id'), nullable=False)
-  movie_id = db.Column(db.Integer, db.ForeignKey('Movie.id'), nullable=False)
-  actor = db.relationship('Actor', backref=db.backref('catalog_actor'), cascade='all, delete')
-  movies = db.relationship('Movie', backref=db.backref('catalog_movie'), cascade='all, delete')
\ No newline at end of file
+  # the database deletes the entries of a deleted actor or movie (ON DELETE CASCADE)
+  actor_id = db.Column(db.Integer, db.ForeignKey('Actor.id', ondelete='CASCADE'), nullable=False, index=True)
+  movie_id = db.Column(db.Integer, db.ForeignKey('Movie.id', ondelete='CASCADE'), nullable=False, index=True)
+  # passive_deletes: deleting an actor or a movie does not load its entries
+  actor = db.relationship('Actor', backref=db.backref('catalog_actor', cascade='all, delete', passive_deletes=True))
+  movies = db.relationship('Movie', backref=db.backref('catalog_movie', cascade='all, delete', passive_deletes=True))
+
+''' TableVersion
+the version and last modification time of a table
+    bumped in the same transaction as every write to the table, so that
+    a client's cached copy of a resource can be validated (ETag/Last-Modified)
+    without querying the table itself
+'''
+
+class TableVersion(db.Model):
+    __tablename__ = 'TableVersion'
+
+    table_name = db.Column(db.String, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+
+VERSIONED_TABLES = ('Actor', 'Movie', 'Catalog')
+
+
+'''
+ensure_table_versions()
+    creates the missing TableVersion rows of the versioned tables
+    the workers starting together may all find them missing: the rows are
+    inserted with ON CONFLICT DO NOTHING (INSERT OR IGNORE on SQLite), so
+    the ones inserted by another worker are skipped
+'''
+
+def ensure_table_versions():
+    existing = set(row.table_name for row in TableVersion.query.all())
+    missing = [table for table in VERSIONED_TABLES if table not in existing]
+    if missing:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        rows = [{'table_name': table, 'version': 1, 'updated_at': now} for table in missing]
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            statement = postgresql_insert(TableVersion).values(rows).on_conflict_do_nothing()
+        elif dialect == 'sqlite':
+            statement = sqlite_insert(TableVersion).values(rows).on_conflict_do_nothing()
+        else:
+            statement = insert(TableVersion).values(rows)
+        db.session.execute(statement)
+        db.session.commit()
+
+
+'''
+bump_table_version(table, session)
+    increments the version of the table in the current transaction
+    of the given session (db.session by default)
+    must be called before the commit of the write, as close to it as possible
+    (the TableVersion row stays locked until the commit)
+    EXAMPLE
+        db.session.add(actor)
+        bump_table_version('Actor')
+        db.session.commit()
+'''
+
+def bump_table_version(table, session=None):
+    (session or db.session).execute(
+        TableVersion.__table__.update()
+        .where(TableVersion.table_name == table)
+        .values(version=TableVersion.version + 1,
+                updated_at=datetime.datetime.now(datetime.timezone.utc))
+    )
+
+
+'''
+bump_table_versions(tables, session)
+    bump_table_version of every table, always in the same (sorted) order, so
+    that two transactions writing to the same tables do not wait for each
+    other's TableVersion rows
+'''
+
+def bump_table_versions(tables, session=None):
+    for table in sorted(set(tables)):
+        bump_table_version(table, session)
+
+
+'''
+get_table_versions(tables, session)
+    returns {table: (version, updated_at)} for the given tables
+    read with the given session (db.session by default)
+'''
+
+def get_table_versions(tables, session=None, bind=None):
+    rows = (session or db.session).execute(
+        db.select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.table_name.in_(tables)),
+        bind_arguments={'bind': bind} if bind is not None else None
+    ).all()
+    return {row.table_name: (row.version, row.updated_at) for row in rows}
+
+
+'''
+replica_read_is_stale(tables, versions)
+    whether the current request read the tables from a replica which had not
+    applied all the writes of the primary yet (versions is what the request
+    read, see get_table_versions); False when it read the primary
+'''
+
+def replica_read_is_stale(tables, versions):
+    if current_replica() is None:
+        return False
+    return get_table_versions(tables, bind=db.engines[None]) != versions
+
+''' VersionMismatch
+raised by update_returning and delete_returning when the row exists but its
+version is not one of the expected versions (a stale If-Match)
+'''
+
+class VersionMismatch(Exception):
+    pass
+
+
+'''
+get_row_version(model, row_id, session)
+    returns the version of the row of the model with the given id, or None if
+    there is no such row, read with the given session (db.session by default)
+'''
+
+def get_row_version(model, row_id, session=None):
+    return (session or db.session).execute(
+        db.select(model.version).where(model.id == row_id)
+    ).scalar_one_or_none()
+
+
+def _instance_of(model, row_id):
+    # the instance of the row in db.session, if it was loaded
+    return db.session.identity_map.get(identity_key(model, row_id))
+
+
+def _raise_if_exists(session, model, row_id):
+    # a conditional write matched no row: a mismatch if the row exists
+    # (a plain SELECT, no row lock is taken)
+    if get_row_version(model, row_id, session) is not None:
+        raise VersionMismatch(row_id)
+
+
+'''
+run_write(table, write, row_delta, cascaded)
+    runs write(session), a function making the statements of a write to the
+    table and returning its result (None or False if it wrote nothing),
+    in its own transaction, or with GROUP_COMMIT in the transaction of a batch
+    of writes (see database/group_commit.py); then bumps the version of the
+    table (and of the cascaded tables the database also writes to, see
+    ON_DELETE_CASCADE), commits, adjusts its cached row count by row_delta and
+    notifies the write listeners (nothing is committed if the write wrote nothing)
+    returns the result of write, or raises its error
+'''
+
+def run_write(table, write, row_delta=0, cascaded=()):
+    if group_commit.enabled:
+        result = group_commit.submit(table, write, cascaded)
+    else:
+        try:
+            result = write(db.session)
+            if not result:
+                db.session.rollback()
+                return result
+            bump_table_versions((table,) + tuple(cascaded))
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            raise
+    if result:
+        if row_delta:
+            row_counts.adjust(table, row_delta)
+        notify_write(table)
+        notify_cascade(cascaded)
+    return result
+
+
+'''
+insert_grouped(entity)
+    insert() with GROUP_COMMIT: inserts the row of the new model instance
+    with a single INSERT ... RETURNING statement (INSERT then SELECT on
+    databases without RETURNING) through run_write, then adds the instance,
+    with the inserted values (id, defaults), to the session as if it had been
+    inserted by the session
+'''
+
+def insert_grouped(entity):
+    table = entity.__table__
+    values = {column.key: getattr(entity, column.key) for column in table.c
+              if getattr(entity, column.key) is not None}
+
+    def write(session):
+        if supports_returning(session):
+            return session.execute(insert(table).values(**values).returning(*table.c)).one()
+        row_id = session.execute(insert(table).values(**values)).inserted_primary_key[0]
+        return session.execute(db.select(*table.c).where(table.c.id == row_id)).one()
+
+    row = run_write(table.name, write, 1)
+    for key, value in row._mapping.items():
+        setattr(entity, key, value)
+    make_transient_to_detached(entity)
+    db.session.add(entity)
+
+
+'''
+update_returning(model, row_id, values, columns, versions)
+    updates the row of the model with the given id in a single
+    UPDATE ... RETURNING statement (UPDATE then SELECT on databases without
+    RETURNING) and increments its version, then, like update(), bumps the
+    version of the table, commits and notifies the write listeners
+    (through run_write, so with GROUP_COMMIT in the transaction of a batch)
+    versions, if given, are the versions the row is expected to have (If-Match):
+    the check is part of the UPDATE, so that a concurrent write in between is
+    impossible without locking the row first
+    returns the given columns (all the columns of the table by default) of the
+    updated row, or None if there is no row with that id (nothing is written)
+    with no values (e.g. a PATCH leaving every field unchanged) the row is only
+    read: its version and the one of the table are unchanged, nothing is
+    committed nor notified
+    raises VersionMismatch if the row is not at one of the versions
+    EXAMPLE
+        row = update_returning(Actor, actor_id, {'age': 42}, versions=[3])
+        if row is None:
+            abort(404)
+'''
+
+def update_returning(model, row_id, values, columns=None, versions=None):
+    columns = columns or tuple(model.__table__.c)
+    condition = model.id == row_id
+    if versions is not None:
+        condition = db.and_(condition, model.version.in_(versions))
+    # the instance of the row in the session, if any, is expired by the commit
+    statement = (db.update(model).where(condition).values(version=model.version + 1, **values)
+                 .execution_options(synchronize_session=False))
+
+    if not values:
+        # nothing to change: no write, the table version is not bumped
+        row = db.session.execute(db.select(*columns).where(condition)).one_or_none()
+        if row is None and versions is not None:
+            _raise_if_exists(db.session, model, row_id)
+        return row
+
+    def write(session):
+        if supports_returning(session):
+            row = session.execute(statement.returning(*columns)).one_or_none()
+        else:
+            updated = session.execute(statement).rowcount
+            row = session.execute(db.select(*columns).where(model.id == row_id)).one_or_none() \
+                if updated else None
+        if row is None and versions is not None:
+            _raise_if_exists(session, model, row_id)
+        return row
+
+    row = run_write(model.__tablename__, write)
+    # with GROUP_COMMIT the commit was not the one of db.session
+    if group_commit.enabled and _instance_of(model, row_id) is not None:
+        db.session.expire(_instance_of(model, row_id))
+    return row
+
+
+'''
+delete_returning(model, row_id, versions)
+    deletes the row of the model with the given id in a single
+    DELETE ... RETURNING statement (the ORM relationships are not loaded, the
+    database deletes the catalog entries of the row, whatever their number),
+    then, like delete(), bumps the version of the table, commits, decrements
+    its cached row count and notifies the write listeners (through run_write)
+    versions, if given, are the versions the row is expected to have (If-Match),
+    checked by the DELETE itself
+    returns True, or False if there is no row with that id (nothing is written)
+    raises VersionMismatch if the row is not at one of the versions
+'''
+
+def delete_returning(model, row_id, versions=None):
+    condition = model.id == row_id
+    if versions is not None:
+        condition = db.and_(condition, model.version.in_(versions))
+    # 'fetch' adds RETURNING id (a SELECT first on databases without RETURNING)
+    # and removes the instance of the row from the session, as session.delete()
+    statement = (db.delete(model).where(condition)
+                 .execution_options(synchronize_session='fetch'))
+
+    def write(session):
+        if session.execute(statement).rowcount > 0:
+            return True
+        if versions is not None:
+            _raise_if_exists(session, model, row_id)
+        return False
+
+    deleted = run_write(model.__tablename__, write, -1, ON_DELETE_CASCADE[model.__tablename__])
+    # with GROUP_COMMIT the DELETE was not made by db.session
+    if deleted and group_commit.enabled and _instance_of(model, row_id) is not None:
+        db.session.expunge(_instance_of(model, row_id))
+    return deleted
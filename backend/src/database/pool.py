@@ -0,0 +1,322 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+
+'''
+Connection pooling
+
+    the engines of the app keep a pool of database connections per process,
+    configured with
+    DATABASE_POOL_SIZE connections kept open (5)
+    DATABASE_MAX_OVERFLOW connections opened beyond the pool size under load (10)
+    DATABASE_POOL_TIMEOUT seconds a request waits for a connection before
+        failing (30)
+    DATABASE_POOL_RECYCLE seconds after which a connection is replaced, e.g. to
+        stay below a server or load balancer idle timeout (-1, never)
+    DATABASE_POOL_PRE_PING checks a connection before handing it out, so a
+        connection closed by the server is replaced instead of failing (false)
+    DATABASE_POOLER none, or pgbouncer when the database url points to a
+        PgBouncer in transaction pooling mode: PgBouncer holds the pool, the
+        app opens a connection per request (NullPool), and the asyncpg driver
+        of the ASGI app names its prepared statements uniquely (see
+        async_engine_options); psycopg2 does not use server-side prepared
+        statements
+    DATABASE_POOL_WAIT_WARNING_MS logs a warning when getting a connection
+        takes longer than this (disabled by default)
+
+    the pools are instrumented (see PoolStats): pool_stats() returns, for each
+    engine, the connection wait times, checked out connections and overflow,
+    and the pool listeners (on_pool) are told of them, e.g. to export them on
+    /metrics (see api/metrics.py)
+'''
+
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 5))
+DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW', 10))
+DATABASE_POOL_TIMEOUT = float(os.getenv('DATABASE_POOL_TIMEOUT', 30))
+DATABASE_POOL_RECYCLE = int(os.getenv('DATABASE_POOL_RECYCLE', -1))
+DATABASE_POOL_PRE_PING = os.getenv('DATABASE_POOL_PRE_PING', 'false').lower() == 'true'
+DATABASE_POOL_WAIT_WARNING_MS = float(os.getenv('DATABASE_POOL_WAIT_WARNING_MS', 0))
+POOLERS = ('none', 'pgbouncer')
+DATABASE_POOLER = os.getenv('DATABASE_POOLER', 'none').lower()
+
+logger = logging.getLogger(__name__)
+
+'''
+pool listeners
+    functions called with (stats, pool_event, seconds) by the instrumented
+    pools, stats the PoolStats of the pool and pool_event one of
+    'wait': a connection was handed out after seconds
+    'timeout': no connection was available within the pool timeout
+    'checkout', 'return': a connection was handed out, or returned to the pool
+        (stats.checked_out and stats.overflow() are up to date)
+'''
+pool_listeners = []
+
+
+def on_pool(listener):
+    if listener not in pool_listeners:
+        pool_listeners.append(listener)
+    return listener
+
+
+def notify_pool(stats, pool_event, seconds=None):
+    for listener in pool_listeners:
+        listener(stats, pool_event, seconds)
+
+
+''' PoolStats
+the statistics of the connection pool of an engine
+    wait: time spent getting a connection from the pool, including opening a
+    new one (with NullPool, only opening one)
+    checked_out: connections handed out and not returned yet
+    overflow: connections open beyond the pool size (QueuePool only)
+    the *_max values are the highest seen since the last reset()
+'''
+class PoolStats:
+
+    def __init__(self, name):
+        self.name = name
+        self.engine = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checked_out = 0
+            self.checked_out_max = 0
+            self.overflow_max = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+            self.timeouts = 0
+            self.invalidations = 0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        notify_pool(self, 'wait', seconds)
+        if DATABASE_POOL_WAIT_WARNING_MS and seconds * 1000 > DATABASE_POOL_WAIT_WARNING_MS:
+            logger.warning('Waited %.1f ms for a connection of the %s pool: %s',
+                           seconds * 1000, self.name, self.engine.pool.status())
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+        notify_pool(self, 'timeout')
+
+    def record_return(self):
+        notify_pool(self, 'return')
+
+    def overflow(self):
+        pool = self.engine.pool
+        return max(pool.overflow(), 0) if isinstance(pool, QueuePool) else 0
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.checked_out_max = max(self.checked_out_max, self.checked_out)
+            self.overflow_max = max(self.overflow_max, self.overflow())
+        notify_pool(self, 'checkout')
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+        # a timed pool tells once the connection is back in the pool (overflow)
+        if not isinstance(self.engine.pool, TimedPool):
+            self.record_return()
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    '''
+    watch(engine)
+        collects the statistics of the pool of the engine
+        (the pool must be one of the timed pools below to record wait times)
+    '''
+
+    def watch(self, engine):
+        # the sync engine of an AsyncEngine holds the pool and the events
+        engine = getattr(engine, 'sync_engine', engine)
+        self.engine = engine
+        engine.pool.stats = self
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+        return self
+
+    '''
+    stats()
+        returns the pool configuration, the connections currently checked out
+        and in overflow, and the wait time counters
+    '''
+
+    def stats(self):
+        pool = self.engine.pool
+        with self._lock:
+            return {
+                'pool': type(pool).__name__,
+                'size': pool.size() if isinstance(pool, QueuePool) else 0,
+                'checked_out': self.checked_out,
+                'checked_out_max': self.checked_out_max,
+                'overflow': self.overflow(),
+                'overflow_max': self.overflow_max,
+                'checkouts': self.checkouts,
+                'wait_seconds_total': self.wait_seconds_total,
+                'wait_seconds_avg': self.wait_seconds_total / self.checkouts if self.checkouts else 0.0,
+                'wait_seconds_max': self.wait_seconds_max,
+                'timeouts': self.timeouts,
+                'invalidations': self.invalidations,
+            }
+
+
+''' TimedPool
+a pool mixin recording the time spent getting a connection (in pool.stats),
+and the returns of the connections
+'''
+class TimedPool:
+
+    stats = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.record_timeout()
+            raise
+        if self.stats is not None:
+            self.stats.record_wait(time.perf_counter() - started)
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        if self.stats is not None:
+            self.stats.record_return()
+
+    def recreate(self):
+        # engine.dispose() replaces the pool
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(TimedPool, QueuePool):
+    pass
+
+
+class TimedNullPool(TimedPool, NullPool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+'''
+the statistics of the instrumented engines, by name ('primary', 'asgi')
+'''
+pools = {}
+
+
+'''
+    instrument_pool(engine, name) method
+    collects the statistics of the pool of the engine under the name
+    returns its PoolStats
+'''
+def instrument_pool(engine, name='primary'):
+    pools[name] = PoolStats(name).watch(engine)
+    return pools[name]
+
+
+'''
+    pool_stats() method
+    returns the statistics (see PoolStats.stats) of every instrumented engine
+'''
+def pool_stats():
+    return {name: stats.stats() for name, stats in pools.items()}
+
+
+def _pooler(pooler):
+    pooler = (pooler or DATABASE_POOLER).lower()
+    if pooler not in POOLERS:
+        raise ValueError('Unknown DATABASE_POOLER: {}'.format(pooler))
+    return pooler
+
+
+'''
+    engine_options(database_url, pooler) method
+    returns the options of the engine of the Flask app (SQLALCHEMY_ENGINE_OPTIONS)
+    for the DATABASE_POOL_* variables and the pooler (DATABASE_POOLER by default)
+    SQLite keeps the pool chosen by Flask-SQLAlchemy
+'''
+def engine_options(database_url, pooler=None):
+    if make_url(database_url).get_backend_name() == 'sqlite':
+        return {}
+    if _pooler(pooler) == 'pgbouncer':
+        return {'poolclass': TimedNullPool}
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': DATABASE_POOL_SIZE,
+        'max_overflow': DATABASE_MAX_OVERFLOW,
+        'pool_timeout': DATABASE_POOL_TIMEOUT,
+        'pool_recycle': DATABASE_POOL_RECYCLE,
+        'pool_pre_ping': DATABASE_POOL_PRE_PING,
+    }
+
+
+'''
+_unique_prepared_statement_connection()
+    returns an asyncpg connection class naming its prepared statements with a
+    uuid: asyncpg numbers them per process, so two app processes sharing a
+    PgBouncer server connection would use the same names
+'''
+def _unique_prepared_statement_connection():
+    import asyncpg
+
+    class UniquePreparedStatementConnection(asyncpg.Connection):
+
+        def _get_unique_id(self, prefix):
+            return '__asyncpg_{}_{}__'.format(prefix, uuid.uuid4().hex)
+
+    return UniquePreparedStatementConnection
+
+
+'''
+    async_engine_options(database_url, pool_size, max_overflow, pooler) method
+    returns the options of the async engine of the ASGI app
+    behind PgBouncer the pool is NullPool and the prepared statements are not
+    cached and uniquely named (the server connection may change between
+    transactions)
+'''
+def async_engine_options(database_url, pool_size, max_overflow, pooler=None):
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite':
+        return {}
+    if _pooler(pooler) == 'pgbouncer':
+        options = {'poolclass': TimedNullPool}
+        if url.get_driver_name() == 'asyncpg':
+            options['connect_args'] = {
+                'statement_cache_size': 0,
+                'prepared_statement_cache_size': 0,
+                'connection_class': _unique_prepared_statement_connection(),
+            }
+        return options
+    return {
+        'poolclass': TimedAsyncAdaptedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': DATABASE_POOL_TIMEOUT,
+        'pool_recycle': DATABASE_POOL_RECYCLE,
+        'pool_pre_ping': DATABASE_POOL_PRE_PING,
+    }
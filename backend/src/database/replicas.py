@@ -0,0 +1,249 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+
+'''
+Read replicas
+
+    setup_db(app, database_path, replica_paths) adds the replicas of the
+    database (DATABASE_REPLICA_URLS, comma separated urls, by default) as
+    binds of the Flask app; the GET (and HEAD) requests then read from a
+    replica, chosen in turn, and the other requests use the primary
+    - queries flushing changes, and the requests writing, always use the primary
+    - read-your-writes: the requests of a client that wrote read from the
+      primary for DATABASE_REPLICA_STICKY_SECONDS (5) after the write; the
+      client is the subject (sub) of its token, remembered by the process
+      (the database is chosen at the first query of the request, after
+      requires_auth), and a read_primary_until cookie is also set for the
+      clients which keep cookies (and are served by several processes)
+    - the lag of each replica is measured every DATABASE_REPLICA_LAG_CHECK_INTERVAL
+      seconds (5); a replica more than DATABASE_REPLICA_MAX_LAG seconds (10)
+      behind, or not reachable, is skipped until the next check, and the
+      primary is read when no replica is usable
+    - the replicas are connected to with a DATABASE_REPLICA_CONNECT_TIMEOUT (2)
+      seconds timeout, so the request measuring the lag of an unreachable
+      replica does not wait for the TCP connect timeout of the system
+'''
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+DATABASE_REPLICA_MAX_LAG = float(os.getenv('DATABASE_REPLICA_MAX_LAG', 10))
+DATABASE_REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DATABASE_REPLICA_LAG_CHECK_INTERVAL', 5))
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', 5))
+DATABASE_REPLICA_CONNECT_TIMEOUT = int(os.getenv('DATABASE_REPLICA_CONNECT_TIMEOUT', 2))
+STICKY_COOKIE = 'read_primary_until'
+READ_METHODS = ('GET', 'HEAD')
+
+# seconds the replica is behind the primary, 0 if it replayed all it received
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+logger = logging.getLogger(__name__)
+
+
+''' ReplicaRouter
+chooses the database (bind key) read by the current request
+    None is the primary, the replicas are the binds replica_0, replica_1, ...
+'''
+class ReplicaRouter:
+
+    def __init__(self, max_lag=DATABASE_REPLICA_MAX_LAG,
+                 lag_check_interval=DATABASE_REPLICA_LAG_CHECK_INTERVAL,
+                 sticky_seconds=DATABASE_REPLICA_STICKY_SECONDS):
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.sticky_seconds = sticky_seconds
+        self.db = None
+        self.keys = []
+        self._lags = {}
+        # token subject: the time until which its requests read the primary
+        self._writers = {}
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    '''
+    binds(replica_paths, engine_options)
+        returns the SQLALCHEMY_BINDS of the replicas, engine_options(path)
+        gives the options of the engine of each replica (with the connect
+        timeout of the replicas on Postgres)
+    '''
+
+    @staticmethod
+    def binds(replica_paths, engine_options):
+        binds = {}
+        for index, path in enumerate(replica_paths):
+            options = dict(engine_options(path), url=path)
+            if make_url(path).get_backend_name() == 'postgresql':
+                options['connect_args'] = dict(options.get('connect_args', {}),
+                                               connect_timeout=DATABASE_REPLICA_CONNECT_TIMEOUT)
+            binds['replica_{}'.format(index)] = options
+        return binds
+
+    '''
+    init_app(app, db, keys)
+        routes the GET requests of the app to the replica binds (keys)
+    '''
+
+    def init_app(self, app, db, keys):
+        self.db = db
+        self.keys = list(keys)
+        with self._lock:
+            self._lags = {}
+            self._writers = {}
+        if self.keys:
+            app.before_request(self.before_request)
+            app.after_request(self.after_request)
+
+    def before_request(self):
+        # g may outlive the request (setup_db pushes an app context)
+        g.database_wrote = False
+        g.token_subject = None
+        # chosen by current_replica() at the first query, once the token is checked
+        g.database_replica = None
+        g.database_replica_chosen = False
+
+    def after_request(self, response):
+        if g.get('database_wrote') and self.sticky_seconds > 0:
+            response.set_cookie(STICKY_COOKIE, str(int(time.time()) + self.sticky_seconds),
+                                max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+            if g.get('token_subject') is not None:
+                self.remember_writer(g.token_subject)
+        return response
+
+    '''
+    remember_writer(subject)
+        the requests of the token subject read from the primary for
+        sticky_seconds
+    '''
+
+    def remember_writer(self, subject):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._writers) >= 1024:
+                # the expired subjects
+                self._writers = {key: until for key, until in self._writers.items() if until > now}
+            self._writers[subject] = now + self.sticky_seconds
+
+    '''
+    on_write(table)
+        write listener (see database/models.py), marks the request as writing
+    '''
+
+    def on_write(self, table):
+        if has_request_context():
+            g.database_wrote = True
+
+    def is_sticky(self):
+        subject = g.get('token_subject')
+        if subject is not None and self._writers.get(subject, 0) > time.monotonic():
+            return True
+        try:
+            return int(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    '''
+    choose()
+        returns the bind key of the replica read by the current request,
+        or None to read the primary
+    '''
+
+    def choose(self):
+        if request.method not in READ_METHODS or self.is_sticky():
+            return None
+        usable = [key for key in self.keys if self.is_usable(key)]
+        if not usable:
+            return None
+        return usable[next(self._turn) % len(usable)]
+
+    '''
+    is_usable(key)
+        whether the replica was reachable and at most max_lag seconds behind
+        at its last lag check (made now if it is older than lag_check_interval)
+    '''
+
+    def is_usable(self, key):
+        lag = self.lag(key)
+        return lag is not None and lag <= self.max_lag
+
+    def lag(self, key):
+        now = time.monotonic()
+        with self._lock:
+            lag, checked_at = self._lags.get(key, (None, None))
+            if checked_at is not None and now - checked_at < self.lag_check_interval:
+                return lag
+            # the other requests use the last lag while it is measured
+            self._lags[key] = (lag, now)
+        lag = self.measure_lag(key)
+        with self._lock:
+            self._lags[key] = (lag, time.monotonic())
+        return lag
+
+    '''
+    measure_lag(key)
+        returns the seconds the replica is behind the primary (0 for a
+        database that is not a Postgres standby), None if it is not reachable
+    '''
+
+    def measure_lag(self, key):
+        engine = self.db.engines[key]
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name != 'postgresql':
+                    return 0.0
+                lag = connection.execute(POSTGRES_LAG_QUERY).scalar()
+                return None if lag is None else float(lag)
+        except Exception as ex:
+            logger.warning('Replica %s is not reachable: %s', key, ex)
+            return None
+
+    '''
+    stats()
+        returns the last measured lag of each replica (None if not reachable)
+    '''
+
+    def stats(self):
+        with self._lock:
+            return {key: self._lags.get(key, (None, None))[0] for key in self.keys}
+
+
+replicas = ReplicaRouter()
+
+
+'''
+    current_replica() method
+    returns the bind key of the replica read by the current request, or None
+    chosen at the first call of the request (see ReplicaRouter.choose)
+'''
+def current_replica():
+    if not has_app_context():
+        return None
+    if g.get('database_replica_chosen', True) is False and has_request_context():
+        g.database_replica_chosen = True
+        g.database_replica = replicas.choose()
+    return g.get('database_replica')
+
+
+''' RoutingSession
+the session of db, reads from the replica chosen for the request
+    flushes and INSERT/UPDATE/DELETE statements use the primary,
+    an explicit bind is used as is
+'''
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            key = current_replica()
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
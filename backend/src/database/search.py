@@ -0,0 +1,141 @@
+import os
+import re
+
+from sqlalchemy import Float, cast, column as table_column, func, literal, literal_column, table, text
+
+
+SEARCH_MAX_QUERY_LENGTH = int(os.getenv('SEARCH_MAX_QUERY_LENGTH', 200))
+
+'''
+the searchable column of each table
+'''
+SEARCH_COLUMNS = {
+    'Actor': 'name',
+    'Movie': 'title',
+}
+
+
+'''
+Search
+
+    GET /actors/search?q= and GET /movies/search?q= return the actors (movies)
+    whose name (title) contains words starting with every word of q, e.g.
+    q=godf par finds 'The Godfather Part II', ranked by relevance
+    - on Postgres the column is matched as a tsvector ('simple' configuration,
+      no stemming) served by a GIN expression index (migration 5b8e0c9a7f31)
+    - on SQLite the column is matched through an FTS5 shadow table kept in
+      sync with the table by triggers (see ensure_search_indexes)
+    both are inverted indexes, so a search costs milliseconds on millions of rows
+'''
+
+
+def _words(q):
+    return re.findall(r'\w+', q.lower())
+
+
+def _tsvector(column):
+    # must be the expression of the GIN index for the index to be used
+    return func.to_tsvector(literal_column("'simple'"), column)
+
+
+'''
+    tsquery_terms(q) / fts5_terms(q) methods
+    return the tsquery (Postgres) / FTS5 query (SQLite) matching the words of q
+    as prefixes, or None if q has no words
+'''
+def tsquery_terms(q):
+    words = _words(q)
+    if not words:
+        return None
+    return ' & '.join(word + ':*' for word in words)
+
+
+def fts5_terms(q):
+    words = _words(q)
+    if not words:
+        return None
+    return ' AND '.join('"{}"*'.format(word) for word in words)
+
+
+def _selected(model, score, columns):
+    if columns is None:
+        return [model, score, model.id]
+    return list(columns) + [score]
+
+
+'''
+    search_query(session, model, q, columns) method
+    @INPUTS
+        session: the database session
+        model: the model class to search, e.g. Actor
+        q: the search text
+        columns: the columns to select instead of the entity (including the id)
+
+    returns (query, sort_keys) where the rows of the query are (entity, score, id)
+    (or (*columns, score)) and sort_keys ranks them by descending score, then by id
+    (see api/pagination.py), or (None, None) if q has no words
+'''
+def search_query(session, model, q, columns=None):
+    table_name = model.__tablename__
+    column = getattr(model, SEARCH_COLUMNS[table_name])
+    if session.get_bind().dialect.name == 'postgresql':
+        terms = tsquery_terms(q)
+        if terms is None:
+            return None, None
+        tsquery = func.to_tsquery(literal_column("'simple'"), literal(terms))
+        # ts_rank is a real, which does not survive the trip through the cursor
+        score = cast(func.ts_rank(_tsvector(column), tsquery), Float(precision=53)).label('score')
+        query = session.query(*_selected(model, score, columns)).filter(_tsvector(column).op('@@')(tsquery))
+    else:
+        terms = fts5_terms(q)
+        if terms is None:
+            return None, None
+        search_table = table(table_name + '_search', table_column('rowid'), table_column('rank'))
+        # the FTS5 rank (bm25) is lower for better matches
+        score = (-search_table.c.rank).label('score')
+        query = (session.query(*_selected(model, score, columns))
+                 .join(search_table, search_table.c.rowid == model.id)
+                 .filter(literal_column('"{}_search"'.format(table_name)).op('MATCH')(terms)))
+    return query, [(score, True), (model.id, False)]
+
+
+FTS5_STATEMENTS = [
+    'CREATE VIRTUAL TABLE "{0}_search" USING fts5({1}, content=\'{0}\', content_rowid=\'id\')',
+    'CREATE TRIGGER "{0}_search_insert" AFTER INSERT ON "{0}" BEGIN '
+    'INSERT INTO "{0}_search" (rowid, {1}) VALUES (new.id, new.{1}); END',
+    'CREATE TRIGGER "{0}_search_delete" AFTER DELETE ON "{0}" BEGIN '
+    'INSERT INTO "{0}_search" ("{0}_search", rowid, {1}) VALUES (\'delete\', old.id, old.{1}); END',
+    'CREATE TRIGGER "{0}_search_update" AFTER UPDATE OF {1} ON "{0}" BEGIN '
+    'INSERT INTO "{0}_search" ("{0}_search", rowid, {1}) VALUES (\'delete\', old.id, old.{1}); '
+    'INSERT INTO "{0}_search" (rowid, {1}) VALUES (new.id, new.{1}); END',
+    # index the rows already in the table
+    'INSERT INTO "{0}_search" ("{0}_search") VALUES (\'rebuild\')',
+]
+
+
+'''
+ensure_search_indexes(session)
+    creates the FTS5 shadow table of every searchable table missing from a
+    SQLite database, its triggers, and the index of the rows already in the
+    table (the tables are created by db.create_all(), not by the migrations,
+    in tests)
+    the GIN indexes of Postgres are left to the migrations (5b8e0c9a7f31):
+    building one at startup would block the writes to the table, in every
+    worker starting
+'''
+def ensure_search_indexes(session):
+    if session.get_bind().dialect.name != 'sqlite':
+        return
+    for table, column in SEARCH_COLUMNS.items():
+        exists = session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': table + '_search'}).first()
+        if exists:
+            continue
+        for statement in _fts5_statements(table, column):
+            session.execute(text(statement))
+    session.commit()
+
+
+def _fts5_statements(table, column):
+    return [statement.format(table, column) for statement in FTS5_STATEMENTS]
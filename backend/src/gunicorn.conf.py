@@ -0,0 +1,25 @@
+import glob
+import os
+
+
+'''
+gunicorn settings, passed explicitly (gunicorn 19 does not read it by itself)
+    gunicorn -c gunicorn.conf.py --workers 4 'api:create_app()'
+
+    with PROMETHEUS_MULTIPROC_DIR set (see api/metrics.py), the metrics of the
+    previous run are removed on start and the ones of a dead worker are marked
+'''
+
+
+def on_starting(server):
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,35 @@
+"""Add TableVersion
+
+Revision ID: 41e6d2ae687d
+Revises: 6a7a572d3387
+Create Date: 2026-10-16 10:12:31.482113
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '41e6d2ae687d'
+down_revision = '6a7a572d3387'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_version = op.create_table('TableVersion',
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.bulk_insert(table_version, [
+        {'table_name': table_name, 'version': 1, 'updated_at': datetime.datetime.now(datetime.timezone.utc)}
+        for table_name in ('Actor', 'Movie', 'Catalog')
+    ])
+
+
+def downgrade():
+    op.drop_table('TableVersion')
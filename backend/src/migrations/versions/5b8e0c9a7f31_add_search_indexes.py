@@ -0,0 +1,40 @@
+"""Add search indexes
+
+Revision ID: 5b8e0c9a7f31
+Revises: 9c3f1b7d2e54
+Create Date: 2026-10-16 16:40:03.527930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e0c9a7f31'
+down_revision = '9c3f1b7d2e54'
+branch_labels = None
+depends_on = None
+
+
+# (index, table, column) the GIN indexes of the words of the searched columns (see database/search.py)
+INDEXES = [
+    ('ix_Actor_name_search', 'Actor', 'name'),
+    ('ix_Movie_title_search', 'Movie', 'title'),
+]
+
+
+# built CONCURRENTLY, outside of the transaction of the migration, so that
+# the writes to the table are not blocked while the index is built (see
+# d2a4f6c81b07); a failed build leaves an INVALID index to drop first
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(name, table, [sa.text("to_tsvector('simple', {})".format(column))],
+                            unique=False, postgresql_using='gin',
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, column in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
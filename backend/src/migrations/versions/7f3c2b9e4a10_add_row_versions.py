@@ -0,0 +1,31 @@
+"""Add Actor and Movie row versions
+
+Revision ID: 7f3c2b9e4a10
+Revises: d2a4f6c81b07
+Create Date: 2026-10-16 21:03:12.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f3c2b9e4a10'
+down_revision = 'd2a4f6c81b07'
+branch_labels = None
+depends_on = None
+
+# the tables whose rows are versioned (ETag/If-Match, see api/conditional.py)
+TABLES = ['Actor', 'Movie']
+
+
+# with a constant default, Postgres (11+) adds the column without rewriting
+# the table: the existing rows are at version 1
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_column(table, 'version')
@@ -0,0 +1,26 @@
+"""Add Catalog indexes
+
+Revision ID: 9c3f1b7d2e54
+Revises: 41e6d2ae687d
+Create Date: 2026-10-16 14:05:12.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3f1b7d2e54'
+down_revision = '41e6d2ae687d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_Catalog_actor_id'), 'Catalog', ['actor_id'], unique=False)
+    op.create_index(op.f('ix_Catalog_movie_id'), 'Catalog', ['movie_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Catalog_movie_id'), table_name='Catalog')
+    op.drop_index(op.f('ix_Catalog_actor_id'), table_name='Catalog')
@@ -0,0 +1,34 @@
+"""Delete the Catalog entries of a deleted Actor or Movie (ON DELETE CASCADE)
+
+Revision ID: b8d4e1f0a6c2
+Revises: 7f3c2b9e4a10
+Create Date: 2026-10-17 10:12:40.274913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d4e1f0a6c2'
+down_revision = '7f3c2b9e4a10'
+branch_labels = None
+depends_on = None
+
+# the foreign keys of the Catalog (named by Postgres in the initial migration)
+FOREIGN_KEYS = [
+    ('Catalog_actor_id_fkey', 'Actor', 'actor_id'),
+    ('Catalog_movie_id_fkey', 'Movie', 'movie_id'),
+]
+
+
+def upgrade():
+    for name, table, column in FOREIGN_KEYS:
+        op.drop_constraint(name, 'Catalog', type_='foreignkey')
+        op.create_foreign_key(name, 'Catalog', table, [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    for name, table, column in reversed(FOREIGN_KEYS):
+        op.drop_constraint(name, 'Catalog', type_='foreignkey')
+        op.create_foreign_key(name, 'Catalog', table, [column], ['id'])
@@ -0,0 +1,36 @@
+"""Add the Actor gender filter index
+
+Revision ID: c4a7e2d9f1b3
+Revises: b8d4e1f0a6c2
+Create Date: 2026-10-17 14:05:12.618340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e2d9f1b3'
+down_revision = 'b8d4e1f0a6c2'
+branch_labels = None
+depends_on = None
+
+# (index, table, columns) of the filtered list columns added after
+# d2a4f6c81b07 (see api/filtering.py)
+INDEXES = [
+    ('ix_Actor_gender', 'Actor', ['gender', 'id']),
+]
+
+
+# built concurrently, as in d2a4f6c81b07
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,40 @@
+"""Add list filter and sort indexes
+
+Revision ID: d2a4f6c81b07
+Revises: 5b8e0c9a7f31
+Create Date: 2026-10-16 18:22:47.904215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a4f6c81b07'
+down_revision = '5b8e0c9a7f31'
+branch_labels = None
+depends_on = None
+
+# (index, table, columns) of the filtered/sorted list columns (see api/filtering.py)
+INDEXES = [
+    ('ix_Actor_age', 'Actor', ['age', 'id']),
+    ('ix_Actor_name', 'Actor', ['name', 'id']),
+    ('ix_Movie_release_date', 'Movie', ['release_date', 'id']),
+]
+
+
+# CREATE INDEX CONCURRENTLY does not block the writes to the table while the
+# index is built, but can not run inside a transaction
+# if a build fails it leaves an INVALID index, which must be dropped before
+# running the migration again
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
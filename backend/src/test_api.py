@@ -1,4 +1,5 @@
 import os
+import tempfile
 import unittest
 import json
 from flask_sqlalchemy import SQLAlchemy
@@ -8,7 +9,8 @@ import requests
 
 
 from api import create_app
-from database.models import setup_db, Actor, Movie
+from database.models import setup_db, db, Actor, Movie, Catalog
+from database.bulk_import import import_data_command
 
 
 load_dotenv()
@@ -101,6 +103,222 @@ class CastingAgencyTestCase(unittest.TestCase):
         # Clean up
         actor.delete()
 
+    def test_get_actors_paginated(self):
+        actors = [Actor(name='John Doe ' + str(i), age=27, gender='male') for i in range(3)]
+        for actor in actors:
+            actor.insert()
+        res = self.client().get("/actors?limit=2", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(len(data["actors"]), 2)
+        self.assertTrue(data["next_cursor"])
+        res = self.client().get("/actors?limit=2&after=" + data["next_cursor"], headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        next_data = json.loads(res.data)
+        self.assertTrue(next_data["actors"][0]["id"] > data["actors"][-1]["id"])
+        # Clean up
+        for actor in actors:
+            actor.delete()
+
+    def test_get_actors_filtered_sorted(self):
+        actors = [Actor(name='John Doe ' + str(i), age=25 + i, gender='F') for i in range(3)]
+        for actor in actors:
+            actor.insert()
+        res = self.client().get("/actors?filter=age:gte:25&filter=age:lte:27&filter=gender:eq:F&sort=-age&limit=500", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        ages = [actor_repr["age"] for actor_repr in data["actors"]]
+        self.assertEqual(ages, sorted(ages, reverse=True))
+        self.assertTrue(all(25 <= age <= 27 for age in ages))
+        self.assertEqual(data["total_actors"], len(data["actors"]))
+        for query in ["filter=age:like:25", "filter=unknown:eq:1", "filter=age:eq:x", "sort=gender"]:
+            res = self.client().get("/actors?" + query, headers=self.authorization_header)
+            self.assertEqual(res.status_code, 400)
+        # Clean up
+        for actor in actors:
+            actor.delete()
+
+    def test_get_actors_asgi(self):
+        from starlette.testclient import TestClient
+        from api.asgi import create_asgi_app
+
+        actor = Actor(
+            name='John Doe',
+            age=27,
+            gender='male')
+        actor.insert()
+        headers = dict(self.authorization_header, accept='*/*')
+        with TestClient(create_asgi_app(self.app)) as asgi_client:
+            for path in ["/actors?limit=2&sort=-age", "/actors/" + str(actor.id), "/actors/999999",
+                         "/movies?include=cast", "/actors?filter=age:like:25"]:
+                res = self.client().get(path, headers=headers)
+                asgi_res = asgi_client.get(path, headers=headers)
+                self.assertEqual(asgi_res.status_code, res.status_code)
+                self.assertEqual(asgi_res.content, res.data)
+                self.assertEqual(asgi_res.headers.get('ETag'), res.headers.get('ETag'))
+            etag = asgi_client.get("/actors/" + str(actor.id), headers=headers).headers['ETag']
+            asgi_res = asgi_client.get("/actors/" + str(actor.id), headers=dict(headers, **{'if-none-match': etag}))
+            self.assertEqual(asgi_res.status_code, 304)
+            asgi_res = asgi_client.get("/actors")
+            self.assertEqual(asgi_res.status_code, 401)
+            # routes that are not native are served by the Flask app
+            asgi_res = asgi_client.get("/actors/" + str(actor.id) + "/movies", headers=headers)
+            self.assertEqual(asgi_res.status_code, 200)
+        # Clean up
+        actor.delete()
+
+    def test_get_actors_asgi_estimated_filtered_count(self):
+        from starlette.testclient import TestClient
+        from api.asgi import create_asgi_app
+
+        actor = Actor(
+            name='John Doe',
+            age=37,
+            gender='male')
+        actor.insert()
+        with TestClient(create_asgi_app(self.app)) as asgi_client:
+            # the filter values are bound by asyncpg, the estimates are the ones of the Flask app
+            for path in ["/actors?filter=age:gte:30&count=estimate",
+                         "/actors?filter=name:eq:John%20Doe&count=estimate",
+                         "/actors?filter=gender:in:male|female&filter=age:gte:30&count=estimate",
+                         "/movies?filter=release_date:gte:01-01-2000&count=estimate"]:
+                res = self.client().get(path, headers=self.authorization_header)
+                asgi_res = asgi_client.get(path, headers=self.authorization_header)
+                self.assertEqual(asgi_res.status_code, res.status_code)
+                if res.status_code == 200:
+                    key = 'total_movies' if path.startswith('/movies') else 'total_actors'
+                    self.assertTrue(type(asgi_res.json()[key]) is int)
+                    self.assertEqual(asgi_res.json()[key], json.loads(res.data)[key])
+        # Clean up
+        actor.delete()
+
+    def test_get_actors_asgi_cached(self):
+        from starlette.testclient import TestClient
+        from api.asgi import create_asgi_app
+        from api.response_cache import MemoryBackend, response_cache
+
+        actor = Actor(
+            name='John Doe',
+            age=27,
+            gender='male')
+        actor.insert()
+        headers = dict(self.authorization_header, accept='*/*')
+        backend = response_cache.backend
+        response_cache.backend = MemoryBackend()
+        try:
+            with TestClient(create_asgi_app(self.app)) as asgi_client:
+                path = "/actors/" + str(actor.id)
+                asgi_res = asgi_client.get(path, headers=headers)
+                # the native routes and the Flask routes share the cached responses
+                res = self.client().get(path, headers=headers)
+                self.assertEqual(res.data, asgi_res.content)
+                self.assertEqual(response_cache.stats()["hits"], 1)
+                asgi_res = asgi_client.get(path, headers=dict(headers, **{'if-none-match': res.headers['ETag']}))
+                self.assertEqual(asgi_res.status_code, 304)
+                self.assertEqual(response_cache.stats()["hits"], 2)
+        finally:
+            response_cache.backend = backend
+            response_cache.clear()
+        # Clean up
+        actor.delete()
+
+    def test_get_actors_stream(self):
+        actor = Actor(
+            name='John Doe',
+            age=27,
+            gender='male')
+        actor.insert()
+        res = self.client().get("/actors?stream=true", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["total_actors"], len(data["actors"]))
+        self.assertIn(actor.id, [a["id"] for a in data["actors"]])
+        headers = dict(self.authorization_header, Accept='application/x-ndjson')
+        res = self.client().get("/actors", headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in res.data.decode().splitlines()]
+        self.assertEqual(lines, data["actors"])
+        # Clean up
+        actor.delete()
+
+    def test_get_actors_not_modified(self):
+        actor = Actor(
+            name='John Doe',
+            age=27,
+            gender='male')
+        actor.insert()
+        res = self.client().get("/actors", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        etag = res.headers["ETag"]
+        headers = dict(self.authorization_header, **{"If-None-Match": etag})
+        res = self.client().get("/actors", headers=headers)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b"")
+        headers = dict(self.authorization_header, **{"If-Modified-Since": res.headers["Last-Modified"]})
+        res = self.client().get("/actors", headers=headers)
+        self.assertEqual(res.status_code, 304)
+        # a write changes the ETag
+        actor.name = 'Jane Doe'
+        actor.update()
+        headers = dict(self.authorization_header, **{"If-None-Match": etag})
+        res = self.client().get("/actors", headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers["ETag"], etag)
+        # Clean up
+        actor.delete()
+
+    def test_get_actor(self):
+        actor = Actor(
+            name='John Doe',
+            age=27,
+            gender='male')
+        actor.insert()
+        res = self.client().get("/actors/" + str(actor.id), headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["actors"][0]["id"], actor.id)
+        self.assertTrue(res.headers["ETag"])
+        # Clean up
+        actor.delete()
+
+    def test_get_actors_count_modes(self):
+        actor = Actor(
+            name='John Doe',
+            age=27,
+            gender='male')
+        actor.insert()
+        for count_mode in ['exact', 'estimate', 'cached']:
+            res = self.client().get("/actors?count=" + count_mode, headers=self.authorization_header)
+            self.assertEqual(res.status_code, 200)
+            data = json.loads(res.data)
+            self.assertTrue(type(data['total_actors']) is int)
+        res = self.client().get("/actors?count=invalid", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 400)
+        # Clean up
+        actor.delete()
+
+    def test_get_400_actors_invalid_cursor(self):
+        res = self.client().get("/actors?after=invalid", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 400)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "bad request")
+
+    def test_search_actors(self):
+        actor = Actor(
+            name='Johnathan Searchable',
+            age=27,
+            gender='male')
+        actor.insert()
+        res = self.client().get("/actors/search?q=searchab john", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["actors"][0]["id"], actor.id)
+        # Clean up
+        actor.delete()
+
     def test_create_actor(self):
         new_actor = {
             "name": "Test Get Actor", 
@@ -134,6 +352,63 @@ class CastingAgencyTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "unprocessable")
 
+    def test_create_actors_batch(self):
+        new_actors = [
+            {"name": "Test Batch Actor 1", "age": 42, "gender": "Male"},
+            {"name": "Test Batch Actor 2", "age": 24, "gender": "Female"},
+        ]
+        res = self.client().post("/actors/batch", json=new_actors, headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["created"], 2)
+        self.assertEqual([actor["name"] for actor in data["actors"]], [actor["name"] for actor in new_actors])
+        # Clean up
+        for result in data["results"]:
+            Actor.query.filter(Actor.id == result["id"]).one_or_none().delete()
+
+    def test_create_422_actors_batch_atomic(self):
+        new_actors = [
+            {"name": "Test Batch Actor 1", "age": 42, "gender": "Male"},
+            {"name": "Test Batch Actor 2", "age": 24},
+        ]
+        total_actors = len(Actor.query.all())
+        res = self.client().post("/actors/batch", json=new_actors, headers=self.authorization_header)
+        self.assertEqual(res.status_code, 422)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["results"][0]["index"], 1)
+        self.assertEqual(len(Actor.query.all()), total_actors)
+
+    def test_create_actors_batch_partial(self):
+        new_actors = [
+            {"name": "Test Batch Actor 1", "age": 42, "gender": "Male"},
+            {"name": "Test Batch Actor 2", "age": 24},
+        ]
+        res = self.client().post("/actors/batch?mode=partial", json=new_actors, headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["created"], 1)
+        self.assertEqual(data["failed"], 1)
+        self.assertEqual(data["results"][1]["success"], False)
+        # Clean up
+        Actor.query.filter(Actor.id == data["results"][0]["id"]).one_or_none().delete()
+
+    def test_create_actors_batch_partial_none_valid(self):
+        actor = Actor(name='John Doe', age=27, gender='male')
+        actor.insert()
+        etag = self.client().get("/actors", headers=self.authorization_header).headers["ETag"]
+        new_actors = [{"name": "Test Batch Actor 1", "age": 42}, {"age": 24}]
+        res = self.client().post("/actors/batch?mode=partial", json=new_actors, headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["created"], 0)
+        self.assertEqual(data["failed"], 2)
+        # nothing was written: the collection is unchanged
+        self.assertEqual(self.client().get("/actors", headers=self.authorization_header).headers["ETag"], etag)
+        # Clean up
+        actor.delete()
+
     def test_delete_actor(self):
         actor = Actor(
             name='John Doe',
@@ -152,6 +427,26 @@ class CastingAgencyTestCase(unittest.TestCase):
         self.assertEqual(data["deleted"], actor.id)
         self.assertEqual(deleted_actor, None)
 
+    def test_delete_actor_with_movies(self):
+        actor = Actor(
+            name='John Doe',
+            age=27,
+            gender='male')
+        actor.insert()
+        movie = Movie(
+          title='Test Movie',
+          release_date='11-12-2023')
+        movie.insert()
+        db.session.add(Catalog(actor_id=actor.id, movie_id=movie.id))
+        db.session.commit()
+        res = self.client().delete("/actors/" + str(actor.id), headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        # the database deletes the catalog entries of the actor, not its movies
+        self.assertEqual(Catalog.query.filter(Catalog.movie_id == movie.id).count(), 0)
+        self.assertNotEqual(Movie.query.filter(Movie.id == movie.id).one_or_none(), None)
+        # Clean up
+        movie.delete()
+
     def test_update_actor(self):
         actor = Actor(
             name='John Doe',
@@ -175,6 +470,142 @@ class CastingAgencyTestCase(unittest.TestCase):
         # Clean up
         actor.delete()
 
+    def test_update_actor_if_match(self):
+        actor = Actor(
+            name='John Doe',
+            age=27,
+            gender='male')
+        actor.insert()
+        etag = self.client().get("/actors/" + str(actor.id), headers=self.authorization_header).headers["ETag"]
+        patch_actor = {
+            "name": "Updated Test Actor",
+            "age": "",
+            "gender": ""
+        }
+        headers = dict(self.authorization_header, **{"If-Match": etag})
+        res = self.client().patch("/actors/" + str(actor.id), json=patch_actor, headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers["ETag"], etag)
+        # the ETag of the response is the current version
+        res = self.client().get("/actors/" + str(actor.id), headers=dict(
+            self.authorization_header, **{"If-None-Match": res.headers["ETag"]}))
+        self.assertEqual(res.status_code, 304)
+        # a second write with the same ETag is stale
+        res = self.client().patch("/actors/" + str(actor.id), json=dict(patch_actor, name="Lost Update"),
+                                  headers=headers)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 412)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "precondition failed")
+        res = self.client().delete("/actors/" + str(actor.id), headers=headers)
+        self.assertEqual(res.status_code, 412)
+        self.assertEqual(Actor.query.filter(Actor.id == actor.id).one().name, "Updated Test Actor")
+        # Clean up
+        actor.delete()
+
+    def test_update_actors_batch(self):
+        actors = [Actor(name='John Doe', age=27, gender='male'), Actor(name='Jane Doe', age=28, gender='female')]
+        for actor in actors:
+            actor.insert()
+        patch_actors = [
+            {"id": actors[0].id, "name": "Updated Test Actor", "age": "", "gender": ""},
+            {"id": actors[1].id, "name": "", "age": 11, "gender": ""},
+            {"id": 9999999, "name": "Missing Test Actor", "age": "", "gender": ""},
+        ]
+        res = self.client().patch("/actors/batch", json=patch_actors, headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["updated"], 2)
+        self.assertEqual(data["failed"], 1)
+        # "" leaves a field unchanged
+        self.assertEqual([(actor["name"], actor["age"]) for actor in data["actors"]],
+                         [("Updated Test Actor", 27), ("Jane Doe", 11)])
+        self.assertEqual(data["results"][2]["error"], 404)
+        self.assertEqual(data["results"][2]["id"], 9999999)
+        # Clean up
+        for actor in actors:
+            Actor.query.filter(Actor.id == actor.id).one_or_none().delete()
+
+    def test_update_422_actors_batch_atomic(self):
+        actor = Actor(name='John Doe', age=27, gender='male')
+        actor.insert()
+        patch_actors = [
+            {"id": actor.id, "name": "Updated Test Actor", "age": "", "gender": ""},
+            {"id": actor.id, "name": "Updated Test Actor", "age": ""},
+        ]
+        res = self.client().patch("/actors/batch", json=patch_actors, headers=self.authorization_header)
+        self.assertEqual(res.status_code, 422)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["results"][0]["index"], 1)
+        self.assertEqual(Actor.query.filter(Actor.id == actor.id).one().name, 'John Doe')
+        # Clean up
+        actor.delete()
+
+    def test_delete_actors_batch(self):
+        actors = [Actor(name='John Doe', age=27, gender='male'), Actor(name='Jane Doe', age=28, gender='female')]
+        for actor in actors:
+            actor.insert()
+        ids = [actor.id for actor in actors]
+        res = self.client().delete("/actors/batch", json={"ids": ids + [9999999]}, headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["deleted"], ids)
+        self.assertEqual(data["failed"], 1)
+        self.assertEqual(data["results"][2]["error"], 404)
+        self.assertEqual(Actor.query.filter(Actor.id.in_(ids)).count(), 0)
+
+    def test_delete_422_actors_batch_atomic(self):
+        actor = Actor(name='John Doe', age=27, gender='male')
+        actor.insert()
+        res = self.client().delete("/actors/batch", json=[actor.id, "abc"], headers=self.authorization_header)
+        self.assertEqual(res.status_code, 422)
+        self.assertNotEqual(Actor.query.filter(Actor.id == actor.id).one_or_none(), None)
+        res = self.client().delete("/actors/batch?mode=partial", json=[actor.id, "abc"],
+                                   headers=self.authorization_header)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["deleted"], [actor.id])
+        self.assertEqual(data["results"][1]["success"], False)
+
+    def test_422_actors_batch_float_and_bool_ids(self):
+        actor = Actor(name='John Doe', age=27, gender='male')
+        actor.insert()
+        # neither is truncated to an id (actor.id, and 1 for true)
+        patch_actors = [
+            {"id": actor.id + 0.9, "name": "Updated Test Actor", "age": "", "gender": ""},
+            {"id": True, "name": "Updated Test Actor", "age": "", "gender": ""},
+        ]
+        res = self.client().patch("/actors/batch?mode=partial", json=patch_actors, headers=self.authorization_header)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["updated"], 0)
+        self.assertEqual([result["error"] for result in data["results"]], [422, 422])
+        self.assertEqual(Actor.query.filter(Actor.id == actor.id).one().name, 'John Doe')
+        res = self.client().delete("/actors/batch", json=[actor.id + 0.9, True], headers=self.authorization_header)
+        self.assertEqual(res.status_code, 422)
+        self.assertNotEqual(Actor.query.filter(Actor.id == actor.id).one_or_none(), None)
+        # Clean up
+        actor.delete()
+
+    def test_import_data_actors(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('name,age,gender\n')
+            f.write('Test Import Actor 1,42,Male\n')
+            f.write('Test Import Actor 2,not a number,Female\n')
+            f.write('Test Import Actor 3,24,Female\n')
+        result = self.app.test_cli_runner().invoke(import_data_command, ['actors', f.name])
+        os.remove(f.name)
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Imported 2 actors rows (1 invalid', result.output)
+        imported = Actor.query.filter(Actor.name.like('Test Import Actor %')).all()
+        self.assertEqual(sorted(actor.name for actor in imported), ['Test Import Actor 1', 'Test Import Actor 3'])
+        # Clean up
+        for actor in imported:
+            actor.delete()
+
     # ---------------------------------------------
     #  Movies
     # ---------------------------------------------
@@ -195,6 +626,61 @@ class CastingAgencyTestCase(unittest.TestCase):
         # Clean up
         movie.delete()
 
+    def test_get_movie_cast(self):
+        movie = Movie(
+          title='Test Movie',
+          release_date='11-12-2023')
+        movie.insert()
+        actor = Actor(
+            name='John Doe',
+            age=27,
+            gender='male')
+        actor.insert()
+        catalog = Catalog(actor_id=actor.id, movie_id=movie.id)
+        db.session.add(catalog)
+        db.session.commit()
+        res = self.client().get("/movies/" + str(movie.id) + "/actors", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual([actor_repr["id"] for actor_repr in data["actors"]], [actor.id])
+        res = self.client().get("/actors/" + str(actor.id) + "/movies", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual([movie_repr["id"] for movie_repr in data["movies"]], [movie.id])
+        res = self.client().get("/movies?include=cast&limit=500", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        movie_repr = [movie_repr for movie_repr in data["movies"][0] if movie_repr["id"] == movie.id]
+        self.assertEqual(movie_repr[0]["cast"][0]["id"], actor.id)
+        res = self.client().get("/movies?include=invalid", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 400)
+        # Clean up
+        db.session.delete(catalog)
+        db.session.commit()
+        actor.delete()
+        movie.delete()
+
+    def test_get_404_movie_cast(self):
+        res = self.client().get("/movies/999999/actors", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 404)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], False)
+
+    def test_search_movies(self):
+        movie = Movie(
+          title='The Test Search Movie Part II',
+          release_date='11-12-2023')
+        movie.insert()
+        res = self.client().get("/movies/search?q=search mov", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], True)
+        self.assertIn(movie.id, [movie_repr["id"] for movie_repr in data["movies"]])
+        res = self.client().get("/movies/search?q=", headers=self.authorization_header)
+        self.assertEqual(res.status_code, 400)
+        # Clean up
+        movie.delete()
+
     def test_create_movie(self):
         new_movie = {
             "title": "Test Get Movie", 
@@ -224,6 +710,21 @@ class CastingAgencyTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "unprocessable")
 
+    def test_create_movies_batch(self):
+        new_movies = [
+            {"title": "Test Batch Movie 1", "release_date": '11-12-2023'},
+            {"title": "Test Batch Movie 2", "release_date": '12-12-2023'},
+        ]
+        res = self.client().post("/movies/batch", json={"movies": new_movies}, headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(data["movies"][1]["release_date"], new_movies[1]["release_date"])
+        # Clean up
+        for result in data["results"]:
+            Movie.query.filter(Movie.id == result["id"]).one_or_none().delete()
+
     def test_delete_movie(self):
         movie = Movie(
           title='Test Movie',
@@ -241,6 +742,50 @@ class CastingAgencyTestCase(unittest.TestCase):
         self.assertEqual(data["deleted"], movie.id)
         self.assertEqual(deleted_movie, None)
 
+    def test_delete_movie_if_match(self):
+        movie = Movie(
+          title='Test Movie',
+          release_date='11-12-2023')
+        movie.insert()
+        etag = self.client().get("/movies/" + str(movie.id), headers=self.authorization_header).headers["ETag"]
+        movie.title = 'Test Movie 2'
+        movie.update()
+        headers = dict(self.authorization_header, **{"If-Match": etag})
+        res = self.client().delete("/movies/" + str(movie.id), headers=headers)
+        self.assertEqual(res.status_code, 412)
+        etag = self.client().get("/movies/" + str(movie.id), headers=self.authorization_header).headers["ETag"]
+        headers = dict(self.authorization_header, **{"If-Match": etag})
+        res = self.client().delete("/movies/" + str(movie.id), headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(Movie.query.filter(Movie.id == movie.id).one_or_none(), None)
+
+    def test_update_movies_batch(self):
+        movie = Movie(
+          title='Test Movie',
+          release_date='11-12-2023')
+        movie.insert()
+        patch_movies = [{"id": movie.id, "title": "Test Batch Movie", "release_date": ""}]
+        res = self.client().patch("/movies/batch?mode=partial", json={"movies": patch_movies},
+                                  headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["updated"], 1)
+        self.assertEqual(data["movies"][0]["title"], "Test Batch Movie")
+        self.assertEqual(data["movies"][0]["release_date"], '11-12-2023')
+        # Clean up
+        Movie.query.filter(Movie.id == movie.id).one_or_none().delete()
+
+    def test_delete_movies_batch(self):
+        movie = Movie(
+          title='Test Movie',
+          release_date='11-12-2023')
+        movie.insert()
+        res = self.client().delete("/movies/batch", json=[movie.id], headers=self.authorization_header)
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["deleted"], [movie.id])
+        self.assertEqual(Movie.query.filter(Movie.id == movie.id).one_or_none(), None)
+
     def test_update_movie(self):
         movie = Movie(
           title='Test Movie',
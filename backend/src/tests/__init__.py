@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+
+# database/models.py builds the database url at import time
+os.environ.setdefault('DATABASE_HOST', 'localhost')
+os.environ.setdefault('DATABASE_PORT', '5432')
+# auth/auth.py reads the Auth0 settings at import time
+os.environ.setdefault('AUTH0_DOMAIN', 'casting-agency.test.local')
+os.environ.setdefault('AUTH0_ALGORITHMS', 'RS256')
+os.environ.setdefault('AUTH0_API_AUDIENCE', 'casting-agency')
+
+from flask import Flask  # noqa: E402
+
+from database.models import db, setup_db  # noqa: E402
+
+
+class SQLiteTestCase(unittest.TestCase):
+    """This class is the base of the test cases run on a SQLite database file"""
+
+    # the database file, in a temporary directory removed after each test
+    database_file = 'test.db'
+    # False: the tests needing the app call create_app()
+    create_app_on_setup = True
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.app = None
+        if self.create_app_on_setup:
+            self.create_app()
+
+    def tearDown(self):
+        if self.app is not None:
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        self.directory.cleanup()
+
+    def create_app(self):
+        self.app = Flask(__name__)
+        setup_db(self.app, 'sqlite:///' + os.path.join(self.directory.name, self.database_file), [])
+        return self.app
@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+
+''' LocalAuth
+a local stand-in for Auth0
+    generates its own RSA keypair, publishes it as a JWKS document (as a file
+    or over http) and mints RS256 tokens signed with it, so that requires_auth
+    can be exercised without network access or Auth0 credentials
+    EXAMPLE
+        local_auth = LocalAuth(domain='test.local', audience='casting-agency')
+        jwks_url = local_auth.serve_jwks()
+        token = local_auth.token(['get:actors', 'get:movies'])
+'''
+class LocalAuth:
+
+    def __init__(self, domain, audience, kid='local-test-key', algorithm='RS256'):
+        self.domain = domain
+        self.audience = audience
+        self.kid = kid
+        self.algorithm = algorithm
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption()
+        )
+        self.public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.cache_control = 'public, max-age=600'
+        self.requests_served = 0
+        self._server = None
+
+    '''
+    jwks()
+        returns the JWKS document (dict) with the public key
+    '''
+
+    def jwks(self):
+        key = jwk.construct(self.public_pem, self.algorithm).to_dict()
+        key.update({'kid': self.kid, 'use': 'sig'})
+        return {'keys': [key]}
+
+    '''
+    write_jwks(path)
+        writes the JWKS document to path and returns its file:// url
+    '''
+
+    def write_jwks(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.jwks(), f)
+        return 'file://' + str(path)
+
+    '''
+    serve_jwks()
+        serves the JWKS document on a local http server (in a daemon thread)
+        returns the url of the document
+    '''
+
+    def serve_jwks(self, host='127.0.0.1', port=0):
+        local_auth = self
+
+        class JWKSHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                local_auth.requests_served += 1
+                body = json.dumps(local_auth.jwks()).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if local_auth.cache_control:
+                    self.send_header('Cache-Control', local_auth.cache_control)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), JWKSHandler)
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        return 'http://{}:{}/.well-known/jwks.json'.format(*self._server.server_address)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    '''
+    token(permissions)
+        mints a signed access token carrying the permissions
+        extra claims (e.g. exp, sub) override the defaults
+    '''
+
+    def token(self, permissions, expires_in=3600, kid=None, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://' + self.domain + '/',
+            'sub': 'local|test-user',
+            'aud': self.audience,
+            'iat': now,
+            'exp': now + expires_in,
+            'permissions': list(permissions),
+        }
+        payload.update(claims)
+        return jwt.encode(payload, self.private_pem, algorithm=self.algorithm,
+                          headers={'kid': kid or self.kid})
@@ -0,0 +1,47 @@
+import threading
+import time
+
+
+''' LocalRedis
+a local stand-in for the redis client, implementing the few commands used by
+the RedisBackend of the response cache (get, mget, set with ex, incr)
+instances share their data like clients of the same server would
+'''
+class LocalRedis:
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else {}
+        self._lock = threading.Lock()
+
+    def client(self):
+        return LocalRedis(self.data)
+
+    def _get(self, key):
+        value = self.data.get(key)
+        if value is None:
+            return None
+        if value[1] is not None and value[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return value[0]
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def mget(self, keys):
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        with self._lock:
+            self.data[key] = (value, time.monotonic() + ex if ex is not None else None)
+        return True
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._get(key) or 0) + 1
+            self.data[key] = (str(value).encode('utf-8'), None)
+            return value
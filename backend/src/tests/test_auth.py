@@ -0,0 +1,176 @@
+import os
+import tempfile
+import time
+import unittest
+
+from flask import Flask
+
+from auth import auth
+from auth.auth import AuthError, requires_auth, verify_decode_jwt
+from auth.jwks import JWKSKeyStore, JWKSUnavailableError, parse_cache_control
+from auth.token_cache import TokenCache
+from tests.local_auth import LocalAuth
+
+
+class LocalAuthTestCase(unittest.TestCase):
+    """This class is the base of the test cases verifying tokens of a local Auth0"""
+
+    @classmethod
+    def setUpClass(cls):
+        # auth/auth.py may have been imported before the defaults of the tests
+        # package were set (e.g. by test_api.py), its settings are set here
+        cls.auth_settings = (auth.AUTH0_DOMAIN, auth.API_AUDIENCE, auth.ALGORITHMS)
+        auth.AUTH0_DOMAIN = os.environ['AUTH0_DOMAIN']
+        auth.API_AUDIENCE = os.environ['AUTH0_API_AUDIENCE']
+        auth.ALGORITHMS = [os.environ['AUTH0_ALGORITHMS']]
+        cls.local_auth = LocalAuth(auth.AUTH0_DOMAIN, auth.API_AUDIENCE)
+
+    @classmethod
+    def tearDownClass(cls):
+        auth.AUTH0_DOMAIN, auth.API_AUDIENCE, auth.ALGORITHMS = cls.auth_settings
+
+
+class JWKSKeyStoreTestCase(LocalAuthTestCase):
+    """This class represents the JWKS key store test cases"""
+
+    def setUp(self):
+        self.jwks_url = self.local_auth.serve_jwks()
+        self.local_auth.requests_served = 0
+        self.local_auth.cache_control = 'public, max-age=600'
+        self.original_store = auth.jwks_store
+        auth.jwks_store = JWKSKeyStore(self.jwks_url, background_refresh=False)
+
+    def tearDown(self):
+        auth.jwks_store.stop()
+        auth.jwks_store = self.original_store
+        self.local_auth.shutdown()
+
+    def test_parse_cache_control(self):
+        directives = parse_cache_control('public, max-age=15, stale-if-error=86400')
+        self.assertEqual(directives['max-age'], 15)
+        self.assertEqual(directives['stale-if-error'], 86400)
+        self.assertIn('public', directives)
+        self.assertEqual(parse_cache_control(None), {})
+
+    def test_jwks_fetched_once(self):
+        token = self.local_auth.token(['get:actors'])
+        for _ in range(5):
+            payload = verify_decode_jwt(token)
+        self.assertEqual(payload['permissions'], ['get:actors'])
+        self.assertEqual(self.local_auth.requests_served, 1)
+
+    def test_jwks_from_local_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            url = self.local_auth.write_jwks(os.path.join(directory, 'jwks.json'))
+            auth.jwks_store = JWKSKeyStore(url, background_refresh=False)
+            payload = verify_decode_jwt(self.local_auth.token(['get:movies']))
+        self.assertEqual(payload['permissions'], ['get:movies'])
+
+    def test_jwks_honors_cache_control_max_age(self):
+        self.local_auth.cache_control = 'max-age=0'
+        auth.jwks_store = JWKSKeyStore(self.jwks_url, min_ttl=0, background_refresh=False)
+        token = self.local_auth.token(['get:actors'])
+        verify_decode_jwt(token)
+        verify_decode_jwt(token)
+        self.assertEqual(self.local_auth.requests_served, 2)
+
+    def test_unknown_kid_refresh_is_rate_limited(self):
+        auth.jwks_store = JWKSKeyStore(self.jwks_url, min_refresh_interval=0.5,
+                                       background_refresh=False)
+        auth.jwks_store.get_key(self.local_auth.kid)
+        time.sleep(0.6)
+        token = self.local_auth.token(['get:actors'], kid='rotated-key')
+        for _ in range(3):
+            with self.assertRaises(AuthError) as context:
+                verify_decode_jwt(token)
+            self.assertEqual(context.exception.status_code, 400)
+        # initial fetch plus a single refresh for the unknown kid
+        self.assertEqual(self.local_auth.requests_served, 2)
+
+    def test_stale_keys_served_when_jwks_unavailable(self):
+        store = JWKSKeyStore(self.jwks_url, min_ttl=0, default_ttl=0,
+                             min_refresh_interval=0, background_refresh=False)
+        self.local_auth.cache_control = None
+        store.get_key(self.local_auth.kid)
+        self.local_auth.shutdown()
+        self.assertIsNotNone(store.get_key(self.local_auth.kid))
+
+    def test_jwks_unavailable(self):
+        self.local_auth.shutdown()
+        with self.assertRaises(JWKSUnavailableError):
+            JWKSKeyStore(self.jwks_url, background_refresh=False).get_key('any')
+
+    def test_background_refresh(self):
+        self.local_auth.cache_control = 'max-age=1'
+        store = JWKSKeyStore(self.jwks_url, min_ttl=1, min_refresh_interval=0)
+        store.get_key(self.local_auth.kid)
+        time.sleep(1.5)
+        store.stop()
+        self.assertGreaterEqual(self.local_auth.requests_served, 2)
+
+
+class TokenCacheTestCase(LocalAuthTestCase):
+    """This class represents the verified-token cache test cases"""
+
+    def setUp(self):
+        self.original_store = auth.jwks_store
+        self.original_cache = auth.token_cache
+        self.tmp = tempfile.TemporaryDirectory()
+        url = self.local_auth.write_jwks(os.path.join(self.tmp.name, 'jwks.json'))
+        auth.jwks_store = JWKSKeyStore(url, background_refresh=False)
+        auth.token_cache = TokenCache(max_size=2)
+        self.app = Flask(__name__)
+
+        @requires_auth('get:actors')
+        def view(payload):
+            return payload
+        self.view = view
+
+    def tearDown(self):
+        auth.jwks_store = self.original_store
+        auth.token_cache = self.original_cache
+        self.tmp.cleanup()
+
+    def call_view(self, token):
+        headers = {'Authorization': 'Bearer ' + token}
+        with self.app.test_request_context('/actors', headers=headers):
+            return self.view()
+
+    def test_verified_token_is_cached(self):
+        token = self.local_auth.token(['get:actors'])
+        for _ in range(3):
+            payload = self.call_view(token)
+        self.assertEqual(payload['permissions'], ['get:actors'])
+        self.assertEqual(auth.token_cache.misses, 1)
+        self.assertEqual(auth.token_cache.hits, 2)
+
+    def test_cached_token_permissions_are_checked(self):
+        token = self.local_auth.token(['get:movies'])
+        for _ in range(2):
+            with self.assertRaises(AuthError) as context:
+                self.call_view(token)
+            self.assertEqual(context.exception.status_code, 403)
+        self.assertEqual(auth.token_cache.hits, 1)
+
+    def test_entry_expires_with_token(self):
+        cache = TokenCache(max_size=10)
+        cache.put('token', {'exp': time.time() - 1, 'permissions': []})
+        self.assertIsNone(cache.get('token'))
+        entry = cache.put('other', {'exp': time.time() + 3600, 'permissions': ['get:actors']})
+        self.assertLessEqual(entry.expires_at, time.time() + cache.max_ttl)
+        self.assertEqual(entry.permissions, frozenset(['get:actors']))
+
+    def test_cache_is_bounded(self):
+        tokens = [self.local_auth.token(['get:actors'], sub=str(i)) for i in range(3)]
+        for token in tokens:
+            self.call_view(token)
+        self.assertEqual(len(auth.token_cache), 2)
+        # the least recently used token was evicted
+        self.call_view(tokens[0])
+        self.assertEqual(auth.token_cache.misses, 4)
+        self.assertEqual(auth.token_cache.stats()['size'], 2)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
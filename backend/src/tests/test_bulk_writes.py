@@ -0,0 +1,58 @@
+import unittest
+
+from sqlalchemy import text
+
+from api.serialization import REPRESENTED_COLUMNS
+from database.bulk import delete_each, delete_many, update_each, update_many
+from database.models import Actor, db
+from tests import SQLiteTestCase
+
+
+class BulkWritesTestCase(SQLiteTestCase):
+    """This class represents the bulk update and delete test cases"""
+
+    database_file = 'bulk.db'
+
+    def setUp(self):
+        super().setUp()
+        self.actors = [Actor(name='Actor {}'.format(index), age=20 + index, gender='F') for index in range(3)]
+        for actor in self.actors:
+            actor.insert()
+        self.ids = [actor.id for actor in self.actors]
+
+    def test_update_many(self):
+        rows = [(self.ids[0], {'name': 'Ann'}), (self.ids[1], {'age': 50, 'gender': 'M'}), (self.ids[2], {}),
+                (self.ids[2] + 1, {'name': 'Missing'})]
+        updated = update_many(db.session, Actor, rows, REPRESENTED_COLUMNS[Actor] + (Actor.version,))
+        db.session.commit()
+        self.assertEqual(sorted(updated), self.ids)
+        self.assertEqual((updated[self.ids[0]].name, updated[self.ids[0]].age), ('Ann', 20))
+        self.assertEqual((updated[self.ids[1]].age, updated[self.ids[1]].gender), (50, 'M'))
+        # a row with no change keeps its version
+        self.assertEqual([updated[row_id].version for row_id in self.ids], [2, 2, 1])
+        # the instances of the session are not stale
+        self.assertEqual(self.actors[1].age, 50)
+
+    def test_update_each_rejects_a_row(self):
+        # the database rejects the name 'Rejected'
+        db.session.execute(text("CREATE TRIGGER reject_name BEFORE UPDATE ON \"Actor\" "
+                                "WHEN NEW.name = 'Rejected' BEGIN SELECT RAISE(ABORT, 'rejected'); END"))
+        db.session.commit()
+        rows = [(self.ids[0], {'name': 'Rejected'}), (self.ids[1], {'name': 'Bea'})]
+        updated, rejected = update_each(db.session, Actor, rows, REPRESENTED_COLUMNS[Actor])
+        db.session.commit()
+        self.assertEqual((list(updated), rejected), ([self.ids[1]], {self.ids[0]}))
+        self.assertEqual(db.session.get(Actor, self.ids[0]).name, 'Actor 0')
+
+    def test_delete_many(self):
+        deleted = delete_many(db.session, Actor, self.ids[:2] + [self.ids[2] + 1])
+        db.session.commit()
+        self.assertEqual(sorted(deleted), self.ids[:2])
+        self.assertNotIn(self.actors[0], db.session)
+        self.assertEqual([actor.id for actor in Actor.query.all()], self.ids[2:])
+        deleted, rejected = delete_each(db.session, Actor, [self.ids[2]])
+        self.assertEqual((deleted, rejected), ([self.ids[2]], set()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import datetime
+import time
+import unittest
+
+from sqlalchemy import event, insert
+
+from database.bulk import delete_many
+from database.models import Actor, Catalog, Movie, db, delete_returning, get_table_versions
+from tests import SQLiteTestCase
+
+CAST_ROWS = 100000
+# seconds, the delete of a movie with CAST_ROWS catalog entries
+DELETE_BUDGET = 5.0
+
+
+class CascadeDeletesTestCase(SQLiteTestCase):
+    """This class represents the catalog ON DELETE CASCADE test cases"""
+
+    database_file = 'cascade.db'
+
+    def setUp(self):
+        super().setUp()
+        self.actors = [Actor(name='Actor {}'.format(index), age=30, gender='F') for index in range(100)]
+        db.session.add_all(self.actors)
+        self.movies = [Movie(title='Movie {}'.format(index), release_date=datetime.date(2000, 1, 1))
+                       for index in range(2)]
+        db.session.add_all(self.movies)
+        db.session.commit()
+        self.statements = 0
+
+    def count_statement(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+
+    def add_cast(self, movie, rows):
+        db.session.execute(insert(Catalog), [{'actor_id': self.actors[index % len(self.actors)].id,
+                                              'movie_id': movie.id} for index in range(rows)])
+        db.session.commit()
+
+    def delete_movie(self, movie):
+        self.statements = 0
+        event.listen(db.engine, 'before_cursor_execute', self.count_statement)
+        started = time.perf_counter()
+        movie.delete()
+        elapsed = time.perf_counter() - started
+        event.remove(db.engine, 'before_cursor_execute', self.count_statement)
+        return elapsed, self.statements
+
+    def test_delete_movie_with_large_cast(self):
+        self.add_cast(self.movies[0], CAST_ROWS)
+        self.add_cast(self.movies[1], 1)
+        version = get_table_versions(['Catalog'])['Catalog'][0]
+        elapsed, statements = self.delete_movie(self.movies[0])
+        self.assertLess(elapsed, DELETE_BUDGET)
+        self.assertEqual(Catalog.query.count(), 1)
+        self.assertEqual(get_table_versions(['Catalog'])['Catalog'][0], version + 1)
+        # the catalog entries are not loaded: as many statements as for a single entry
+        self.assertEqual(self.delete_movie(self.movies[1])[1], statements)
+        self.assertEqual(Catalog.query.count(), 0)
+
+    def test_delete_actor_deletes_its_entries(self):
+        self.add_cast(self.movies[0], 200)
+        self.assertTrue(delete_returning(Actor, self.actors[0].id))
+        self.assertEqual(Catalog.query.filter(Catalog.actor_id == self.actors[0].id).count(), 0)
+        self.assertEqual(Catalog.query.count(), 198)
+        self.assertEqual(sorted(delete_many(db.session, Actor, [self.actors[1].id, self.actors[2].id])),
+                         [self.actors[1].id, self.actors[2].id])
+        db.session.commit()
+        self.assertEqual(Catalog.query.count(), 194)
+        # deleting an entry leaves its actor and movie
+        entry = Catalog.query.first()
+        db.session.delete(entry)
+        db.session.commit()
+        self.assertEqual((Actor.query.count(), Movie.query.count()), (97, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
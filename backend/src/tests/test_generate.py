@@ -0,0 +1,92 @@
+import csv
+import json
+import os
+import unittest
+
+from database.generate import DataGenerator, generate_data, generate_data_command, write_files
+from database.models import Actor, Catalog, Movie, db, get_table_versions
+from tests import SQLiteTestCase
+
+
+def _quiet(message, err=False):
+    pass
+
+
+class GenerateTestCase(SQLiteTestCase):
+    """This class represents the synthetic data generator test cases"""
+
+    database_file = 'generate.db'
+    create_app_on_setup = False
+
+    def test_same_seed_same_rows(self):
+        first = DataGenerator(200, 50, seed=7)
+        second = DataGenerator(200, 50, seed=7)
+        self.assertEqual(list(first.actor_rows()), list(second.actor_rows()))
+        self.assertEqual(list(first.movie_rows()), list(second.movie_rows()))
+        self.assertEqual(list(first.catalog_rows()), list(second.catalog_rows()))
+        self.assertNotEqual(list(first.catalog_rows()), list(DataGenerator(200, 50, seed=8).catalog_rows()))
+        # the actors do not depend on the number of movies
+        self.assertEqual(list(first.actor_rows()), list(DataGenerator(200, 10, seed=7).actor_rows()))
+
+    def test_cast_sizes_and_skew(self):
+        generator = DataGenerator(2000, 2000, cast_mean=8, cast_max=60, blockbusters=0.05,
+                                  blockbuster_cast=300, actor_skew=2)
+        casts = {}
+        actor_movies = {}
+        for actor_id, movie_id in generator.catalog_rows():
+            casts.setdefault(movie_id, set()).add(actor_id)
+            actor_movies[actor_id] = actor_movies.get(actor_id, 0) + 1
+        sizes = sorted(len(cast) for cast in casts.values())
+        self.assertEqual(len(sizes), 2000)
+        self.assertGreaterEqual(sizes[0], 1)
+        self.assertGreater(sizes[-1], 150)
+        self.assertLess(sizes[len(sizes) // 2], 20)
+        self.assertTrue(all(1 <= actor_id <= 2000 for actor_id in actor_movies))
+        # popular actors play in many more movies than the typical actor
+        counts = sorted(actor_movies.values())
+        self.assertGreater(counts[-1], 10 * counts[len(counts) // 2])
+        # and are not the first ids
+        top = sorted(actor_movies, key=actor_movies.get, reverse=True)[:10]
+        self.assertNotEqual(sorted(top), list(range(1, 11)))
+
+    def test_generate_data_appends_rows(self):
+        self.create_app()
+        Actor(name='existing', age=30, gender='F').insert()
+        versions = get_table_versions(['Actor', 'Movie', 'Catalog'])
+
+        counts = generate_data(db.session, DataGenerator(100, 20, seed=1), chunk_size=30, echo=_quiet)
+
+        self.assertEqual(counts['actors'], 100)
+        self.assertEqual(counts['movies'], 20)
+        self.assertEqual(Actor.query.count(), 101)
+        self.assertEqual(Movie.query.count(), 20)
+        self.assertEqual(Catalog.query.count(), counts['catalog'])
+        self.assertEqual(Actor.query.get(1).name, 'existing')
+        # the catalog references the generated actors, after the existing one
+        actor_ids = set(actor_id for actor_id, in db.session.query(Catalog.actor_id))
+        self.assertTrue(actor_ids <= set(range(2, 102)))
+        for table, (version, updated_at) in get_table_versions(['Actor', 'Movie', 'Catalog']).items():
+            self.assertGreater(version, versions[table][0])
+
+    def test_write_files(self):
+        generator = DataGenerator(30, 10, seed=3)
+        counts = write_files(generator, self.directory.name, 'csv', echo=_quiet)
+        with open(os.path.join(self.directory.name, 'actors.csv'), newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), counts['actors'])
+        self.assertEqual(rows[0]['id'], '1')
+
+        write_files(generator, self.directory.name, 'ndjson', echo=_quiet)
+        with open(os.path.join(self.directory.name, 'movies.ndjson')) as f:
+            movie = json.loads(f.readline())
+        self.assertEqual(sorted(movie), ['id', 'release_date', 'title'])
+
+    def test_generate_data_command(self):
+        result = self.create_app().test_cli_runner().invoke(generate_data_command, ['--actors', '50', '--movies', '5'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Generated 50 actors, 5 movies', result.output)
+        self.assertEqual(Movie.query.count(), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
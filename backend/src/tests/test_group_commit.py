@@ -0,0 +1,94 @@
+import threading
+import unittest
+
+from database.group_commit import group_commit
+from database.models import Actor, db, delete_returning, get_table_versions, update_returning
+from tests import SQLiteTestCase
+
+
+class GroupCommitTestCase(SQLiteTestCase):
+    """This class represents the group commit test cases"""
+
+    database_file = 'group_commit.db'
+
+    def setUp(self):
+        super().setUp()
+        self.settings = (group_commit.enabled, group_commit.max_delay)
+        group_commit.enabled = True
+        # long enough for the writes of the threads to share a batch
+        group_commit.max_delay = 0.2
+        group_commit.reset()
+        self.batches = []
+        group_commit.on_batch(self.record_batch)
+
+    def tearDown(self):
+        group_commit.stop()
+        group_commit.enabled, group_commit.max_delay = self.settings
+        group_commit.batch_listeners.remove(self.record_batch)
+        super().tearDown()
+
+    def record_batch(self, size, failed, seconds):
+        self.batches.append(size)
+
+    def run_threads(self, target, count):
+        results = [None] * count
+
+        def run(index):
+            with self.app.app_context():
+                try:
+                    results[index] = target(index)
+                except Exception as error:
+                    results[index] = error
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_writes_share_a_commit(self):
+        version = get_table_versions(['Actor'])['Actor'][0]
+
+        def insert(index):
+            actor = Actor(name='Actor {}'.format(index), age=index, gender='F')
+            actor.insert()
+            return actor.id
+
+        ids = self.run_threads(insert, 8)
+        self.assertEqual(len(set(ids)), 8)
+        self.assertEqual(Actor.query.count(), 8)
+        stats = group_commit.stats()
+        self.assertEqual(stats['writes'], 8)
+        self.assertLess(stats['batches'], 8)
+        self.assertEqual(sum(self.batches), 8)
+        # one version bump per batch
+        self.assertEqual(get_table_versions(['Actor'])['Actor'][0], version + stats['batches'])
+
+    def test_inserted_instance_is_persistent(self):
+        actor = Actor(name='Ann', age=30, gender='F')
+        actor.insert()
+        self.assertEqual((actor.version, db.session.get(Actor, actor.id)), (1, actor))
+        self.assertEqual(update_returning(Actor, actor.id, {'age': 31}).age, 31)
+        self.assertEqual(actor.age, 31)
+        self.assertTrue(delete_returning(Actor, actor.id))
+        self.assertNotIn(actor, db.session)
+        self.assertEqual(Actor.query.count(), 0)
+
+    def test_failed_write_is_isolated(self):
+        actor = Actor(name='Ann', age=30, gender='F')
+        actor.insert()
+
+        def update(index):
+            # NOT NULL violation for the odd writes
+            return update_returning(Actor, actor.id, {'age': index if index % 2 == 0 else None})
+
+        results = self.run_threads(update, 6)
+        self.assertEqual([isinstance(result, Exception) for result in results], [False, True] * 3)
+        self.assertEqual(group_commit.stats()['failed'], 3)
+        db.session.expire_all()
+        self.assertEqual(actor.version, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import unittest
+
+# database/models.py builds the database url at import time
+os.environ.setdefault('DATABASE_HOST', 'localhost')
+os.environ.setdefault('DATABASE_PORT', '5432')
+
+from flask import Flask, jsonify
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, exc, text
+
+from api.metrics import NativeRequest, init_metrics
+from api.response_cache import MemoryBackend, response_cache
+from database.pool import TimedQueuePool, instrument_pool, pools
+from auth.auth import AuthError, verify_decode_jwt
+
+
+class MetricsTestCase(unittest.TestCase):
+    """This class represents the metrics test cases"""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        app = Flask(__name__)
+        init_metrics(app)
+
+        @app.route("/actors/<int:actor_id>")
+        def get_actor(actor_id):
+            with self.engine.connect() as connection:
+                for _ in range(3):
+                    connection.execute(text('SELECT 1'))
+            return jsonify({"success": True})
+
+        self.client = app.test_client()
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_request_metrics(self):
+        labels = {'method': 'GET', 'route': '/actors/<int:actor_id>'}
+        requests = self.sample('http_requests_total', status='200', **labels)
+        queries = self.sample('http_request_db_queries_sum', **labels)
+        self.client.get("/actors/1")
+        self.client.get("/actors/2")
+        self.assertEqual(self.sample('http_requests_total', status='200', **labels), requests + 2)
+        self.assertEqual(self.sample('http_request_db_queries_sum', **labels), queries + 6)
+        self.assertGreaterEqual(self.sample('http_request_duration_seconds_count', **labels), 2)
+
+    def test_unmatched_route(self):
+        before = self.sample('http_requests_total', method='GET', route='unmatched', status='404')
+        self.client.get("/unknown/1")
+        self.assertEqual(self.sample('http_requests_total', method='GET', route='unmatched', status='404'), before + 1)
+
+    def test_native_request_metrics(self):
+        # a request of the ASGI app served without Flask
+        labels = {'method': 'GET', 'route': '/actors/<int:actor_id>'}
+        requests = self.sample('http_requests_total', status='404', **labels)
+        queries = self.sample('http_request_db_queries_sum', **labels)
+
+        async def request():
+            metrics = NativeRequest('GET', '/actors/<int:actor_id>')
+            with self.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            metrics.done(404)
+
+        asyncio.run(request())
+        with self.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        self.assertEqual(self.sample('http_requests_total', status='404', **labels), requests + 1)
+        self.assertEqual(self.sample('http_request_db_queries_sum', **labels), queries + 1)
+
+    def test_pool_metrics(self):
+        engine = create_engine('sqlite://', poolclass=TimedQueuePool, pool_size=1, max_overflow=1, pool_timeout=0.05)
+        self.addCleanup(engine.dispose)
+        self.addCleanup(pools.pop, 'metrics_test')
+        instrument_pool(engine, 'metrics_test')
+        waits = self.sample('db_pool_wait_seconds_count', pool='metrics_test')
+        first = engine.connect()
+        second = engine.connect()
+        self.assertEqual(self.sample('db_pool_checked_out', pool='metrics_test'), 2)
+        self.assertEqual(self.sample('db_pool_overflow', pool='metrics_test'), 1)
+        with self.assertRaises(exc.TimeoutError):
+            engine.connect()
+        self.assertEqual(self.sample('db_pool_timeouts_total', pool='metrics_test'), 1)
+        second.close()
+        first.close()
+        self.assertEqual(self.sample('db_pool_checked_out', pool='metrics_test'), 0)
+        self.assertEqual(self.sample('db_pool_overflow', pool='metrics_test'), 0)
+        self.assertEqual(self.sample('db_pool_wait_seconds_count', pool='metrics_test'), waits + 2)
+
+    def test_response_cache_metrics(self):
+        backend = response_cache.backend
+        self.addCleanup(setattr, response_cache, 'backend', backend)
+        self.addCleanup(response_cache.clear)
+        response_cache.backend = MemoryBackend()
+        response_cache.clear()
+        hits = self.sample('response_cache_hits_total')
+        misses = self.sample('response_cache_misses_total')
+        response_cache.get('key')
+        response_cache.set('key', b'value', ['Actor'])
+        response_cache.get('key')
+        response_cache.get('key')
+        self.assertEqual(self.sample('response_cache_hits_total'), hits + 2)
+        self.assertEqual(self.sample('response_cache_misses_total'), misses + 1)
+        self.assertAlmostEqual(self.sample('response_cache_hit_ratio'), 2 / 3)
+
+    def test_verify_metrics(self):
+        before = self.sample('auth_verify_duration_seconds_count', result='invalid')
+        with self.assertRaises(AuthError):
+            verify_decode_jwt('not a token')
+        self.assertEqual(self.sample('auth_verify_duration_seconds_count', result='invalid'), before + 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get("/actors/1")
+        res = self.client.get("/metrics")
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds_bucket', res.data)
+        self.assertIn(b'http_request_db_duration_seconds_sum', res.data)
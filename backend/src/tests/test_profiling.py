@@ -0,0 +1,61 @@
+import os
+import unittest
+
+# database/models.py builds the database url at import time
+os.environ.setdefault('DATABASE_HOST', 'localhost')
+os.environ.setdefault('DATABASE_PORT', '5432')
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+
+from api.profiling import RequestProfile, init_profiling, normalize_statement
+
+
+class ProfilingTestCase(unittest.TestCase):
+    """This class represents the request profiling test cases"""
+
+    def test_normalize_statement(self):
+        self.assertEqual(
+            normalize_statement('SELECT * FROM "Actor"\nWHERE id IN (%(id_1_1)s, %(id_1_2)s) AND name = \'x\' LIMIT 10'),
+            'SELECT * FROM "Actor" WHERE id IN (?, ...) AND name = ? LIMIT ?')
+        self.assertEqual(normalize_statement('SELECT "Movie_1".id FROM "Movie" AS "Movie_1"'),
+                         'SELECT "Movie_1".id FROM "Movie" AS "Movie_1"')
+
+    def test_findings(self):
+        profile = RequestProfile()
+        for actor_id in range(3):
+            profile.record_statement('SELECT * FROM "Catalog" WHERE actor_id = ?', (actor_id,), 0.001)
+        profile.record_statement('SELECT count(*) FROM "Actor"', (), 0.001)
+        profile.record_statement('SELECT count(*) FROM "Actor"', (), 0.001)
+        findings = profile.findings(repeat_threshold=3)
+        self.assertIn({'kind': 'n+1', 'statement': 'SELECT * FROM "Catalog" WHERE actor_id = ?', 'count': 3}, findings)
+        self.assertIn({'kind': 'duplicate', 'statement': 'SELECT count(*) FROM "Actor"', 'count': 2}, findings)
+        self.assertEqual(len(findings), 2)
+
+    def test_server_timing(self):
+        engine = create_engine('sqlite://')
+        app = Flask(__name__)
+        init_profiling(app, enabled=True)
+
+        @app.route("/actors")
+        def get_actors():
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+                connection.execute(text('SELECT 2'))
+            return jsonify({"success": True})
+
+        res = app.test_client().get("/actors")
+        self.assertEqual(res.status_code, 200)
+        timing = res.headers['Server-Timing']
+        for name in ('auth;dur=', 'db;dur=', 'desc="2 queries"', 'serialize;dur=', 'total;dur='):
+            self.assertIn(name, timing)
+
+    def test_disabled(self):
+        app = Flask(__name__)
+        init_profiling(app, enabled=False)
+
+        @app.route("/actors")
+        def get_actors():
+            return jsonify({"success": True})
+
+        self.assertNotIn('Server-Timing', app.test_client().get("/actors").headers)
@@ -0,0 +1,56 @@
+import datetime
+import unittest
+
+from sqlalchemy import insert
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import BadRequest, NotFound
+
+from api.queries import get_actor, list_actors, list_movies, movies_tables
+from database.models import Actor, Catalog, Movie, db
+from tests import SQLiteTestCase
+
+
+class QueriesTestCase(SQLiteTestCase):
+    """This class represents the shared read queries test cases"""
+
+    database_file = 'queries.db'
+
+    def setUp(self):
+        super().setUp()
+        self.actors = [Actor(name='Actor {}'.format(index), age=20 + index, gender='F') for index in range(3)]
+        for actor in self.actors:
+            actor.insert()
+        movie = Movie(title='Movie', release_date=datetime.date(2000, 1, 2))
+        movie.insert()
+        db.session.execute(insert(Catalog), [{'actor_id': actor.id, 'movie_id': movie.id} for actor in self.actors[:2]])
+        db.session.commit()
+
+    def test_list_actors(self):
+        body = list_actors(db.session, MultiDict([('filter', 'age:gte:21'), ('sort', '-age'), ('limit', '1')]))
+        self.assertEqual([actor['name'] for actor in body['actors']], ['Actor 2'])
+        self.assertEqual(body['total_actors'], 2)
+        self.assertIsNotNone(body['next_cursor'])
+        with self.assertRaises(BadRequest):
+            list_actors(db.session, MultiDict([('count', 'unknown')]))
+        with self.assertRaises(NotFound):
+            list_actors(db.session, MultiDict([('filter', 'age:gt:99')]))
+
+    def test_list_movies_with_cast(self):
+        args = MultiDict([('include', 'cast')])
+        body = list_movies(db.session, args)
+        self.assertEqual([actor['name'] for actor in body['movies'][0][0]['cast']], ['Actor 0', 'Actor 1'])
+        self.assertEqual(body['movies'][0][0]['release_date'], '01-02-2000')
+        self.assertEqual(movies_tables(args), ('Movie', 'Catalog', 'Actor'))
+        self.assertEqual(movies_tables(MultiDict()), ('Movie',))
+
+    def test_get_actor(self):
+        self.assertEqual(get_actor(db.session, MultiDict(), str(self.actors[0].id))['actors'],
+                         [self.actors[0].repr()])
+        with self.assertRaises(NotFound):
+            get_actor(db.session, MultiDict(), self.actors[2].id + 1)
+        with self.assertRaises(ValueError):
+            get_actor(db.session, MultiDict(), 'abc')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import time
+import unittest
+
+# api/__init__.py builds the database url at import time
+os.environ.setdefault('DATABASE_HOST', 'localhost')
+os.environ.setdefault('DATABASE_PORT', '5432')
+
+from flask import Flask, jsonify, request
+
+from api.response_cache import MemoryBackend, RedisBackend, ResponseCache, pack, unpack
+from tests.local_redis import LocalRedis
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    """This class represents the response cache test cases"""
+
+    def create_app(self, cache):
+        app = Flask(__name__)
+        self.calls = 0
+
+        def requires_payload(f):
+            def wrapper(*args, **kwargs):
+                permissions = request.headers.get('X-Permissions', 'get:actors').split(',')
+                return f({'permissions': permissions}, *args, **kwargs)
+            wrapper.__name__ = f.__name__
+            return wrapper
+
+        @app.route("/actors")
+        @requires_payload
+        @cache.cached('Actor')
+        def get_actors(payload):
+            self.calls += 1
+            response = jsonify({"success": True, "calls": self.calls})
+            response.set_etag('v' + str(self.calls))
+            return response
+
+        return app.test_client()
+
+    def test_memory_backend_hit_and_invalidation(self):
+        cache = ResponseCache(MemoryBackend(), ttl=60)
+        client = self.create_app(cache)
+        self.assertEqual(client.get("/actors").json["calls"], 1)
+        self.assertEqual(client.get("/actors").json["calls"], 1)
+        self.assertEqual(client.get("/actors?limit=1").json["calls"], 2)
+        cache.invalidate('Actor')
+        self.assertEqual(client.get("/actors").json["calls"], 3)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 3)
+        self.assertEqual(cache.stats()["hit_ratio"], 0.25)
+
+    def test_lookup_listeners(self):
+        cache = ResponseCache(MemoryBackend(), ttl=60)
+        lookups = []
+        cache.on_lookup(lookups.append)
+        client = self.create_app(cache)
+        client.get("/actors")
+        client.get("/actors")
+        self.assertEqual(lookups, [False, True])
+
+    def test_key_includes_permissions(self):
+        cache = ResponseCache(MemoryBackend(), ttl=60)
+        client = self.create_app(cache)
+        client.get("/actors", headers={'X-Permissions': 'get:actors'})
+        res = client.get("/actors", headers={'X-Permissions': 'get:actors,post:actors'})
+        self.assertEqual(res.json["calls"], 2)
+
+    def test_cached_response_is_conditional(self):
+        cache = ResponseCache(MemoryBackend(), ttl=60)
+        client = self.create_app(cache)
+        etag = client.get("/actors").headers["ETag"]
+        res = client.get("/actors", headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(self.calls, 1)
+
+    def test_memory_backend_ttl(self):
+        cache = ResponseCache(MemoryBackend(), ttl=0.1)
+        client = self.create_app(cache)
+        client.get("/actors")
+        time.sleep(0.2)
+        self.assertEqual(client.get("/actors").json["calls"], 2)
+
+    def test_memory_backend_eviction(self):
+        backend = MemoryBackend(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            backend.set(key, b'value', 60)
+        self.assertIsNone(backend.get('a'))
+        self.assertEqual(backend.get('c'), b'value')
+        self.assertEqual(backend.evictions, 1)
+        backend = MemoryBackend(max_bytes=10)
+        backend.set('a', b'123456', 60)
+        backend.set('b', b'123456', 60)
+        self.assertEqual(len(backend), 1)
+
+    def test_redis_backend_is_shared(self):
+        server = LocalRedis()
+        first = ResponseCache(RedisBackend(server.client()), ttl=60)
+        second = ResponseCache(RedisBackend(server.client()), ttl=60)
+        first_client = self.create_app(first)
+        first_client.get("/actors")
+        second_client = self.create_app(second)
+        self.assertEqual(second_client.get("/actors").json["calls"], 1)
+        # a write seen by one worker invalidates the cache of all workers
+        first.invalidate('Actor')
+        self.assertEqual(second_client.get("/actors").json["calls"], 1)
+        self.assertEqual(second.stats()["misses"], 1)
+
+    def test_request_key_and_values(self):
+        cache = ResponseCache(MemoryBackend(), ttl=60)
+        payload = {'permissions': ['get:actors']}
+        app = Flask(__name__)
+        with app.test_request_context("/actors?limit=2&sort=-age", headers={'Accept': '*/*'}):
+            key = cache.key(['Actor'], payload)
+            args = request.args.copy()
+        # the key of the native routes of api/asgi.py
+        self.assertEqual(cache.request_key('/actors', args, '*/*', ['Actor'], payload), key)
+        value = pack(200, [('Content-Type', 'application/json'), ('Content-Length', '2')], b'{}')
+        self.assertIsNone(cache.get(key))
+        cache.set(key, value, ['Actor'])
+        self.assertEqual(unpack(cache.get(key)), (200, [['Content-Type', 'application/json']], b'{}'))
+        self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (1, 1))
+
+    def test_disabled_cache(self):
+        cache = ResponseCache(None)
+        client = self.create_app(cache)
+        client.get("/actors")
+        self.assertEqual(client.get("/actors").json["calls"], 2)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
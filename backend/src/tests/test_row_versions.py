@@ -0,0 +1,67 @@
+import unittest
+
+from api.conditional import if_match_versions, row_etag
+from database.models import (Actor, VersionMismatch, db, delete_returning, get_table_versions, on_write,
+                             update_returning, write_listeners)
+from tests import SQLiteTestCase
+
+
+class RowVersionsTestCase(SQLiteTestCase):
+    """This class represents the optimistic concurrency test cases"""
+
+    database_file = 'versions.db'
+
+    def setUp(self):
+        super().setUp()
+        self.actor = Actor(name='Ann', age=30, gender='F')
+        self.actor.insert()
+
+    def test_update_increments_the_version(self):
+        self.assertEqual(self.actor.version, 1)
+        row = update_returning(Actor, self.actor.id, {'age': 31}, versions=[1])
+        self.assertEqual((row.age, row.version), (31, 2))
+        self.assertEqual(row_etag(Actor, self.actor.id), 'v2')
+        # the ORM flushes increment it too
+        self.actor.name = 'Bea'
+        self.actor.update()
+        self.assertEqual(self.actor.version, 3)
+
+    def test_stale_version(self):
+        update_returning(Actor, self.actor.id, {'age': 31})
+        with self.assertRaises(VersionMismatch):
+            update_returning(Actor, self.actor.id, {'age': 32}, versions=[1])
+        with self.assertRaises(VersionMismatch):
+            delete_returning(Actor, self.actor.id, versions=[1])
+        self.assertEqual(db.session.get(Actor, self.actor.id).age, 31)
+        self.assertTrue(delete_returning(Actor, self.actor.id, versions=[1, 2]))
+
+    def test_update_without_values(self):
+        table_versions = get_table_versions(['Actor'])
+        writes = []
+        on_write(writes.append)
+        self.addCleanup(write_listeners.remove, writes.append)
+        row = update_returning(Actor, self.actor.id, {}, versions=[1])
+        self.assertEqual((row.age, row.version), (30, 1))
+        self.assertEqual(get_table_versions(['Actor']), table_versions)
+        self.assertEqual(writes, [])
+        with self.assertRaises(VersionMismatch):
+            update_returning(Actor, self.actor.id, {}, versions=[2])
+        self.assertIsNone(update_returning(Actor, self.actor.id + 1, {}))
+
+    def test_missing_row(self):
+        self.assertIsNone(update_returning(Actor, self.actor.id + 1, {'age': 31}, versions=[1]))
+        self.assertFalse(delete_returning(Actor, self.actor.id + 1, versions=[1]))
+        self.assertIsNone(row_etag(Actor, self.actor.id + 1))
+        self.assertIsNone(row_etag(Actor, 'abc'))
+
+    def test_if_match_versions(self):
+        for header, versions in ((None, None), ('*', None), ('"v3"', [3]), ('W/"v3"', []),
+                                 ('"x"', []), ('"v3", "v4"', [3, 4])):
+            headers = {'If-Match': header} if header is not None else {}
+            with self.app.test_request_context(headers=headers):
+                result = if_match_versions()
+                self.assertEqual(sorted(result) if result is not None else None, versions)
+
+
+if __name__ == "__main__":
+    unittest.main()
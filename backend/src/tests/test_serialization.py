@@ -0,0 +1,70 @@
+import datetime
+import decimal
+import json
+import unittest
+import uuid
+
+from flask import Flask
+
+from api import serialization
+from api.serialization import FastJSONProvider, represent_rows, represented_query
+from database.models import Actor, Movie
+from tests import SQLiteTestCase
+
+
+PAYLOADS = [
+    {'success': True, 'actors': [{'id': 1, 'name': 'Ann', 'age': 30, 'gender': 'F'}], 'next_cursor': None},
+    {'b': 1, 'a': [1, 2, {'z': None, 'y': False}], 'c': ''},
+    {'name': 'José Ñúñez', 'emoji': 'Zoë 😀', 'snowman': '☃', 'separators': '  '},
+    {'controls': 'tab\tnew\nline\rquote"back\\slash\x00\x1f\x7f', 'html': '<b>&</b>'},
+    {'date': datetime.date(2020, 1, 2), 'datetime': datetime.datetime(2020, 1, 2, 3, 4, 5),
+     'decimal': decimal.Decimal('1.50'), 'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678')},
+    {'big': 2 ** 70, 'negative': -2 ** 63},
+    {1: 'integer key', 2: 'another'},
+    [],
+    'string',
+]
+
+
+class SerializationTestCase(SQLiteTestCase):
+    """This class represents the fast serialization test cases"""
+
+    database_file = 'serialization.db'
+    create_app_on_setup = False
+
+    def test_provider_output_is_identical(self):
+        default_app = Flask(__name__)
+        fast_app = Flask(__name__)
+        fast_app.json = FastJSONProvider(fast_app)
+        for payload in PAYLOADS:
+            self.assertEqual(fast_app.json.response(payload).get_data(),
+                             default_app.json.response(payload).get_data(), payload)
+            self.assertEqual(fast_app.json.dumps(payload), default_app.json.dumps(payload))
+        # the indented (debug) output is the default provider's
+        fast_app.debug = default_app.debug = True
+        self.assertEqual(fast_app.json.response(PAYLOADS[0]).get_data(),
+                         default_app.json.response(PAYLOADS[0]).get_data())
+
+    def test_dumps_without_orjson(self):
+        orjson = serialization.orjson
+        serialization.orjson = None
+        try:
+            self.assertEqual(serialization.dumps(PAYLOADS[2]),
+                             json.dumps(PAYLOADS[2], sort_keys=True, separators=(",", ":")))
+        finally:
+            serialization.orjson = orjson
+
+    def test_represent_rows_matches_repr(self):
+        self.create_app()
+        Actor(name='Zoë', age=30, gender='F').insert()
+        Actor(name='Ben', age=41, gender='M').insert()
+        Movie(title='Old', release_date=datetime.date(999, 1, 2)).insert()
+        Movie(title='New', release_date=datetime.date(2020, 12, 31)).insert()
+        for model in (Actor, Movie):
+            rows = represented_query(model).order_by(model.id).all()
+            self.assertEqual(represent_rows(model, rows),
+                             [entity.repr() for entity in model.query.order_by(model.id).all()])
+
+
+if __name__ == "__main__":
+    unittest.main()